@@ -0,0 +1,81 @@
+"""Leitura local da chave de acesso no código de barras / QR Code do DACTE/DANFE.
+
+O DACTE traz a chave em Code-128 (44 dígitos) e, nos modelos recentes, também
+em QR Code (URL com `chCTe=`). Decodificar localmente leva milissegundos e
+dispensa o passe de GPT da chave quando o DV confere.
+
+Depende do pacote opcional `zxing-cpp`; sem ele a leitura é pulada e o fluxo
+segue com o GPT como antes.
+"""
+
+import io
+import logging
+import os
+import time
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+
+from . import fiscal_key, metrics
+
+try:  # dependência opcional
+    import zxingcpp
+except ImportError:  # pragma: no cover - depende do ambiente
+    zxingcpp = None
+
+BARCODE_ENABLED = os.getenv("BARCODE_DECODE_ENABLED", "1").strip().lower() not in ("0", "false", "no", "")
+
+# Lado máximo (px) entregue ao decodificador; fotos maiores são reduzidas
+_LADO_MAXIMO = 2400
+
+_avisado = False
+
+
+def disponivel() -> bool:
+    """Indica se a leitura local está habilitada e o `zxing-cpp` está instalado."""
+    global _avisado
+    if not BARCODE_ENABLED:
+        return False
+    if zxingcpp is None:
+        if not _avisado:
+            _avisado = True
+            logging.info("zxing-cpp não instalado; leitura local de código de barras desativada.")
+        return False
+    return True
+
+
+def _textos(img: Image.Image) -> List[str]:
+    formatos = zxingcpp.BarcodeFormat.Code128 | zxingcpp.BarcodeFormat.QRCode
+    return [r.text for r in zxingcpp.read_barcodes(img, formats=formatos, try_rotate=True) if r.text]
+
+
+def read_access_key(image_bytes: bytes) -> Optional[str]:
+    """
+    Decodifica Code-128/QR da imagem e retorna a primeira chave válida
+    (DV, UF, AAMM e modelo), preferindo CT-e. None se nada for lido.
+    """
+    if not image_bytes or not disponivel():
+        return None
+    t0 = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as original:
+            img = ImageOps.exif_transpose(original).convert("L")
+        img.thumbnail((_LADO_MAXIMO, _LADO_MAXIMO))
+        textos = _textos(img)
+        if not textos:
+            # fotos com pouco contraste: segunda tentativa com autocontraste
+            textos = _textos(ImageOps.autocontrast(img, cutoff=1))
+    except Exception as exc:
+        logging.warning("Falha ao decodificar código de barras: %s", exc)
+        metrics.incr("barcode.errors")
+        return None
+    finally:
+        metrics.observe("barcode.decode", time.perf_counter() - t0)
+
+    chave = fiscal_key.extract_cte_access_key("\n".join(textos))
+    if chave:
+        metrics.incr("cte_key.barcode")
+        logging.info("🔎 Chave lida no código de barras/QR em %.0f ms", (time.perf_counter() - t0) * 1000.0)
+    else:
+        metrics.incr("barcode.miss")
+    return chave
@@ -0,0 +1,334 @@
+"""Leitura local dos campos da CNH a partir do texto do OCR (Tesseract).
+
+Cada campo só é aceito se passar na validação (DV do CPF e do nº de registro,
+data real e coerente com as demais). O que não for resolvido aqui vai para o
+GPT em um passe curto, só com os campos pendentes
+(`parse_with_gpt.complete_cnh_fields_async`).
+"""
+
+import re
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional
+
+from . import validators
+
+# Campos que decidem se vale seguir pelo OCR (sem eles o cartão vai inteiro ao GPT)
+ESSENCIAIS = ["Nome", "CPF", "Data de nascimento", "Registro", "Número de registro CNH", "Validade"]
+
+# Todos os campos do cartão que o /precadastro grava; o upload só dispensa o GPT
+# quando nenhum deles ficou sem leitura
+PERSISTIDOS = ESSENCIAIS + [
+    "Local de nascimento", "Nacionalidade", "Pai", "Mãe", "Categoria Habilitação",
+    "Data da 1ª habilitação", "Data de emissão", "UF", "Local de emissão", "Código",
+]
+
+# Dicas de cada campo para o passe de complemento no GPT
+DICAS = {
+    "Nome": "nome completo do titular, em maiúsculas",
+    "CPF": "XXX.XXX.XXX-YY",
+    "Data de nascimento": "campo DATA NASC., DD/MM/AAAA",
+    "Registro": "RG do campo DOC. IDENTIDADE, apenas dígitos",
+    "Número de registro CNH": "nº registro em VERMELHO, 11 dígitos (NÃO é o CPF)",
+    "Validade": "campo VALIDADE, DD/MM/AAAA",
+    "Local de nascimento": "cidade/UF de nascimento",
+    "Nacionalidade": "nacionalidade do titular",
+    "Pai": "1º nome do campo FILIAÇÃO",
+    "Mãe": "2º nome do campo FILIAÇÃO",
+    "Categoria Habilitação": "campo CAT. HAB., ex.: AB",
+    "Data da 1ª habilitação": "campo 1ª HABILITAÇÃO, DD/MM/AAAA",
+    "Data de emissão": "campo DATA EMISSÃO, DD/MM/AAAA",
+    "UF": "UF do campo LOCAL (2 letras)",
+    "Local de emissão": "cidade do campo LOCAL",
+    "Código": "número do rodapé e protocolo, ex.: 12345678901 / SC123456789",
+}
+
+CATEGORIAS = {
+    "ACC", "A1", "A", "B1", "B", "C1", "C", "D1", "D", "E",
+    "BE", "C1E", "CE", "D1E", "DE", "AB", "AC", "AD", "AE",
+}
+
+UFS = {
+    "AC", "AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA",
+    "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO",
+}
+
+_RE_CPF = re.compile(r"(?<!\d)(\d{3}\.\d{3}\.\d{3}-?\d{2}|\d{11})(?!\d)")
+_RE_DATA = re.compile(r"(?<!\d)(\d{2}/\d{2}/\d{4})(?!\d)")
+_RE_NOME = re.compile(r"[A-ZÀ-Ý]{2,}(?: [A-ZÀ-Ý]{1,})+")
+_RE_PROTOCOLO = re.compile(r"\b([A-Z]{2}\d{8,10})\b")
+
+
+def _digitos(v: str) -> str:
+    return re.sub(r"\D", "", v or "")
+
+
+def nome_valido(nome: Optional[str]) -> bool:
+    """Duas ou mais palavras só com letras (como impresso na CNH)."""
+    n = (nome or "").strip().upper()
+    return 5 <= len(n) <= 150 and bool(_RE_NOME.fullmatch(n))
+
+
+def rg_valido(rg: Optional[str]) -> bool:
+    return 6 <= len(_digitos(rg)) <= 10
+
+
+def uf_valida(uf: Optional[str]) -> bool:
+    return (uf or "").strip().upper() in UFS
+
+
+def categoria_valida(cat: Optional[str]) -> bool:
+    return (cat or "").strip().upper() in CATEGORIAS
+
+
+VALIDADORES: Dict[str, Callable[[Optional[str]], bool]] = {
+    "Nome": nome_valido,
+    "CPF": validators.cpf_valido,
+    "Data de nascimento": validators.data_valida,
+    "Registro": rg_valido,
+    "Número de registro CNH": validators.cnh_registro_valido,
+    "Validade": validators.data_valida,
+    "Pai": nome_valido,
+    "Mãe": nome_valido,
+    "Categoria Habilitação": categoria_valida,
+    "Data da 1ª habilitação": validators.data_valida,
+    "Data de emissão": validators.data_valida,
+    "UF": uf_valida,
+}
+
+
+def validar(rotulo: str, valor: Optional[str]) -> bool:
+    """Aplica o validador do campo (campos sem validador só precisam ter valor)."""
+    v = (valor or "").strip()
+    if not v or v == "-":
+        return False
+    fn = VALIDADORES.get(rotulo)
+    return fn(v) if fn else True
+
+
+def _data(v: str) -> date:
+    return datetime.strptime(v, "%d/%m/%Y").date()
+
+
+def _apos_rotulo(linhas: List[str], rotulo: str, alcance: int = 2) -> List[str]:
+    """Trecho da linha do rótulo (após ele) e das `alcance` linhas seguintes."""
+    for i, linha in enumerate(linhas):
+        m = re.search(rotulo, linha, flags=re.I)
+        if m:
+            return [linha[m.end():]] + linhas[i + 1:i + 1 + alcance]
+    return []
+
+
+def _unico(valores: List[str]) -> Optional[str]:
+    distintos = list(dict.fromkeys(valores))
+    return distintos[0] if len(distintos) == 1 else None
+
+
+def _ler_cpf_e_registro(texto: str) -> Dict[str, str]:
+    campos: Dict[str, str] = {}
+    candidatos = _RE_CPF.findall(texto)
+    # CPF vem impresso com pontuação; o nº de registro, só dígitos
+    formatados = [_digitos(c) for c in candidatos if "." in c and validators.cpf_valido(c)]
+    cpf = _unico(formatados) or _unico([_digitos(c) for c in candidatos if validators.cpf_valido(c)])
+    if cpf:
+        campos["CPF"] = f"{cpf[0:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:11]}"
+    registros = [
+        c for c in candidatos
+        if "." not in c and c != cpf and validators.cnh_registro_valido(c)
+    ]
+    registro = _unico(registros)
+    if registro:
+        campos["Número de registro CNH"] = registro
+    return campos
+
+
+def _data_no_rotulo(linhas: List[str], datas: List[str], rotulo: str, alcance: int = 1,
+                    exceto: Optional[str] = None) -> Optional[str]:
+    """Única data válida junto ao rótulo (ignorando `exceto`)."""
+    achadas = [
+        d for d in _RE_DATA.findall(" ".join(_apos_rotulo(linhas, rotulo, alcance)))
+        if d in datas and d != exceto
+    ]
+    return _unico(achadas)
+
+
+def _ler_datas(linhas: List[str], texto: str) -> Dict[str, str]:
+    campos: Dict[str, str] = {}
+    datas = [d for d in dict.fromkeys(_RE_DATA.findall(texto)) if validators.data_valida(d)]
+    if not datas:
+        return campos
+
+    # 1) Pelo rótulo, quando só há uma data logo abaixo dele
+    nasc = _data_no_rotulo(linhas, datas, r"NASC", 2)
+    validade = _data_no_rotulo(linhas, datas, r"VALIDADE")
+
+    # 2) Pela ordem: nascimento é a menor data, ao menos 18 anos antes das demais;
+    #    a validade é a maior
+    ordenadas = sorted(datas, key=_data)
+    if not nasc and len(ordenadas) >= 2:
+        menor, seguinte = _data(ordenadas[0]), _data(ordenadas[1])
+        if (seguinte - menor).days >= 18 * 365:
+            nasc = ordenadas[0]
+    if not validade and len(ordenadas) >= 3:
+        validade = ordenadas[-1]
+
+    hoje = date.today()
+    if nasc and 16 <= (hoje - _data(nasc)).days / 365.25 <= 110:
+        campos["Data de nascimento"] = nasc
+    else:
+        nasc = None
+    if validade and (not nasc or _data(validade) > _data(nasc)):
+        campos["Validade"] = validade
+
+    emissao = _data_no_rotulo(linhas, datas, r"EMISS[AÃ]O", exceto=campos.get("Validade"))
+    if emissao:
+        campos["Data de emissão"] = emissao
+    # "Nº REGISTRO  VALIDADE  1ª HABILITAÇÃO" dividem a mesma linha de valores
+    primeira = _data_no_rotulo(linhas, datas, r"HABILITA[CÇ][AÃ]O", exceto=campos.get("Validade"))
+    if primeira and (not nasc or _data(primeira) > _data(nasc)):
+        campos["Data da 1ª habilitação"] = primeira
+    return campos
+
+
+def _ler_nome(linhas: List[str]) -> Optional[str]:
+    for trecho in _apos_rotulo(linhas, r"^\s*NOME\b"):
+        candidato = re.sub(r"\s+", " ", trecho).strip().upper()
+        if nome_valido(candidato):
+            return candidato
+    return None
+
+
+def _ler_filiacao(linhas: List[str]) -> Dict[str, str]:
+    """Pai e mãe: as duas linhas de nome abaixo de FILIAÇÃO (só com as duas lidas)."""
+    nomes = []
+    for trecho in _apos_rotulo(linhas, r"FILIA[CÇ][AÃ]O", 3):
+        candidato = re.sub(r"\s+", " ", trecho).strip().upper()
+        if nome_valido(candidato):
+            nomes.append(candidato)
+    if len(nomes) < 2:
+        return {}
+    return {"Pai": nomes[0], "Mãe": nomes[1]}
+
+
+def _ler_rg(linhas: List[str]) -> Optional[str]:
+    for trecho in _apos_rotulo(linhas, r"IDENTIDADE"):
+        m = re.search(r"(?<![\d.])(\d{1,3}(?:\.?\d{3}){1,2}(?:-?[\dX])?)(?![\d.])", trecho)
+        if m and rg_valido(m.group(1)):
+            return _digitos(m.group(1))
+    return None
+
+
+def _ler_categoria(linhas: List[str]) -> Optional[str]:
+    for trecho in _apos_rotulo(linhas, r"CAT\.?\s*HAB"):
+        for token in re.findall(r"\b[A-E1]{1,3}\b", trecho.upper()):
+            if token in CATEGORIAS:
+                return token
+    return None
+
+
+def _ler_local(linhas: List[str]) -> Dict[str, str]:
+    """Cidade e UF do campo LOCAL (ex.: "FLORIANOPOLIS, SC")."""
+    for trecho in _apos_rotulo(linhas, r"^\s*LOCAL\b", 1):
+        m = re.search(r"([A-ZÀ-Ý][A-ZÀ-Ý ]{2,}?)\s*[,\-/]\s*([A-Z]{2})\b", trecho.upper())
+        if m and uf_valida(m.group(2)):
+            return {"Local de emissão": m.group(1).strip(), "UF": m.group(2)}
+    return {}
+
+
+def _ler_local_nascimento(texto: str, nasc: Optional[str]) -> Optional[str]:
+    """Cidade e UF impressas após a data de nascimento (CNH atual: "01/02/1990, CIDADE, UF")."""
+    if not nasc:
+        return None
+    m = re.search(
+        re.escape(nasc) + r"\s*,\s*([A-ZÀ-Ý][A-ZÀ-Ý ]{2,}?)\s*[,\-/]\s*([A-Z]{2})\b",
+        texto.upper(),
+    )
+    if m and uf_valida(m.group(2)):
+        return f"{m.group(1).strip()}, {m.group(2)}"
+    return None
+
+
+def _ler_nacionalidade(linhas: List[str]) -> Optional[str]:
+    for trecho in _apos_rotulo(linhas, r"NACIONALIDADE", 1):
+        m = re.search(r"\b(BRASILEIR[OA]|ESTRANGEIR[OA])\b", trecho.upper())
+        if m:
+            return m.group(1)
+    return None
+
+
+def _ler_codigo(texto: str, registro: Optional[str]) -> Optional[str]:
+    """Protocolo do rodapé (UF + dígitos), junto do nº de registro como no cartão do GPT."""
+    protocolos = [p for p in _RE_PROTOCOLO.findall(texto.upper()) if uf_valida(p[:2])]
+    protocolo = _unico(protocolos)
+    if not protocolo:
+        return None
+    return f"{registro} / {protocolo}" if registro else protocolo
+
+
+def ler_campos(texto: str) -> Dict[str, str]:
+    """Campos da CNH encontrados (e validados) no texto do OCR, pelo rótulo do cartão."""
+    texto = texto or ""
+    linhas = [line for line in texto.splitlines() if line.strip()]
+    campos = _ler_cpf_e_registro(texto)
+    campos.update(_ler_datas(linhas, texto))
+    local_nasc = _ler_local_nascimento(texto, campos.get("Data de nascimento"))
+    if local_nasc:
+        campos["Local de nascimento"] = local_nasc
+    campos.update(_ler_filiacao(linhas))
+    campos.update(_ler_local(linhas))
+    leitores = (
+        ("Nome", _ler_nome),
+        ("Registro", _ler_rg),
+        ("Categoria Habilitação", _ler_categoria),
+        ("Nacionalidade", _ler_nacionalidade),
+    )
+    for rotulo, leitor in leitores:
+        valor = leitor(linhas)
+        if valor:
+            campos[rotulo] = valor
+    codigo = _ler_codigo(texto, campos.get("Número de registro CNH"))
+    if codigo:
+        campos["Código"] = codigo
+    return campos
+
+
+def pendentes(campos: Dict[str, str]) -> List[str]:
+    """Campos essenciais ainda sem valor válido."""
+    return [c for c in ESSENCIAIS if not validar(c, campos.get(c))]
+
+
+def faltantes(campos: Dict[str, str]) -> List[str]:
+    """Todos os campos gravados pelo /precadastro ainda sem valor válido."""
+    return [c for c in PERSISTIDOS if not validar(c, campos.get(c))]
+
+
+def estruturado(campos: Dict[str, str]) -> dict:
+    """Campos no formato do schema "cnh_card" (para montar o cartão padrão)."""
+    def v(rotulo: str) -> str:
+        return campos.get(rotulo, "-")
+
+    return {
+        "identificacao": {
+            "nome": v("Nome"),
+            "data_nascimento": v("Data de nascimento"),
+            "local_nascimento": v("Local de nascimento"),
+            "nacionalidade": v("Nacionalidade"),
+            "pai": v("Pai"),
+            "mae": v("Mãe"),
+        },
+        "documento": {
+            "registro_rg": v("Registro"),
+            "cpf": v("CPF"),
+            "categoria": v("Categoria Habilitação"),
+            "numero_registro_cnh": v("Número de registro CNH"),
+            "primeira_habilitacao": v("Data da 1ª habilitação"),
+        },
+        "emissao": {
+            "data_emissao": v("Data de emissão"),
+            "validade": v("Validade"),
+        },
+        "orgao_emissor": {
+            "uf": v("UF"),
+            "local_emissao": v("Local de emissão"),
+            "codigo": v("Código"),
+        },
+    }
@@ -0,0 +1,66 @@
+"""SQL de leitura das rotas /entregas e /cte.
+
+Ficam aqui (e não nas rotas) para o index_advisor analisar os mesmos textos
+que a API executa. As rotas conectam com `SQL_DIALECT` (Dialect 1).
+"""
+
+SQL_DIALECT = 1
+
+# Consulta de uma entrega
+SQL_ENTREGA = """
+    SELECT FIRST 1
+           m.NOMOVTRA                                                     AS NUMERO,
+           m.DATA                                                         AS M_DATA,
+           m.DATA_HORA                                                    AS M_DATA_HORA,
+           c.NOMCLI                                                       AS CLIENTE_NOME,
+           c.CGCCLI                                                       AS CLIENTE_CNPJ,
+           mot.NOMCLI                                                     AS MOTORISTA_NOME,
+           mot.CGCCLI                                                     AS MOTORISTA_DOC,
+           m.PLACACAR                                                     AS PLACA,
+           (SELECT SUM(nf.VLRTOTAL)
+              FROM TABMOVTRA_NF nf
+             WHERE nf.NOMOVTRA = m.NOMOVTRA)                              AS VALOR_TOTAL
+      FROM TABMOVTRA m
+      LEFT JOIN TABCLI c   ON c.NOCLI  = m.NOCLI
+      LEFT JOIN TABCLI mot ON mot.NOCLI = m.NOMOT
+     WHERE m.NOMOVTRA = ?
+"""
+
+
+def sql_entregas_lote(n: int) -> str:
+    """SELECT das entregas com uma única agregação de TABMOVTRA_NF para `n` números."""
+    marks = ", ".join("?" * n)
+    return f"""
+        SELECT m.NOMOVTRA                                                     AS NUMERO,
+               m.DATA                                                         AS M_DATA,
+               m.DATA_HORA                                                    AS M_DATA_HORA,
+               c.NOMCLI                                                       AS CLIENTE_NOME,
+               c.CGCCLI                                                       AS CLIENTE_CNPJ,
+               mot.NOMCLI                                                     AS MOTORISTA_NOME,
+               mot.CGCCLI                                                     AS MOTORISTA_DOC,
+               m.PLACACAR                                                     AS PLACA,
+               nf.VALOR_TOTAL                                                 AS VALOR_TOTAL
+          FROM TABMOVTRA m
+          LEFT JOIN TABCLI c   ON c.NOCLI  = m.NOCLI
+          LEFT JOIN TABCLI mot ON mot.NOCLI = m.NOMOT
+          LEFT JOIN (SELECT NOMOVTRA, SUM(VLRTOTAL) AS VALOR_TOTAL
+                       FROM TABMOVTRA_NF
+                      WHERE NOMOVTRA IN ({marks})
+                      GROUP BY NOMOVTRA) nf ON nf.NOMOVTRA = m.NOMOVTRA
+         WHERE m.NOMOVTRA IN ({marks})
+    """
+
+
+# Use apenas placeholders posicionais "?" no fdb
+SQL_CTE = """
+    SELECT FIRST 1
+           t.STATUSCTE,
+           t.DATAEMI,
+           t.TOTALPESO,
+           t.NOMOVTRA,
+           t.MOTIVO,
+           mot.CGCCLI AS MOTORISTA_CPF
+      FROM TABCTRC t
+      JOIN TABCLI mot ON mot.NOCLI = t.NOMOT
+     WHERE t.CHAVECTE = ?
+"""
@@ -1,15 +1,24 @@
 """Utilidades para resolver o banco do cliente via WhatsApp."""
 
 import re
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
 
+import ctypes.util
 import os
 import platform
+import threading
+import time
 from pathlib import Path
 import fdb
 from fastapi import HTTPException
 import requests
 
+from . import metrics, tenant_profile
+from .db_pool import pool as _pool
+from .http_client import DEFAULT_TIMEOUT, NODE_INTERNAL_URL, get_async_client, get_session
+from .ttl_cache import TTLCache
+
 # Configuração explícita do MASTER (sem .env)
 MASTER_HOST = "192.168.1.252"  # IP/host do servidor Firebird
 MASTER_DB_URL = "/home/bdmm/Siserv/Database/DATABASE.GDB"  # ou alias: "SISERV"
@@ -18,76 +27,210 @@ MASTER_PASSWORD = "masterkey" # ajuste para a senha correta
 # Charset padrão preferido para bases antigas (FB 2.5)
 DEFAULT_CHARSET = "WIN1252"
 
-def _load_fbclient_hardcoded() -> str:
-    """Tenta carregar fbclient.dll na ordem:
-    1) DLLs locais na raiz do projeto (fbclient-2-32.dll, fbclient-5-32.dll).
-    2) Diretórios padrão de instalação do Firebird.
+# Cache das credenciais do tenant (resolvidas via Node)
+TENANT_CACHE_TTL = float(os.getenv("TENANT_CACHE_TTL", "300"))
+TENANT_CACHE_STALE = float(os.getenv("TENANT_CACHE_STALE", "600"))
+TENANT_CACHE_NEGATIVE_TTL = float(os.getenv("TENANT_CACHE_NEGATIVE_TTL", "30"))
+
+_tenant_cache = TTLCache(
+    "tenants",
+    ttl=TENANT_CACHE_TTL,
+    maxsize=2048,
+    stale_ttl=TENANT_CACHE_STALE,
+    negative_ttl=TENANT_CACHE_NEGATIVE_TTL,
+    is_negative=lambda exc: isinstance(exc, HTTPException) and exc.status_code == 404,
+)
+metrics.register_source("tenant_cache", _tenant_cache.stats)
+metrics.register_source("db_pool", _pool.stats)
+
+def _fbclient_candidates() -> List[str]:
+    """Lista de bibliotecas cliente a tentar, conforme o sistema operacional.
+
+    1) FIREBIRD_CLIENTLIB (caminho explícito).
+    2) Windows: DLLs locais na raiz do projeto (fbclient-2-32.dll, fbclient-5-32.dll)
+       e diretórios padrão de instalação do Firebird.
+    3) Linux/Mac: libfbclient.so nos diretórios usuais e via `ctypes.util.find_library`.
     """
-    root_dir = Path(__file__).resolve().parent  # pasta onde está o código
-    candidates = [
-        str(root_dir / "fbclient-2-32.dll"),
-        str(root_dir / "fbclient-5-32.dll"),
-        r"C:/Program Files/Firebird/Firebird_2_5/bin/fbclient.dll",
-        r"C:/Program Files (x86)/Firebird/Firebird_2_5/bin/fbclient.dll",
-        r"C:/Program Files/Firebird/Firebird_5_0/fbclient.dll",
-        r"C:/Program Files (x86)/Firebird/Firebird_5_0/bin/fbclient.dll",
-    ]
+    candidates: List[str] = []
+    env_lib = os.getenv("FIREBIRD_CLIENTLIB")
+    if env_lib:
+        candidates.append(env_lib)
 
+    if platform.system() == "Windows":
+        here = Path(__file__).resolve().parent  # pasta onde está o código
+        for root_dir in (here.parent, here):
+            candidates += [
+                str(root_dir / "fbclient-2-32.dll"),
+                str(root_dir / "fbclient-5-32.dll"),
+            ]
+        candidates += [
+            r"C:/Program Files/Firebird/Firebird_2_5/bin/fbclient.dll",
+            r"C:/Program Files (x86)/Firebird/Firebird_2_5/bin/fbclient.dll",
+            r"C:/Program Files/Firebird/Firebird_5_0/fbclient.dll",
+            r"C:/Program Files (x86)/Firebird/Firebird_5_0/bin/fbclient.dll",
+        ]
+    else:
+        candidates += [
+            "/opt/firebird/lib/libfbclient.so",
+            "/usr/lib/x86_64-linux-gnu/libfbclient.so.2",
+            "/usr/lib64/libfbclient.so.2",
+            "/usr/lib/libfbclient.so.2",
+            "/usr/local/lib/libfbclient.dylib",
+        ]
+        found = ctypes.util.find_library("fbclient")
+        if found:
+            candidates.append(found)
+    return candidates
+
+
+def _load_fbclient_hardcoded() -> Optional[str]:
+    """Procura e carrega a biblioteca cliente do Firebird (sem cache; use `ensure_fbclient`)."""
     last_err = None
     arch = platform.architecture()[0]
     print(f"Python arquitetura: {arch}")
 
-    for dll in candidates:
+    for lib in _fbclient_candidates():
         try:
-            if not Path(dll).exists():
-                continue
-            fdb.load_api(dll)
-            print(f"fbclient.dll carregado de: {dll}")
-            return dll
+            # find_library devolve só o nome (ex.: libfbclient.so.2), sem caminho
+            if os.sep in lib or "/" in lib:
+                if not Path(lib).exists():
+                    continue
+            fdb.load_api(lib)
+            print(f"fbclient carregado de: {lib}")
+            return lib
         except Exception as e:
-            print(f"Falha ao carregar fbclient.dll em '{dll}': {e}")
+            print(f"Falha ao carregar fbclient em '{lib}': {e}")
             last_err = e
 
     if last_err:
         raise last_err
+    if platform.system() != "Windows":
+        # fdb ainda tenta localizar a libfbclient sozinho no primeiro connect
+        print("Nenhuma libfbclient encontrada nos caminhos conhecidos; usando a busca padrão do fdb.")
+        return None
     raise RuntimeError("Nenhum fbclient.dll encontrado (nem local nem sistema).")
 
-# Carrega a fbclient por tentativa, hardcoded
-FBCLIENT_DLL = _load_fbclient_hardcoded()
 
+_fbclient_lock = threading.Lock()
+_fbclient_done = False
+_fbclient_path: Optional[str] = None
+_fbclient_error: Optional[BaseException] = None
+
+
+def ensure_fbclient() -> Optional[str]:
+    """Carrega a fbclient uma única vez por processo, no primeiro uso real do banco.
+
+    O resultado (caminho ou erro) fica em cache; o tempo de carga vai para o log
+    e para as métricas (`fbclient_load_ms`).
+    """
+    global _fbclient_done, _fbclient_path, _fbclient_error
+    if not _fbclient_done:
+        with _fbclient_lock:
+            if not _fbclient_done:
+                started = time.perf_counter()
+                try:
+                    _fbclient_path = _load_fbclient_hardcoded()
+                except Exception as exc:
+                    _fbclient_error = exc
+                elapsed = time.perf_counter() - started
+                metrics.set_value("fbclient_load_ms", round(elapsed * 1000.0, 1))
+                metrics.set_value("fbclient_path", _fbclient_path)
+                print(
+                    f"fbclient inicializado em {elapsed * 1000.0:.1f} ms "
+                    f"(pid={os.getpid()}, lib={_fbclient_path or '-'}, erro={_fbclient_error or '-'})"
+                )
+                _fbclient_done = True
+    if _fbclient_error is not None:
+        raise _fbclient_error
+    return _fbclient_path
+
+
+def _normalize_to_biz(to_biz: str) -> str:
+    """Remove o prefixo 'whatsapp:' e espaços do número do bot."""
+    return re.sub(r"^whatsapp:", "", (to_biz or "").strip(), flags=re.I).strip()
+
+
+def _tenant_key(n: str) -> str:
+    """Chave do cache: apenas '+' inicial e dígitos."""
+    return ("+" if n.startswith("+") else "") + re.sub(r"\D", "", n)
 
 
 def get_client_db(to_biz: str) -> Dict[str, Any]:
     """Obtém as credenciais do banco do cliente via Node (/internal/master/cliente).
 
     Remove dependência do Python com o MASTER Firebird.
+    O resultado fica em cache por `TENANT_CACHE_TTL` segundos (404 por
+    `TENANT_CACHE_NEGATIVE_TTL`); rajadas para o mesmo número fazem uma única consulta.
     """
-    n = re.sub(r"^whatsapp:", "", (to_biz or "").strip(), flags=re.I)
+    n = _normalize_to_biz(to_biz)
+    cfg = _tenant_cache.get_or_load(_tenant_key(n), lambda: _fetch_client_db(n))
+    return dict(cfg)
+
+
+async def get_client_db_async(to_biz: str) -> Dict[str, Any]:
+    """Igual a `get_client_db`, para rotas `async def` (usa o cliente HTTP assíncrono)."""
+    n = _normalize_to_biz(to_biz)
+    cfg = await _tenant_cache.aget_or_load(_tenant_key(n), lambda: _fetch_client_db_async(n))
+    return dict(cfg)
+
+
+def invalidate_client_db(to_biz: Optional[str] = None) -> int:
+    """Descarta as credenciais em cache de um número (ou de todos, se vazio)."""
+    n = _normalize_to_biz(to_biz or "")
+    removed = _tenant_cache.invalidate(_tenant_key(n) if n else None)
+    print(f"Cache de tenants invalidado ({n or 'todos'}): {removed} entrada(s)")
+    return removed
+
+
+def _node_url(n: str) -> str:
+    return f"{NODE_INTERNAL_URL}/internal/master/cliente?toBiz={requests.utils.quote(n)}"
+
+
+def _cfg_from_node(status_code: int, raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Converte a resposta do Node no dicionário de conexão do tenant."""
+    if status_code == 404:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado para o WhatsApp informado")
+    if not 200 <= status_code < 400:
+        raise HTTPException(status_code=500, detail=f"Falha ao consultar Node: HTTP {status_code}")
+    raw = raw or {}
+    missing = [k for k in ["DB_HOST","DB_PORT","DB_PATH","DB_USER","DB_PASSWORD"] if not raw.get(k)]
+    if missing:
+        msg = f"Tenant possui campos ausentes: {', '.join(missing)}"
+        print(msg)
+        raise HTTPException(status_code=500, detail=msg)
+    cfg = {
+        "host": raw["DB_HOST"],
+        "port": int(raw["DB_PORT"]),
+        "database": raw["DB_PATH"],
+        "user": raw["DB_USER"],
+        "password": raw["DB_PASSWORD"],
+    }
+    print("Credenciais obtidas do Node com sucesso")
+    print("Conectando tenant", f"{cfg['host']}:{cfg['port']}:{cfg['database']}")
+    return cfg
+
+
+def _fetch_client_db(n: str) -> Dict[str, Any]:
+    """Consulta o Node para o número já normalizado (sessão HTTP compartilhada)."""
     try:
-        url = f"http://127.0.0.1:8081/internal/master/cliente?toBiz={requests.utils.quote(n)}"
+        url = _node_url(n)
         print("Consultando credenciais no Node:", url)
-        r = requests.get(url, timeout=5)
-        if r.status_code == 404:
-            raise HTTPException(status_code=404, detail="Cliente não encontrado para o WhatsApp informado")
-        if not r.ok:
-            raise HTTPException(status_code=500, detail=f"Falha ao consultar Node: HTTP {r.status_code}")
-        raw = r.json() or {}
-        missing = [k for k in ["DB_HOST","DB_PORT","DB_PATH","DB_USER","DB_PASSWORD"] if not raw.get(k)]
-        if missing:
-            msg = f"Tenant possui campos ausentes: {', '.join(missing)}"
-            print(msg)
-            raise HTTPException(status_code=500, detail=msg)
-        cfg = {
-            "host": raw["DB_HOST"],
-            "port": int(raw["DB_PORT"]),
-            "database": raw["DB_PATH"],
-            "user": raw["DB_USER"],
-            "password": raw["DB_PASSWORD"],
-            "charset": DEFAULT_CHARSET,
-        }
-        print("Credenciais obtidas do Node com sucesso")
-        print("Conectando tenant", f"{cfg['host']}:{cfg['port']}:{cfg['database']}")
-        return cfg
+        r = get_session().get(url, timeout=DEFAULT_TIMEOUT)
+        return _cfg_from_node(r.status_code, r.json() if r.ok else None)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        print("Erro ao consultar Node para credenciais:", exc)
+        raise HTTPException(status_code=500, detail="Falha ao buscar credenciais via Node")
+
+
+async def _fetch_client_db_async(n: str) -> Dict[str, Any]:
+    """Versão assíncrona de `_fetch_client_db` (não bloqueia o event loop)."""
+    try:
+        url = _node_url(n)
+        print("Consultando credenciais no Node:", url)
+        r = await get_async_client().get(url)
+        return _cfg_from_node(r.status_code, r.json() if r.is_success else None)
     except HTTPException:
         raise
     except Exception as exc:
@@ -101,7 +244,9 @@ def connect_client_db(
 ) -> fdb.Connection:
     """Abre conexão com o banco do cliente com fallback de charset.
 
-    - Tenta primeiro com WIN1252 (DEFAULT_CHARSET), depois UTF8.
+    - Sem charset no cfg, usa o charset gravado no perfil do tenant; só renegocia
+      (WIN1252/DEFAULT_CHARSET, depois UTF8) se ele falhar ou ainda não existir.
+    - Grava no perfil o charset que funcionou, a versão do servidor e o dialeto.
     - Mantém opcionalmente o `sql_dialect` informado.
     """
     required = ["host", "port", "database", "user", "password"]
@@ -109,6 +254,7 @@ def connect_client_db(
     if missing:
         raise ValueError(f"Configuração do banco incompleta: {', '.join(missing)}")
 
+    ensure_fbclient()
     print("Conectando ao banco do cliente:", f"{cfg['host']}:{int(cfg['port'])}:{cfg['database']}")
 
     def _try_connect(charset: str) -> fdb.Connection:
@@ -125,21 +271,93 @@ def connect_client_db(
         print(f"Tentando conectar com charset={charset}")
         return fdb.connect(**conn_kwargs)
 
+    profile = tenant_profile.get_profile(cfg)
+
     # Se já veio charset no cfg, usa direto
     if cfg.get("charset"):
         try:
-            return _try_connect(cfg["charset"]) 
+            con = _try_connect(cfg["charset"])
         except Exception as exc:
             print(f"Falha ao conectar (charset={cfg['charset']}): {exc}")
             raise
+        if not profile or profile.get("charset") != cfg["charset"]:
+            tenant_profile.remember(cfg, cfg["charset"], con)
+        return con
+
+    # Charset conhecido do perfil: vai direto, sem sondagem
+    if profile and profile.get("charset"):
+        try:
+            return _try_connect(profile["charset"])
+        except Exception as exc:
+            print(f"Falha com charset do perfil ({profile['charset']}): {exc}; renegociando")
+            tenant_profile.forget(cfg)
 
     # Tenta com WIN1252 e depois UTF8
     last_exc: Optional[Exception] = None
     for cs in (DEFAULT_CHARSET, "UTF8"):
         try:
-            return _try_connect(cs)
+            con = _try_connect(cs)
+            tenant_profile.remember(cfg, cs, con)
+            return con
         except Exception as exc:
             print(f"Falha ao conectar (charset={cs}): {exc}")
             last_exc = exc
     # Se chegou aqui, falhou
     raise last_exc or RuntimeError("Falha desconhecida de conexão ao Firebird")
+
+
+def _pool_key(cfg: Dict[str, Any], sql_dialect: Optional[int]) -> tuple:
+    """Chave do pool: (host, port, database, user, charset, sql_dialect)."""
+    return (
+        str(cfg["host"]).strip().lower(),
+        int(cfg["port"]),
+        str(cfg["database"]).strip(),
+        str(cfg["user"]).strip().upper(),
+        str(cfg.get("charset") or "").strip().upper(),
+        sql_dialect,
+    )
+
+
+@contextmanager
+def client_connection(
+    cfg: Dict[str, Any],
+    sql_dialect: Optional[int] = None,
+) -> Iterator[fdb.Connection]:
+    """Empresta uma conexão do pool do tenant.
+
+    Uso: ``with client_connection(cfg, sql_dialect=1) as con: ...``
+
+    - Saída normal: commit da transação pendente (mesmo efeito do `close()` do fdb)
+      e devolve a conexão ao pool.
+    - Exceção: rollback; se o rollback falhar, a conexão é descartada.
+    """
+    required = ["host", "port", "database", "user", "password"]
+    missing = [k for k in required if not cfg.get(k)]
+    if missing:
+        raise ValueError(f"Configuração do banco incompleta: {', '.join(missing)}")
+
+    entry = _pool.acquire(
+        _pool_key(cfg, sql_dialect),
+        lambda: connect_client_db(cfg, sql_dialect=sql_dialect),
+    )
+    discard = False
+    try:
+        yield entry.conn
+        try:
+            entry.conn.commit()
+        except Exception:
+            discard = True
+            raise
+    except BaseException:
+        try:
+            entry.conn.rollback()
+        except Exception:
+            discard = True
+        raise
+    finally:
+        _pool.release(entry, discard=discard)
+
+
+def close_client_pools() -> None:
+    """Fecha as conexões ociosas de todos os tenants."""
+    _pool.close_all()
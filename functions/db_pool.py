@@ -0,0 +1,228 @@
+"""Pool de conexões Firebird por tenant.
+
+- Uma fila de conexões ociosas por chave (host, port, database, user, charset, sql_dialect).
+- Limites mínimo/máximo por tenant e teto global de attachments abertos.
+- Conexões ociosas além do mínimo são fechadas após `FB_POOL_IDLE_TIMEOUT` segundos.
+- Checagem de vida (SELECT em RDB$DATABASE) ao retirar conexões paradas há algum tempo.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fdb
+
+from . import stmt_cache
+
+POOL_MIN_SIZE = int(os.getenv("FB_POOL_MIN_SIZE", "0"))
+POOL_MAX_SIZE = int(os.getenv("FB_POOL_MAX_SIZE", "5"))
+POOL_MAX_TOTAL = int(os.getenv("FB_POOL_MAX_TOTAL", "100"))
+POOL_IDLE_TIMEOUT = float(os.getenv("FB_POOL_IDLE_TIMEOUT", "300"))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("FB_POOL_CHECKOUT_TIMEOUT", "15"))
+# Só faz o ping de vida se a conexão ficou parada mais que N segundos
+POOL_PING_AFTER = float(os.getenv("FB_POOL_PING_AFTER", "5"))
+
+PoolKey = Tuple[str, int, str, str, str, Optional[int]]
+
+
+class PoolTimeout(RuntimeError):
+    """Nenhuma conexão disponível dentro do tempo limite."""
+
+
+class PooledConnection:
+    """Conexão física mantida pelo pool."""
+
+    __slots__ = ("conn", "key", "created_at", "last_used")
+
+    def __init__(self, conn: fdb.Connection, key: PoolKey) -> None:
+        self.conn = conn
+        self.key = key
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class _TenantPool:
+    """Estado de um tenant dentro do pool (protegido pelo lock do gerenciador)."""
+
+    __slots__ = ("idle", "in_use")
+
+    def __init__(self) -> None:
+        self.idle: List[PooledConnection] = []  # LIFO: a mais recente fica no fim
+        self.in_use = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.idle) + self.in_use
+
+
+def _close_quietly(conn: Any) -> None:
+    stmt_cache.drop(conn)
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_alive(conn: fdb.Connection) -> bool:
+    """Confere se a conexão ainda responde ao servidor."""
+    if getattr(conn, "closed", True):
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM RDB$DATABASE")
+        cur.fetchone()
+        conn.rollback()
+        return True
+    except Exception as exc:
+        logging.info("Conexão do pool descartada no ping: %s", exc)
+        return False
+
+
+class ConnectionPool:
+    """Gerencia os pools de todos os tenants com um teto global de conexões."""
+
+    def __init__(
+        self,
+        min_size: int = POOL_MIN_SIZE,
+        max_size: int = POOL_MAX_SIZE,
+        max_total: int = POOL_MAX_TOTAL,
+        idle_timeout: float = POOL_IDLE_TIMEOUT,
+        checkout_timeout: float = POOL_CHECKOUT_TIMEOUT,
+        ping_after: float = POOL_PING_AFTER,
+    ) -> None:
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size)
+        self.max_total = max(1, max_total)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._pools: Dict[PoolKey, _TenantPool] = {}
+        self._total = 0
+
+    # ---------------- Internos (chamar com o lock) ----------------
+
+    def _evict_expired_locked(self, now: float) -> List[PooledConnection]:
+        """Remove conexões ociosas vencidas, preservando o mínimo de cada tenant."""
+        evicted: List[PooledConnection] = []
+        for key, pool in list(self._pools.items()):
+            while pool.idle and pool.size > self.min_size:
+                oldest = pool.idle[0]
+                if now - oldest.last_used < self.idle_timeout:
+                    break
+                evicted.append(pool.idle.pop(0))
+                self._total -= 1
+            if pool.size == 0:
+                del self._pools[key]
+        return evicted
+
+    def _evict_lru_locked(self, keep: PoolKey) -> Optional[PooledConnection]:
+        """Libera espaço no teto global fechando a ociosa mais antiga de outro tenant."""
+        victim: Optional[PooledConnection] = None
+        for key, pool in self._pools.items():
+            if key == keep or not pool.idle:
+                continue
+            if victim is None or pool.idle[0].last_used < victim.last_used:
+                victim = pool.idle[0]
+        if victim is None:
+            return None
+        self._pools[victim.key].idle.pop(0)
+        self._total -= 1
+        return victim
+
+    # ---------------- API ----------------
+
+    def acquire(self, key: PoolKey, factory: Callable[[], fdb.Connection]) -> PooledConnection:
+        """Retira uma conexão do pool do tenant, abrindo uma nova se houver vaga."""
+        deadline = time.monotonic() + self.checkout_timeout
+        to_close: List[PooledConnection] = []
+        entry: Optional[PooledConnection] = None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                to_close.extend(self._evict_expired_locked(now))
+                pool = self._pools.setdefault(key, _TenantPool())
+                if pool.idle:
+                    entry = pool.idle.pop()
+                    pool.in_use += 1
+                    break
+                if pool.size < self.max_size:
+                    if self._total >= self.max_total:
+                        victim = self._evict_lru_locked(keep=key)
+                        if victim is not None:
+                            to_close.append(victim)
+                    if self._total < self.max_total:
+                        pool.in_use += 1
+                        self._total += 1
+                        break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"Pool Firebird esgotado para {key[0]}:{key[1]}:{key[2]} "
+                        f"(tenant={pool.in_use}/{self.max_size}, total={self._total}/{self.max_total})"
+                    )
+                self._cond.wait(remaining)
+
+        for old in to_close:
+            _close_quietly(old.conn)
+
+        # Reaproveitada: checa vida se ficou parada; senão abre uma nova na vaga reservada
+        if entry is not None:
+            if time.monotonic() - entry.last_used < self.ping_after or _is_alive(entry.conn):
+                return entry
+            _close_quietly(entry.conn)
+        try:
+            return PooledConnection(factory(), key)
+        except BaseException:
+            with self._cond:
+                self._pools.setdefault(key, _TenantPool()).in_use -= 1
+                self._total -= 1
+                self._cond.notify_all()
+            raise
+
+    def release(self, entry: PooledConnection, discard: bool = False) -> None:
+        """Devolve a conexão ao pool (ou fecha, se `discard`)."""
+        if getattr(entry.conn, "closed", True):
+            discard = True
+        with self._cond:
+            pool = self._pools.setdefault(entry.key, _TenantPool())
+            pool.in_use -= 1
+            if discard:
+                self._total -= 1
+            else:
+                entry.last_used = time.monotonic()
+                pool.idle.append(entry)
+            self._cond.notify_all()
+        if discard:
+            _close_quietly(entry.conn)
+
+    def close_all(self) -> None:
+        """Fecha todas as conexões ociosas (usado no shutdown)."""
+        with self._cond:
+            entries = [e for pool in self._pools.values() for e in pool.idle]
+            for pool in self._pools.values():
+                self._total -= len(pool.idle)
+                pool.idle.clear()
+            self._cond.notify_all()
+        for entry in entries:
+            _close_quietly(entry.conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contagens atuais do pool (por tenant e global)."""
+        with self._cond:
+            return {
+                "total": self._total,
+                "max_total": self.max_total,
+                "tenants": {
+                    f"{k[0]}:{k[1]}:{k[2]}|{k[3]}|{k[4] or 'auto'}|d{k[5] or '-'}": {
+                        "idle": len(p.idle),
+                        "in_use": p.in_use,
+                    }
+                    for k, p in self._pools.items()
+                },
+            }
+
+
+pool = ConnectionPool()
@@ -0,0 +1,227 @@
+"""Conjunto em memória, por tenant, dos CPF/CNPJ já cadastrados em TABCLI.
+
+Evita ir ao banco na maioria das checagens de duplicidade do pré-cadastro:
+
+- Carga completa (em segundo plano) dos documentos de TABCLI.CGCCLI,
+  normalizados para apenas dígitos.
+- Atualização incremental a cada `DOC_INDEX_REFRESH` segundos, por NOCLI
+  acima do maior já lido menos `DOC_INDEX_OVERLAP` (relê os últimos
+  registros para pegar inserções confirmadas fora de ordem e CGCCLI
+  preenchido logo depois); a consulta roda fora do lock do tenant e só a
+  junção com o conjunto é feita sob ele.
+- Edições de registros antigos só aparecem na recarga completa, por isso o
+  "não está no conjunto" só vale até `DOC_INDEX_FULL_REFRESH` segundos
+  depois dela; passado esse prazo a checagem vai ao banco até a próxima
+  carga (em segundo plano) terminar.
+- "Não está no conjunto" responde sem consulta; "está" ainda é confirmado
+  no banco pela consulta do chamador.
+
+Enquanto o conjunto não está carregado (ou se a carga falhar), a checagem
+vai direto ao banco, como antes.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+import fdb
+
+from . import metrics
+from .db_client import client_connection
+from .stmt_cache import execute_cached
+
+DOC_INDEX_REFRESH = float(os.getenv("DOC_INDEX_REFRESH", "30"))
+DOC_INDEX_FULL_REFRESH = float(os.getenv("DOC_INDEX_FULL_REFRESH", "300"))
+DOC_INDEX_OVERLAP = int(os.getenv("DOC_INDEX_OVERLAP", "500"))
+DOC_INDEX_MAX_TENANTS = int(os.getenv("DOC_INDEX_MAX_TENANTS", "50"))
+DOC_INDEX_ENABLED = os.getenv("DOC_INDEX_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+SQL_TABCLI_TODOS = "SELECT NOCLI, CGCCLI FROM TABCLI WHERE CGCCLI IS NOT NULL"
+SQL_TABCLI_NOVOS = "SELECT NOCLI, CGCCLI FROM TABCLI WHERE NOCLI > ? AND CGCCLI IS NOT NULL"
+
+
+def _encode(digits: str) -> Optional[int]:
+    """CPF/CNPJ em inteiro compacto; o tamanho vai junto para não colidir zeros à esquerda."""
+    if len(digits) not in (11, 14) or not digits.isdigit():
+        return None
+    return int(digits) * 100 + len(digits)
+
+
+def _encode_raw(value: Any) -> Optional[int]:
+    return _encode(re.sub(r"\D", "", str(value or "")))
+
+
+class _TenantDocs:
+    """Documentos de um tenant e as marcas d'água da carga incremental."""
+
+    __slots__ = ("lock", "docs", "max_nocli", "loaded_at", "refreshed_at", "loading", "refreshing", "failed_at")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.docs: Optional[Set[int]] = None
+        self.max_nocli: Any = None
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self.loading = False
+        self.refreshing = False
+        self.failed_at = 0.0
+
+
+_lock = threading.Lock()
+_tenants: "OrderedDict[str, _TenantDocs]" = OrderedDict()
+
+
+def _tenant_key(cfg: Dict[str, Any]) -> str:
+    return f"{str(cfg.get('host') or '').strip().lower()}:{cfg.get('port') or 3050}:{str(cfg.get('database') or '').strip()}"
+
+
+def _get_tenant(cfg: Dict[str, Any]) -> _TenantDocs:
+    key = _tenant_key(cfg)
+    with _lock:
+        t = _tenants.get(key)
+        if t is None:
+            t = _tenants[key] = _TenantDocs()
+            while len(_tenants) > DOC_INDEX_MAX_TENANTS:
+                _tenants.popitem(last=False)
+        else:
+            _tenants.move_to_end(key)
+        return t
+
+
+def _ler_linhas(rows, docs: Set[int], max_nocli: Any) -> Any:
+    """Inclui em `docs` os documentos de (NOCLI, CGCCLI) e devolve o maior NOCLI."""
+    for nocli, cgc in rows:
+        code = _encode_raw(cgc)
+        if code is not None:
+            docs.add(code)
+        if nocli is not None and (max_nocli is None or nocli > max_nocli):
+            max_nocli = nocli
+    return max_nocli
+
+
+def _full_load(cfg: Dict[str, Any], t: _TenantDocs) -> None:
+    """Lê todos os documentos do tenant (roda em thread própria)."""
+    started = time.monotonic()
+    try:
+        docs: Set[int] = set()
+        with client_connection(cfg) as con:
+            cur = con.cursor()
+            cur.execute(SQL_TABCLI_TODOS)
+            max_nocli = _ler_linhas(cur, docs, None)
+        now = time.monotonic()
+        with t.lock:
+            t.docs = docs
+            t.max_nocli = max_nocli
+            t.loaded_at = t.refreshed_at = now
+            t.failed_at = 0.0
+        metrics.observe("doc_index.full_load", now - started)
+        logging.info(
+            "Índice de documentos carregado para %s: %d docs em %.0f ms",
+            _tenant_key(cfg), len(docs), (now - started) * 1000,
+        )
+    except Exception as exc:
+        with t.lock:
+            t.failed_at = time.monotonic()
+        logging.warning("Falha ao carregar índice de documentos de %s: %s", _tenant_key(cfg), exc)
+    finally:
+        with t.lock:
+            t.loading = False
+
+
+def _schedule_full_load(cfg: Dict[str, Any], t: _TenantDocs) -> None:
+    """Dispara a carga completa se ainda não houver uma em andamento (chamar com t.lock)."""
+    if t.loading:
+        return
+    t.loading = True
+    threading.Thread(
+        target=_full_load, args=(dict(cfg), t), name="doc-index-load", daemon=True
+    ).start()
+
+
+def _refresh(con: fdb.Connection, t: _TenantDocs, max_nocli: Any) -> None:
+    """
+    Traz os documentos com NOCLI acima de `max_nocli` - DOC_INDEX_OVERLAP (chamar
+    SEM t.lock, com t.refreshing marcado): a consulta roda sem lock e só a junção
+    é feita sob ele.
+    """
+    novos: Set[int] = set()
+    try:
+        if max_nocli is None:
+            cur = execute_cached(con, SQL_TABCLI_TODOS)
+        else:
+            desde = max_nocli - DOC_INDEX_OVERLAP if isinstance(max_nocli, int) else max_nocli
+            cur = execute_cached(con, SQL_TABCLI_NOVOS, (desde,))
+        max_nocli = _ler_linhas(cur.fetchall(), novos, max_nocli)
+    except Exception:
+        with t.lock:
+            t.refreshing = False
+        raise
+    with t.lock:
+        t.refreshing = False
+        t.docs |= novos
+        if max_nocli is not None and (t.max_nocli is None or max_nocli > t.max_nocli):
+            t.max_nocli = max_nocli
+        t.refreshed_at = time.monotonic()
+
+
+def possivelmente_cadastrado(cfg: Dict[str, Any], con: fdb.Connection, doc: str) -> Optional[bool]:
+    """
+    False  -> documento não cadastrado até a última carga (sem consulta exata).
+    True   -> pode estar cadastrado; confirmar no banco.
+    None   -> índice indisponível ou vencido; consultar o banco.
+    """
+    code = _encode_raw(doc)
+    if not DOC_INDEX_ENABLED or code is None:
+        return None
+    t = _get_tenant(cfg)
+    now = time.monotonic()
+    with t.lock:
+        if t.docs is None or now - t.loaded_at >= DOC_INDEX_FULL_REFRESH:
+            if not t.failed_at or now - t.failed_at >= DOC_INDEX_FULL_REFRESH:
+                _schedule_full_load(cfg, t)
+            # Sem carga completa recente o conjunto pode ter perdido edições
+            metrics.incr("doc_index.indisponivel")
+            return None
+        # Só um chamador atualiza; os demais respondem com o conjunto atual
+        atualizar = now - t.refreshed_at >= DOC_INDEX_REFRESH and not t.refreshing
+        if atualizar:
+            t.refreshing = True
+            max_nocli = t.max_nocli
+    if atualizar:
+        try:
+            _refresh(con, t, max_nocli)
+        except Exception as exc:
+            logging.warning("Falha na atualização incremental de documentos: %s", exc)
+            metrics.incr("doc_index.indisponivel")
+            return None
+    with t.lock:
+        hit = code in t.docs
+    metrics.incr("doc_index.possivel" if hit else "doc_index.negativo")
+    return hit
+
+
+def invalidar(cfg: Optional[Dict[str, Any]] = None) -> None:
+    """Descarta o conjunto de um tenant (ou de todos)."""
+    with _lock:
+        if cfg is None:
+            _tenants.clear()
+        else:
+            _tenants.pop(_tenant_key(cfg), None)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        items = list(_tenants.items())
+    return {
+        "tenants": {
+            k: {"docs": len(t.docs) if t.docs is not None else None, "loading": t.loading}
+            for k, t in items
+        }
+    }
+
+
+metrics.register_source("doc_index", stats)
@@ -0,0 +1,158 @@
+"""Pools de threads dedicados para trabalho bloqueante chamado das rotas async.
+
+Cada pool tem tamanho e fila limitados, para que um tenant lento ou uma chamada
+GPT demorada não congelem o event loop nem tomem os workers dos demais:
+
+- ``db``:  chamadas fdb (Firebird) e consultas HTTP síncronas ao Node
+- ``llm``: chamadas à OpenAI
+- ``cpu``: pré-processamento de imagem e extração de texto de PDF
+- ``ocr``: Tesseract local (um worker por núcleo, com a API mantida carregada)
+- ``io``:  disco e uploads ao Google Drive (com seus ``time.sleep`` de retry)
+
+Profundidade de fila, ativos e tempos de espera/execução aparecem em
+GET /internal/metrics, na chave ``executors``.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from fastapi import HTTPException
+
+from . import metrics
+
+T = TypeVar("T")
+
+EXEC_DB_WORKERS = int(os.getenv("EXEC_DB_WORKERS", "16"))
+EXEC_LLM_WORKERS = int(os.getenv("EXEC_LLM_WORKERS", "8"))
+EXEC_CPU_WORKERS = int(os.getenv("EXEC_CPU_WORKERS", str(os.cpu_count() or 2)))
+EXEC_IO_WORKERS = int(os.getenv("EXEC_IO_WORKERS", "4"))
+EXEC_OCR_WORKERS = int(os.getenv("EXEC_OCR_WORKERS", str(os.cpu_count() or 2)))
+# Máximo de tarefas aguardando worker em cada pool (além dessas: 503)
+EXEC_MAX_QUEUE = int(os.getenv("EXEC_MAX_QUEUE", "200"))
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor com fila limitada e contadores de uso."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = EXEC_MAX_QUEUE) -> None:
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"exec-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def _on_done(self, fut: Future) -> None:
+        # Cancelada antes de começar: o runner nunca rodou, desconta da fila aqui
+        if fut.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        """Enfileira `fn` no pool; recusa com 503 se a fila estiver cheia."""
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected += 1
+                logging.warning("Pool %s saturado (%d na fila)", self.name, self._queued)
+                raise HTTPException(status_code=503, detail=f"Servidor ocupado ({self.name}), tente novamente")
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        enqueued_at = time.monotonic()
+
+        def runner() -> T:
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            metrics.observe(f"executor.{self.name}.wait", started - enqueued_at)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                metrics.observe(f"executor.{self.name}.run", time.monotonic() - started)
+
+        fut = self._executor.submit(runner)
+        fut.add_done_callback(self._on_done)
+        return fut
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Executa `fn` no pool e aguarda sem bloquear o event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "active": self._active,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+db_executor = BoundedExecutor("db", EXEC_DB_WORKERS)
+llm_executor = BoundedExecutor("llm", EXEC_LLM_WORKERS)
+cpu_executor = BoundedExecutor("cpu", EXEC_CPU_WORKERS)
+io_executor = BoundedExecutor("io", EXEC_IO_WORKERS)
+ocr_executor = BoundedExecutor("ocr", EXEC_OCR_WORKERS)
+
+_ALL = (db_executor, llm_executor, cpu_executor, io_executor, ocr_executor)
+
+metrics.register_source("executors", lambda: {e.name: e.stats() for e in _ALL})
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa chamada bloqueante de banco no pool `db`."""
+    return await db_executor.run(fn, *args, **kwargs)
+
+
+async def run_llm(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa chamada à OpenAI no pool `llm`."""
+    return await llm_executor.run(fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa trabalho de CPU (imagem/PDF) no pool `cpu`."""
+    return await cpu_executor.run(fn, *args, **kwargs)
+
+
+async def run_ocr(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa OCR local no pool `ocr`."""
+    return await ocr_executor.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa disco/uploads externos no pool `io`."""
+    return await io_executor.run(fn, *args, **kwargs)
+
+
+def shutdown_executors() -> None:
+    """Encerra os pools (shutdown da aplicação)."""
+    for e in _ALL:
+        e.shutdown()
@@ -5,19 +5,40 @@
 - Usa por+eng se disponíveis.
 - Pré-processa a imagem (EXIF, resize ~1800px, grayscale, denoise, autocontraste).
 - Logs claros do caminho usado e idiomas encontrados.
+- Executável e idiomas são resolvidos uma vez por processo.
+- Com `tesserocr` instalado, cada worker do pool `ocr` mantém uma instância da
+  API carregada (sem subprocesso por imagem); sem ele, usa o pytesseract no
+  mesmo pool, limitado ao nº de CPUs.
 """
 
 import io
 import os
+import time
 import logging
 import shutil
 import subprocess
+import threading
+from functools import lru_cache
 from typing import Optional, List
 
 from PIL import Image, ImageOps, ImageFilter
 import pytesseract
 
+from . import metrics
+from .executors import run_ocr
 
+try:  # binding nativo opcional: mantém o modelo carregado entre imagens
+    import tesserocr
+except ImportError:  # pragma: no cover - depende do ambiente
+    tesserocr = None
+
+OCR_PSM = 6  # bloco de texto
+OCR_CONFIG = f"--oem 1 --psm {OCR_PSM}"
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
 def _resolve_tesseract_cmd() -> Optional[str]:
     # 1) VAR explícita
     env_cmd = os.getenv("TESSERACT_CMD")
@@ -50,8 +71,7 @@ def _list_langs(cmd: str) -> List[str]:
         return []
 
 
-def _best_lang(cmd: str) -> Optional[str]:
-    langs = _list_langs(cmd)
+def _escolher_lang(langs: List[str]) -> Optional[str]:
     has_por = "por" in langs
     has_eng = "eng" in langs
     if has_por and has_eng:
@@ -63,7 +83,35 @@ def _best_lang(cmd: str) -> Optional[str]:
     return None
 
 
-def extract_text_from_image(file_bytes: bytes) -> str:
+@lru_cache(maxsize=4)
+def _best_lang(cmd: str) -> Optional[str]:
+    lang = _escolher_lang(_list_langs(cmd))
+    if lang:
+        logging.info("🗣️ Idioma(s) OCR: %s", lang)
+    else:
+        logging.warning("🗣️ Nenhum 'por/eng' instalado; seguindo sem lang.")
+    return lang
+
+
+@lru_cache(maxsize=1)
+def _tessdata() -> Optional[str]:
+    tdata = os.getenv("TESSDATA_PREFIX")
+    if tdata and os.path.isdir(tdata):
+        logging.info("📁 TESSDATA_PREFIX: %s", tdata)
+        return tdata
+    return None
+
+
+@lru_cache(maxsize=1)
+def _tesserocr_lang() -> Optional[str]:
+    """Idiomas disponíveis para o binding (sem subprocesso)."""
+    tdata = _tessdata()
+    _, langs = tesserocr.get_languages(tdata) if tdata else tesserocr.get_languages()
+    return _escolher_lang([lang.lower() for lang in langs])
+
+
+@lru_cache(maxsize=1)
+def _configurar_pytesseract() -> str:
     tcmd = _resolve_tesseract_cmd()
     if not tcmd:
         raise RuntimeError(
@@ -72,11 +120,27 @@ def extract_text_from_image(file_bytes: bytes) -> str:
         )
     pytesseract.pytesseract.tesseract_cmd = tcmd
     logging.info("🧭 Tesseract: %s", tcmd)
-
-    tdata = os.getenv("TESSDATA_PREFIX")
-    if tdata and os.path.isdir(tdata):
-        logging.info("📁 TESSDATA_PREFIX: %s", tdata)
-
+    _tessdata()
+    return tcmd
+
+
+def _api_do_worker():
+    """Instância do tesserocr deste thread (criada no primeiro uso e reaproveitada)."""
+    api = getattr(_local, "api", None)
+    if api is None:
+        kwargs = {"psm": tesserocr.PSM.SINGLE_BLOCK, "oem": tesserocr.OEM.LSTM_ONLY}
+        lang = _tesserocr_lang()
+        if lang:
+            kwargs["lang"] = lang
+        if _tessdata():
+            kwargs["path"] = _tessdata()
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        _local.api = api
+        logging.info("🧭 Worker OCR pronto (tesserocr, lang=%s)", lang or "-")
+    return api
+
+
+def _preprocessar(file_bytes: bytes) -> Image.Image:
     # Carrega & corrige rotação
     image = Image.open(io.BytesIO(file_bytes))
     image = ImageOps.exif_transpose(image)
@@ -87,16 +151,49 @@ def extract_text_from_image(file_bytes: bytes) -> str:
         ratio = 1800 / float(img.width)
         img = img.resize((int(img.width * ratio), int(img.height * ratio)), Image.LANCZOS)
     img = img.filter(ImageFilter.MedianFilter(size=3))
-    img = ImageOps.autocontrast(img)
+    return ImageOps.autocontrast(img)
+
+
+def avisar_modo_ocr() -> None:
+    """Registra no log (na subida da API) se o OCR roda no binding ou em subprocesso."""
+    if tesserocr is not None:
+        logging.info("🧭 OCR local: tesserocr (API carregada por worker)")
+    elif _resolve_tesseract_cmd():
+        logging.warning(
+            "⚠️ tesserocr não instalado: cada OCR abre um processo 'tesseract' "
+            "(instale libtesseract-dev e o pacote tesserocr)"
+        )
+    else:
+        logging.warning("⚠️ Tesseract não encontrado: OCR local desativado, CNH vai direto ao GPT")
 
-    # Idiomas
+
+def ocr_disponivel() -> bool:
+    """True se houver binding ou executável do Tesseract neste processo."""
+    return tesserocr is not None or _resolve_tesseract_cmd() is not None
+
+
+def extract_text_from_image(file_bytes: bytes) -> str:
+    """OCR síncrono (bloqueante); nas rotas use `extract_text_from_image_async`."""
+    img = _preprocessar(file_bytes)
+
+    inicio = time.perf_counter()
+    if tesserocr is not None:
+        api = _api_do_worker()
+        api.SetImage(img)
+        text = api.GetUTF8Text()
+        metrics.observe("ocr.tesserocr", time.perf_counter() - inicio)
+        return text.strip()
+
+    tcmd = _configurar_pytesseract()
     lang = _best_lang(tcmd)
     if lang:
-        logging.info("🗣️ Idioma(s) OCR: %s", lang)
-        config = "--oem 1 --psm 6"  # bloco de texto
-        text = pytesseract.image_to_string(img, lang=lang, config=config)
+        text = pytesseract.image_to_string(img, lang=lang, config=OCR_CONFIG)
     else:
-        logging.warning("🗣️ Nenhum 'por/eng' instalado; seguindo sem lang.")
-        text = pytesseract.image_to_string(img, config="--oem 1 --psm 6")
-
+        text = pytesseract.image_to_string(img, config=OCR_CONFIG)
+    metrics.observe("ocr.subprocess", time.perf_counter() - inicio)
     return text.strip()
+
+
+async def extract_text_from_image_async(file_bytes: bytes) -> str:
+    """Entrega a imagem ao pool `ocr` (um worker por núcleo) e aguarda o texto."""
+    return await run_ocr(extract_text_from_image, file_bytes)
@@ -0,0 +1,329 @@
+"""Cache em disco (SQLite) das extrações feitas pelo GPT, endereçado por conteúdo.
+
+A chave é o SHA-256 do conteúdo já pré-processado (bytes da imagem ou texto do
+PDF) junto com prompt, modelo e schema: a mesma foto reenviada pelo WhatsApp
+não gera novas chamadas à OpenAI.
+
+- `EXTRACTION_CACHE_MAX_MB`: tamanho máximo; acima dele saem as entradas menos
+  usadas (LRU pelo último acesso).
+- `EXTRACTION_CACHE_MAX_AGE`: idade máxima (s) de uma entrada, contada da gravação.
+- Chamadas concorrentes com a mesma chave aguardam uma única extração.
+- Nas rotas async, leitura e gravação rodam no pool de IO (fora do event loop).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from . import metrics
+from .executors import run_io
+from .single_flight import AsyncSingleFlight
+
+CACHE_PATH = Path(
+    os.getenv(
+        "EXTRACTION_CACHE_PATH",
+        str(Path(__file__).resolve().parent.parent / "cache" / "extractions.sqlite"),
+    )
+)
+CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no", "")
+MAX_BYTES = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", "200")) * 1024 * 1024)
+MAX_AGE = float(os.getenv("EXTRACTION_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+
+# Muda quando o formato do valor gravado mudar (invalida tudo que já existe)
+_VERSAO = "1"
+
+# Ao passar do limite, remove até sobrar esta fração do tamanho máximo
+_ALVO_EVICCAO = 0.9
+# Intervalo mínimo (s) entre varreduras por idade
+_INTERVALO_EXPURGO = 600.0
+# Só regrava o último acesso se ele for mais antigo que isto (s)
+_TOQUE_MINIMO = 60.0
+# Entradas removidas por comando na evicção por tamanho
+_LOTE_EVICCAO = 64
+
+_SQL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS extracoes (
+        chave TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        tamanho INTEGER NOT NULL,
+        criado_em REAL NOT NULL,
+        acessado_em REAL NOT NULL
+    )
+"""
+_SQL_INDICE = "CREATE INDEX IF NOT EXISTS ix_extracoes_acesso ON extracoes (acessado_em)"
+
+_lock = threading.Lock()
+_con: Optional[sqlite3.Connection] = None
+_total_bytes = 0
+_ultimo_expurgo = 0.0
+_desativado = not CACHE_ENABLED
+
+_flights: Dict[str, "_Flight"] = {}
+_aflights = AsyncSingleFlight()
+_stats = {"hits": 0, "misses": 0, "shared": 0, "stores": 0, "evictions": 0, "expired": 0, "errors": 0}
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def chave(conteudo: Union[bytes, str, None], *partes: Any) -> str:
+    """SHA-256 do conteúdo + partes (prompt, modelo, schema...) em hexadecimal."""
+    h = hashlib.sha256()
+    h.update(_VERSAO.encode("ascii"))
+    for parte in (conteudo, *partes):
+        if parte is None:
+            dado = b""
+        elif isinstance(parte, bytes):
+            dado = parte
+        elif isinstance(parte, str):
+            dado = parte.encode("utf-8")
+        else:
+            dado = json.dumps(parte, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        # prefixo com o tamanho evita colisões entre concatenações diferentes
+        h.update(len(dado).to_bytes(8, "big"))
+        h.update(dado)
+    return h.hexdigest()
+
+
+def _contar(nome: str, n: int = 1) -> None:
+    with _lock:
+        _stats[nome] += n
+    metrics.incr(f"extraction_cache.{nome}", n)
+
+
+def _conexao_locked() -> Optional[sqlite3.Connection]:
+    """Abre o banco na primeira utilização; falhas desativam o cache no processo."""
+    global _con, _total_bytes, _desativado
+    if _con is not None or _desativado:
+        return _con
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(str(CACHE_PATH), timeout=5.0, check_same_thread=False, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(_SQL_SCHEMA)
+        con.execute(_SQL_INDICE)
+        _total_bytes = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM extracoes").fetchone()[0]
+        _con = con
+        logging.info("Cache de extrações em %s (%.1f MB)", CACHE_PATH, _total_bytes / 1048576)
+    except Exception as exc:
+        logging.warning("Cache de extrações indisponível (%s): %s", CACHE_PATH, exc)
+        _desativado = True
+    return _con
+
+
+def _falha(exc: BaseException) -> None:
+    logging.warning("Cache de extrações: %s", exc)
+    _contar("errors")
+
+
+def get(key: str) -> Optional[Any]:
+    """Valor gravado para a chave (ou None se ausente/vencido)."""
+    agora = time.time()
+    try:
+        with _lock:
+            con = _conexao_locked()
+            if con is None:
+                return None
+            row = con.execute(
+                "SELECT valor, tamanho, criado_em, acessado_em FROM extracoes WHERE chave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            valor, tamanho, criado_em, acessado_em = row
+            if MAX_AGE > 0 and agora - criado_em > MAX_AGE:
+                _remover_locked(con, key, tamanho)
+                _stats["expired"] += 1
+                return None
+            if agora - acessado_em > _TOQUE_MINIMO:
+                con.execute("UPDATE extracoes SET acessado_em = ? WHERE chave = ?", (agora, key))
+        return json.loads(valor)
+    except Exception as exc:
+        _falha(exc)
+        return None
+
+
+def put(key: str, tipo: str, valor: Any) -> None:
+    """Grava o valor (serializável em JSON) e aplica os limites de tamanho e idade."""
+    global _total_bytes
+    try:
+        texto = json.dumps(valor, ensure_ascii=False)
+        tamanho = len(texto.encode("utf-8")) + len(key)
+        agora = time.time()
+        with _lock:
+            con = _conexao_locked()
+            if con is None:
+                return
+            antigo = con.execute("SELECT tamanho FROM extracoes WHERE chave = ?", (key,)).fetchone()
+            con.execute(
+                "INSERT OR REPLACE INTO extracoes (chave, tipo, valor, tamanho, criado_em, acessado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tipo, texto, tamanho, agora, agora),
+            )
+            _total_bytes += tamanho - (antigo[0] if antigo else 0)
+            _stats["stores"] += 1
+            _limitar_locked(con, agora)
+    except Exception as exc:
+        _falha(exc)
+
+
+def _remover_locked(con: sqlite3.Connection, key: str, tamanho: int) -> None:
+    global _total_bytes
+    con.execute("DELETE FROM extracoes WHERE chave = ?", (key,))
+    _total_bytes -= tamanho
+
+
+def _limitar_locked(con: sqlite3.Connection, agora: float) -> None:
+    """Remove entradas vencidas (periodicamente) e as menos usadas acima do limite."""
+    global _total_bytes, _ultimo_expurgo
+    removidas = 0
+    if MAX_AGE > 0 and agora - _ultimo_expurgo > _INTERVALO_EXPURGO:
+        _ultimo_expurgo = agora
+        cur = con.execute("DELETE FROM extracoes WHERE criado_em < ?", (agora - MAX_AGE,))
+        if cur.rowcount:
+            _stats["expired"] += cur.rowcount
+            _total_bytes = con.execute("SELECT COALESCE(SUM(tamanho), 0) FROM extracoes").fetchone()[0]
+
+    if _total_bytes <= MAX_BYTES:
+        return
+    alvo = int(MAX_BYTES * _ALVO_EVICCAO)
+    while _total_bytes > alvo:
+        # Menos usadas primeiro, em lotes pelo índice de acessado_em (sem ler a tabela toda)
+        liberados = con.execute(
+            "DELETE FROM extracoes WHERE chave IN"
+            " (SELECT chave FROM extracoes ORDER BY acessado_em LIMIT ?) RETURNING tamanho",
+            (_LOTE_EVICCAO,),
+        ).fetchall()
+        if not liberados:
+            _total_bytes = 0
+            break
+        _total_bytes -= sum(t for (t,) in liberados)
+        removidas += len(liberados)
+    if removidas:
+        _stats["evictions"] += removidas
+        metrics.incr("extraction_cache.evictions", removidas)
+        logging.info("Cache de extrações: %d entradas removidas por tamanho", removidas)
+
+
+def get_or_compute(
+    key: str,
+    tipo: str,
+    compute: Callable[[], Any],
+    cacheable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """
+    Retorna do cache ou executa `compute` uma única vez por chave (entre threads).
+    `cacheable(valor)` decide se o resultado é gravado (ex.: não gravar falhas).
+    """
+    if _desativado:
+        return compute()
+    valor = get(key)
+    if valor is not None:
+        _contar("hits")
+        return valor
+
+    with _lock:
+        flight = _flights.get(key)
+        owner = flight is None
+        if owner:
+            flight = _Flight()
+            _flights[key] = flight
+    if not owner:
+        _contar("shared")
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    _contar("misses")
+    try:
+        valor = compute()
+        if cacheable is None or cacheable(valor):
+            put(key, tipo, valor)
+        flight.value = valor
+        return valor
+    except BaseException as exc:  # noqa: B902 - repassado aos chamadores
+        flight.error = exc
+        raise
+    finally:
+        with _lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+async def _aget(key: str) -> Optional[Any]:
+    """`get` no pool de IO (o SQLite bloqueia); pool saturado conta como ausência."""
+    try:
+        return await run_io(get, key)
+    except Exception as exc:
+        _falha(exc)
+        return None
+
+
+async def _aput(key: str, tipo: str, valor: Any) -> None:
+    try:
+        await run_io(put, key, tipo, valor)
+    except Exception as exc:
+        _falha(exc)
+
+
+async def aget_or_compute(
+    key: str,
+    tipo: str,
+    compute: Callable[[], Awaitable[Any]],
+    cacheable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """
+    Versão assíncrona de `get_or_compute`: o SQLite roda no pool de IO e a
+    extração roda em uma task compartilhada pelos chamadores da mesma chave.
+    Cancelar um chamador não cancela a extração enquanto outro aguardar.
+    """
+    if _desativado:
+        return await compute()
+    valor = await _aget(key)
+    if valor is not None:
+        _contar("hits")
+        return valor
+
+    async def _calcular() -> Any:
+        resultado = await compute()
+        if cacheable is None or cacheable(resultado):
+            await _aput(key, tipo, resultado)
+        return resultado
+
+    _contar("shared" if key in _aflights else "misses")
+    return await _aflights.run(key, _calcular)
+
+
+def stats() -> Dict[str, Any]:
+    """Contadores, taxa de acerto e ocupação do cache."""
+    with _lock:
+        s = dict(_stats)
+        s["enabled"] = not _desativado
+        s["size_bytes"] = _total_bytes
+        s["max_bytes"] = MAX_BYTES
+        consultas = s["hits"] + s["misses"] + s["shared"]
+        # chamadas que compartilharam uma extração em andamento também pouparam o GPT
+        s["hit_rate"] = round((s["hits"] + s["shared"]) / consultas, 4) if consultas else 0.0
+        if _con is not None:
+            try:
+                s["entries"] = _con.execute("SELECT COUNT(*) FROM extracoes").fetchone()[0]
+            except Exception:
+                pass
+    return s
+
+
+metrics.register_source("extraction_cache", stats)
@@ -0,0 +1,114 @@
+"""Execução concorrente dos passes independentes de extração do /upload.
+
+O passe principal (cartão/preview) é obrigatório; os secundários (verificação
+focada, chave do CT-e) rodam ao mesmo tempo e, se atrasarem além do prazo,
+a resposta sai sem eles. Um passe atrasado não é cancelado: termina em segundo
+plano (limitado pelo timeout da OpenAI) e seu resultado fica no cache de
+extrações para o próximo reenvio. Já se quem chamou for cancelado (ex.: o
+cliente do /upload/stream desconectou), todos os passes são cancelados; uma
+extração compartilhada no cache segue enquanto outro upload a aguardar.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from . import metrics
+
+UPLOAD_PRIMARY_TIMEOUT = float(os.getenv("UPLOAD_PRIMARY_TIMEOUT", "90"))
+UPLOAD_SECONDARY_TIMEOUT = float(os.getenv("UPLOAD_SECONDARY_TIMEOUT", "20"))
+
+# Referências aos passes abandonados (evita coleta antes de terminarem)
+_em_segundo_plano: Set["asyncio.Task[Any]"] = set()
+
+
+def _medir(nome: str, inicio: float, task: "asyncio.Task[Any]") -> None:
+    metrics.observe(f"upload.pass.{nome}", time.perf_counter() - inicio)
+    if not task.cancelled() and task.exception() is not None:
+        metrics.incr(f"upload.pass.{nome}.errors")
+
+
+def _abandonar(nome: str, task: "asyncio.Task[Any]") -> None:
+    """Deixa o passe terminar sozinho, registrando falhas no log."""
+    _em_segundo_plano.add(task)
+
+    def _fim(t: "asyncio.Task[Any]") -> None:
+        _em_segundo_plano.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logging.warning("Passe %s terminou com erro em segundo plano: %s", nome, t.exception())
+
+    task.add_done_callback(_fim)
+
+
+async def executar_passes(
+    principal: Tuple[str, Awaitable[Any]],
+    secundarios: Dict[str, Awaitable[Any]],
+    timeout_principal: Optional[float] = None,
+    timeout_secundario: Optional[float] = None,
+) -> Tuple[Any, Dict[str, Optional[Any]]]:
+    """
+    Executa o passe principal e os secundários em paralelo.
+
+    Retorna (resultado_principal, {nome: resultado ou None}). Um secundário vale
+    None quando falha ou não termina até `timeout_secundario` (contado do início,
+    mas nunca antes do principal terminar, já que esperar por ele não custa nada).
+    Falha do principal é repassada; atraso dele vira HTTP 504.
+    """
+    timeout_principal = UPLOAD_PRIMARY_TIMEOUT if timeout_principal is None else timeout_principal
+    timeout_secundario = UPLOAD_SECONDARY_TIMEOUT if timeout_secundario is None else timeout_secundario
+    inicio = time.perf_counter()
+
+    nome_principal, coro_principal = principal
+    tarefas: Dict[str, "asyncio.Task[Any]"] = {}
+    for nome, coro in [(nome_principal, coro_principal), *secundarios.items()]:
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(lambda t, n=nome: _medir(n, inicio, t))
+        tarefas[nome] = task
+
+    tarefa_principal = tarefas.pop(nome_principal)
+    try:
+        await asyncio.wait({tarefa_principal}, timeout=timeout_principal)
+    except asyncio.CancelledError:
+        # Ninguém mais quer a resposta: não segue gastando chamadas
+        for task in (tarefa_principal, *tarefas.values()):
+            task.cancel()
+        raise
+
+    if not tarefa_principal.done():
+        metrics.incr(f"upload.pass.{nome_principal}.timeouts")
+        _abandonar(nome_principal, tarefa_principal)
+        for nome, task in tarefas.items():
+            _abandonar(nome, task)
+        raise HTTPException(status_code=504, detail="Tempo esgotado ao processar o documento")
+    if tarefa_principal.exception() is not None:
+        for nome, task in tarefas.items():
+            _abandonar(nome, task)
+    resultado = tarefa_principal.result()
+
+    pendentes = {t for t in tarefas.values() if not t.done()}
+    if pendentes:
+        restante = max(0.0, timeout_secundario - (time.perf_counter() - inicio))
+        try:
+            await asyncio.wait(pendentes, timeout=restante)
+        except asyncio.CancelledError:
+            for task in pendentes:
+                task.cancel()
+            raise
+
+    extras: Dict[str, Optional[Any]] = {}
+    for nome, task in tarefas.items():
+        if not task.done():
+            metrics.incr(f"upload.pass.{nome}.timeouts")
+            logging.warning("Passe %s atrasado; respondendo sem ele", nome)
+            _abandonar(nome, task)
+            extras[nome] = None
+        elif task.cancelled() or task.exception() is not None:
+            logging.warning("Passe %s falhou: %s", nome, None if task.cancelled() else task.exception())
+            extras[nome] = None
+        else:
+            extras[nome] = task.result()
+    return resultado, extras
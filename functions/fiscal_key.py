@@ -0,0 +1,164 @@
+"""Utilitários para a chave de acesso (44 dígitos) de documentos fiscais BR.
+
+Espelha `twilio/src/utils/fiscalKey.js` e acrescenta a validação dos campos
+(UF, AAMM e modelo) e a busca de candidatas em texto livre, para que a chave
+do CT-e seja resolvida localmente antes de recorrer ao GPT.
+Suporta: NF-e (55), CT-e (57), MDF-e (58), NFC-e (65), CT-e OS (67).
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+MODEL_MAP = {
+    "55": "NFE",
+    "57": "CTE",
+    "58": "MDFE",
+    "65": "NFCE",
+    "67": "CTEOS",
+}
+
+# Códigos IBGE das UFs (cUF, posições 1–2)
+UF_CODES = {
+    "11", "12", "13", "14", "15", "16", "17",
+    "21", "22", "23", "24", "25", "26", "27", "28", "29",
+    "31", "32", "33", "35",
+    "41", "42", "43",
+    "50", "51", "52", "53",
+}
+
+MODELOS_CTE = ("57", "67")
+
+# Sequências de dígitos com até dois separadores entre eles (espaço, ponto, barra, hífen)
+_RE_SEQUENCIA = re.compile(r"\d(?:[ \t.\-/]{0,2}\d)*")
+_RE_GRUPO = re.compile(r"\d+")
+
+
+def digits_only(s: Any = "") -> str:
+    """Remove tudo que não for dígito."""
+    return re.sub(r"\D+", "", str(s or ""))
+
+
+def calc_dv(key43: str) -> Optional[int]:
+    """Calcula o DV (módulo 11) para os 43 primeiros dígitos."""
+    s = digits_only(key43)
+    if len(s) != 43:
+        return None
+    # pesos 2..9 ciclando da direita p/ esquerda
+    peso = 2
+    soma = 0
+    for ch in reversed(s):
+        soma += int(ch) * peso
+        peso = 2 if peso == 9 else peso + 1
+    dv = 11 - soma % 11
+    # regra oficial: resto 0 ou 1 => DV = 0; senão DV = 11 - resto
+    return 0 if dv >= 10 else dv
+
+
+def dv_ok(key: str) -> bool:
+    """Comprimento + DV correto (equivale ao `validateAccessKey` do Node)."""
+    k = digits_only(key)
+    if len(k) != 44:
+        return False
+    return calc_dv(k[:43]) == int(k[43])
+
+
+def validate_access_key(key: str, modelos: Optional[Iterable[str]] = None) -> bool:
+    """
+    DV correto, UF existente, mês (AAMM) entre 01 e 12 e modelo conhecido.
+    `modelos` restringe os modelos aceitos (ex.: MODELOS_CTE).
+    """
+    k = digits_only(key)
+    if len(k) != 44:
+        return False
+    # campos antes do DV: descartam rápido as janelas de texto que não são chave
+    if k[:2] not in UF_CODES or not 1 <= int(k[4:6]) <= 12:
+        return False
+    if k[20:22] not in (modelos if modelos is not None else MODEL_MAP):
+        return False
+    return calc_dv(k[:43]) == int(k[43])
+
+
+def get_model_code(key: str) -> Optional[str]:
+    """Código do modelo (posições 21–22, 1-based)."""
+    k = digits_only(key)
+    return k[20:22] if len(k) == 44 else None
+
+
+def detect_doc_type(key: str) -> str:
+    """Tipo legível: NFE, CTE, MDFE, NFCE, CTEOS ou 'DESCONHECIDO'."""
+    return MODEL_MAP.get(get_model_code(key) or "", "DESCONHECIDO")
+
+
+def parse_access_key(key: str) -> Optional[Dict[str, Any]]:
+    """Quebra a chave em campos (útil para logs/roteamento)."""
+    k = digits_only(key)
+    if len(k) != 44:
+        return None
+    return {
+        "raw": k,
+        "cUF": k[0:2],
+        "AAMM": k[2:6],
+        "AA": k[2:4],
+        "MM": k[4:6],
+        "CNPJ": k[6:20],
+        "mod": k[20:22],
+        "serie": k[22:25],
+        "numero": k[25:34],
+        "tpEmis": k[34:35],
+        "cControle": k[35:43],
+        "dv": k[43:44],
+        "tipo": detect_doc_type(k),
+        "dvValido": dv_ok(k),
+    }
+
+
+def _inicios_de_janela(sequencia: str, total: int) -> List[int]:
+    """
+    Posições (em dígitos) das janelas de 44 que começam ou terminam numa borda
+    da sequência ou de um grupo separado por espaço/ponto/barra/hífen.
+    """
+    bordas = {0, total}
+    pos = 0
+    for g in _RE_GRUPO.finditer(sequencia):
+        pos += len(g.group(0))
+        bordas.add(pos)
+    inicios = {b for b in bordas if b + 44 <= total} | {b - 44 for b in bordas if b >= 44}
+    return sorted(inicios)
+
+
+def find_access_keys(text: str, modelos: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Todas as chaves válidas do texto, sem repetir. Aceita separadores entre os
+    dígitos (ex.: "3519 0812 3456 ...") e procura também em sequências mais
+    longas (números vizinhos colados à chave), mas só nas janelas de 44 dígitos
+    que começam ou terminam numa borda de grupo: deslizar por todas as posições
+    de um número longo acharia "chaves" válidas por acaso.
+    Sequências de exatamente 44 dígitos vêm primeiro, depois as janelas.
+    """
+    modelos = tuple(modelos) if modelos is not None else None
+    exatas: List[str] = []
+    janelas: List[str] = []
+    for m in _RE_SEQUENCIA.finditer(text or ""):
+        digits = digits_only(m.group(0))
+        if len(digits) == 44:
+            if digits not in exatas and validate_access_key(digits, modelos):
+                exatas.append(digits)
+            continue
+        if len(digits) < 44:
+            continue
+        for i in _inicios_de_janela(m.group(0), len(digits)):
+            cand = digits[i:i + 44]
+            if cand not in janelas and validate_access_key(cand, modelos):
+                janelas.append(cand)
+    return exatas + [k for k in janelas if k not in exatas]
+
+
+def extract_access_key(text: str, modelos: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Primeira chave válida do texto (None se não houver)."""
+    keys = find_access_keys(text, modelos)
+    return keys[0] if keys else None
+
+
+def extract_cte_access_key(text: str) -> Optional[str]:
+    """Chave de CT-e do texto; na falta dela, qualquer chave fiscal válida."""
+    return extract_access_key(text, MODELOS_CTE) or extract_access_key(text)
@@ -0,0 +1,74 @@
+"""Clientes HTTP compartilhados (keep-alive e pool de conexões).
+
+- `get_session()`: `requests.Session` para código síncrono.
+- `get_async_client()`: `httpx.AsyncClient` para rotas `async def`.
+Ambos reaproveitam conexões TCP com o Node em vez de abrir uma por requisição.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+NODE_INTERNAL_URL = os.getenv("NODE_INTERNAL_URL", "http://127.0.0.1:8081").rstrip("/")
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# (connect, read) no formato aceito pelo requests
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_session() -> requests.Session:
+    """Retorna a sessão síncrona compartilhada (criada no primeiro uso)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                # pool_block=True: acima do limite, espera uma conexão livre em vez de abrir outra
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    pool_block=True,
+                    max_retries=0,
+                )
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Retorna o cliente assíncrono compartilhado (criado no primeiro uso)."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _async_client
+
+
+async def close_http_clients() -> None:
+    """Fecha os clientes compartilhados (usado no shutdown)."""
+    global _session, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
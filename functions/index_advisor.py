@@ -0,0 +1,197 @@
+"""Diagnóstico de índices do banco do cliente.
+
+Confere, via RDB$INDICES/RDB$INDEX_SEGMENTS, se as colunas usadas nas buscas
+da API estão indexadas e lê o PLAN de cada SQL da API para apontar leituras
+NATURAL (varredura completa). Opcionalmente gera o DDL de correção.
+
+Usado por GET /internal/tenants/indexes e por python/utils/index_advisor.py.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .db_client import connect_client_db
+
+# (tabela, colunas) que as consultas da API precisam ter indexadas
+EXPECTED_INDEXES: Sequence[Tuple[str, Tuple[str, ...]]] = (
+    ("TABMOVTRA", ("NOMOVTRA",)),
+    ("TABCTRC", ("CHAVECTE",)),
+    ("TABCLI", ("NOCLI",)),
+    ("TABCLI", ("CGCCLI",)),
+    ("TABMOVTRA_NF", ("NOMOVTRA",)),
+    ("TABMOVTRA_OCO", ("NOMOVTRA", "NOITEM")),
+    ("DOCUMENTOS", ("CHAVE_ACESSO",)),
+)
+
+SQL_INDICES = """
+    SELECT TRIM(i.RDB$RELATION_NAME),
+           TRIM(i.RDB$INDEX_NAME),
+           TRIM(s.RDB$FIELD_NAME),
+           COALESCE(i.RDB$INDEX_INACTIVE, 0)
+      FROM RDB$INDICES i
+      JOIN RDB$INDEX_SEGMENTS s ON s.RDB$INDEX_NAME = i.RDB$INDEX_NAME
+     WHERE COALESCE(i.RDB$SYSTEM_FLAG, 0) = 0
+     ORDER BY 1, 2, s.RDB$FIELD_POSITION
+"""
+
+SQL_TABELAS = """
+    SELECT TRIM(RDB$RELATION_NAME)
+      FROM RDB$RELATIONS
+     WHERE COALESCE(RDB$SYSTEM_FLAG, 0) = 0
+"""
+
+_NATURAL_RE = re.compile(r"([\w$]+)\s+NATURAL", re.IGNORECASE)
+
+# Limite de nome de objeto no Firebird 2.5/3.0
+_MAX_NOME = 31
+
+
+def api_statements() -> Dict[str, Tuple[str, Optional[int]]]:
+    """
+    SQL usados pela API, lidos dos próprios módulos (evita cópia divergente), com
+    o dialeto da conexão em que cada um roda (None = padrão do fdb, Dialect 3).
+    """
+    from . import consultas_sql
+    from .save_ocorrencia import SQL_INSERE_OCORRENCIA
+    from .doc_index import SQL_TABCLI_NOVOS
+    from .save_precad_pessoa import SQL_CPF_TABCLI
+    from .save_to_firebird import SQL_MERGE, SQL_UPDATE_OR_INSERT
+
+    leitura = consultas_sql.SQL_DIALECT
+    return {
+        "entregas.numero": (consultas_sql.SQL_ENTREGA, leitura),
+        "entregas.batch": (consultas_sql.sql_entregas_lote(5), leitura),
+        "cte.chave": (consultas_sql.SQL_CTE, leitura),
+        "ocorrencia.insere": (SQL_INSERE_OCORRENCIA, None),
+        "confirmar.merge": (SQL_MERGE, None),
+        "confirmar.upsert": (SQL_UPDATE_OR_INSERT, None),
+        "precadastro.cpf_tabcli": (SQL_CPF_TABCLI, None),
+        "doc_index.tabcli_novos": (SQL_TABCLI_NOVOS, None),
+    }
+
+
+def _nome_indice(tabela: str, colunas: Sequence[str]) -> str:
+    nome = f"IX_{tabela}_{'_'.join(colunas)}"
+    return nome[:_MAX_NOME]
+
+
+def _ler_indices(cur) -> Dict[str, List[Dict[str, Any]]]:
+    """Índices por tabela: [{nome, colunas, ativo}] na ordem dos segmentos."""
+    cur.execute(SQL_INDICES)
+    por_nome: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for tabela, nome, coluna, inativo in cur.fetchall():
+        idx = por_nome.setdefault((tabela, nome), {"nome": nome, "colunas": [], "ativo": not inativo})
+        idx["colunas"].append(coluna)
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for (tabela, _), idx in por_nome.items():
+        out.setdefault(tabela, []).append(idx)
+    return out
+
+
+def _avaliar_indice(
+    tabela: str, colunas: Tuple[str, ...], tabelas: set, indices: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """Procura índice cujas primeiras colunas sejam `colunas` (prefixo serve)."""
+    item: Dict[str, Any] = {"tabela": tabela, "colunas": list(colunas), "indice": None, "ddl": None}
+    if tabela not in tabelas:
+        item["status"] = "tabela_ausente"
+        return item
+    candidatos = [
+        idx for idx in indices.get(tabela, [])
+        if tuple(idx["colunas"][:len(colunas)]) == colunas
+    ]
+    ativo = next((idx for idx in candidatos if idx["ativo"]), None)
+    if ativo:
+        item.update(status="ok", indice=ativo["nome"])
+    elif candidatos:
+        nome = candidatos[0]["nome"]
+        item.update(status="inativo", indice=nome, ddl=f"ALTER INDEX {nome} ACTIVE;")
+    else:
+        item.update(
+            status="ausente",
+            ddl=f"CREATE INDEX {_nome_indice(tabela, colunas)} ON {tabela} ({', '.join(colunas)});",
+        )
+    return item
+
+
+def _avaliar_plano(cur, nome: str, sql: str) -> Dict[str, Any]:
+    """Prepara o SQL (sem executar) e extrai as leituras NATURAL do PLAN."""
+    item: Dict[str, Any] = {"nome": nome, "plan": None, "natural": [], "erro": None}
+    try:
+        ps = cur.prep(sql)
+        plan = (ps.plan or "").strip()
+        item["plan"] = plan
+        item["natural"] = sorted(set(m.upper() for m in _NATURAL_RE.findall(plan)))
+    except Exception as exc:
+        item["erro"] = str(exc.args[0]) if getattr(exc, "args", None) else str(exc)
+    return item
+
+
+def analisar(cfg: Dict[str, Any], incluir_ddl: bool = False) -> Dict[str, Any]:
+    """Gera o relatório de índices e planos de um tenant."""
+    # Cada SQL é preparado no mesmo dialeto da conexão que a API usa para ele
+    conexoes = {None: connect_client_db(cfg)}
+    con = conexoes[None]
+    try:
+        cur = con.cursor()
+        cur.execute(SQL_TABELAS)
+        tabelas = {r[0] for r in cur.fetchall()}
+        indices = _ler_indices(cur)
+
+        itens = [_avaliar_indice(t, cols, tabelas, indices) for t, cols in EXPECTED_INDEXES]
+        planos = []
+        for nome, (sql, dialeto) in api_statements().items():
+            if dialeto not in conexoes:
+                conexoes[dialeto] = connect_client_db(cfg, sql_dialect=dialeto)
+            planos.append(_avaliar_plano(conexoes[dialeto].cursor(), nome, sql))
+        for c in conexoes.values():
+            c.rollback()
+
+        relatorio: Dict[str, Any] = {
+            "tenant": f"{cfg.get('host')}:{cfg.get('port')}:{cfg.get('database')}",
+            "server_version": getattr(con, "server_version", None),
+            "indices": itens,
+            "planos": planos,
+            "faltando": sum(1 for i in itens if i["status"] in ("ausente", "inativo")),
+            "varreduras": sum(1 for p in planos if p["natural"]),
+        }
+        if incluir_ddl:
+            relatorio["ddl"] = [i["ddl"] for i in itens if i["ddl"]]
+        logging.info(
+            "Índices %s: %d faltando, %d SQL com leitura NATURAL",
+            relatorio["tenant"], relatorio["faltando"], relatorio["varreduras"],
+        )
+        return relatorio
+    finally:
+        for c in conexoes.values():
+            try:
+                c.close()
+            except Exception:
+                pass
+
+
+def formatar(relatorio: Dict[str, Any]) -> str:
+    """Relatório em texto para o terminal."""
+    linhas = [f"Tenant: {relatorio['tenant']}"]
+    if relatorio.get("server_version"):
+        linhas.append(f"Servidor: {relatorio['server_version']}")
+    linhas.append("")
+    linhas.append("Índices esperados:")
+    for i in relatorio["indices"]:
+        alvo = f"{i['tabela']}({', '.join(i['colunas'])})"
+        extra = f" [{i['indice']}]" if i["indice"] else ""
+        linhas.append(f"  {i['status']:<15} {alvo}{extra}")
+    linhas.append("")
+    linhas.append("Planos dos SQL da API:")
+    for p in relatorio["planos"]:
+        if p["erro"]:
+            linhas.append(f"  ERRO    {p['nome']}: {p['erro']}")
+            continue
+        marca = "NATURAL" if p["natural"] else "ok"
+        linhas.append(f"  {marca:<7} {p['nome']}: {p['plan']}")
+    if relatorio.get("ddl"):
+        linhas.append("")
+        linhas.append("DDL sugerido:")
+        linhas.extend(f"  {d}" for d in relatorio["ddl"])
+    return "\n".join(linhas)
@@ -0,0 +1,71 @@
+"""Métricas simples em memória do processo (contadores, tempos e fontes dinâmicas).
+
+Exposto em GET /internal/metrics. Cada worker do uvicorn tem as suas.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_values: Dict[str, Any] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+_sources: Dict[str, Callable[[], Any]] = {}
+_started_at = time.time()
+
+
+def incr(name: str, n: float = 1) -> None:
+    """Soma `n` ao contador `name`."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def set_value(name: str, value: Any) -> None:
+    """Guarda um valor pontual (ex.: caminho carregado, tempo de startup)."""
+    with _lock:
+        _values[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Acumula uma duração (count, soma, máximo e último valor) em `name`."""
+    with _lock:
+        t = _timings.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+        ms = seconds * 1000.0
+        t["count"] += 1
+        t["total_ms"] += ms
+        t["last_ms"] = ms
+        if ms > t["max_ms"]:
+            t["max_ms"] = ms
+
+
+def register_source(name: str, fn: Callable[[], Any]) -> None:
+    """Registra uma função chamada a cada snapshot (ex.: estatísticas de pool/cache)."""
+    with _lock:
+        _sources[name] = fn
+
+
+def snapshot() -> Dict[str, Any]:
+    """Retorna todas as métricas do processo."""
+    with _lock:
+        counters = dict(_counters)
+        values = dict(_values)
+        timings = {
+            k: {**v, "avg_ms": (v["total_ms"] / v["count"]) if v["count"] else 0.0}
+            for k, v in _timings.items()
+        }
+        sources = dict(_sources)
+    out: Dict[str, Any] = {
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - _started_at, 1),
+        "counters": counters,
+        "values": values,
+        "timings": timings,
+    }
+    for name, fn in sources.items():
+        try:
+            out[name] = fn()
+        except Exception as exc:
+            out[name] = {"erro": str(exc)}
+    return out
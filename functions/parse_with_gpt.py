@@ -3,19 +3,68 @@ import os
 import io
 import re
 import json
+import time
 import base64
+import asyncio
+import hashlib
 import logging
-from typing import Optional, List, Dict
+import math
+import threading
+import contextvars
+from typing import Any, Awaitable, Callable, Optional, List, Dict, Tuple
 
+import httpx
 from fastapi import HTTPException
 from PIL import Image, ImageOps, ImageFilter
-from openai import OpenAI
+from openai import APITimeoutError, AsyncOpenAI, OpenAI
 from config import OPENAI_API_KEY
 
+from . import cnh_ocr, extraction_cache, fiscal_key, metrics, validators
+from .executors import run_cpu
+
 MODEL_PRIMARY = os.getenv("OPENAI_PRIMARY_MODEL", "gpt-4o-mini")
 MODEL_FALLBACK = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Níveis de modelo, do mais barato/rápido ao mais capaz. Sobe de nível quando a
+# nota do resultado (validadores do tipo) fica abaixo de OPENAI_ESCALATE_BELOW.
+MODEL_TIERS = list(dict.fromkeys(
+    m.strip() for m in os.getenv("OPENAI_MODEL_TIERS", f"{MODEL_PRIMARY},{MODEL_FALLBACK}").split(",") if m.strip()
+)) or [MODEL_PRIMARY]
+ESCALATE_BELOW = float(os.getenv("OPENAI_ESCALATE_BELOW", "0.6"))
+
+# Cliente assíncrono: timeout por chamada, conexões keep-alive e chamadas simultâneas
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+
+# Perfil de imagem por tipo de documento: "lado_max:detail:escala_min".
+# escala_min = quanto a imagem pode encolher para caber em menos tiles de 512px (1 desliga).
+VISION_PROFILES = {
+    "pessoa": os.getenv("VISION_PROFILE_PESSOA", "2048:high:0.9"),
+    "veiculo": os.getenv("VISION_PROFILE_VEICULO", "2048:high:0.9"),
+    "cte": os.getenv("VISION_PROFILE_CTE", "2048:high:0.9"),
+}
+# Sem tipo: comportamento original (1600px, high, sem ajuste a tiles)
+_VISION_PROFILE_PADRAO = "1600:high:1"
+
+# Tokens de imagem por família de modelo (base, por tile de 512px), conforme a
+# tabela da OpenAI; nomes datados ("gpt-4o-mini-2024-07-18") casam pelo prefixo
+_TILE_TOKENS = {"gpt-4o-mini": (2833, 5667)}
+_TILE_TOKENS_PADRAO = (85, 170)
+
+client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT)
+
+_async_client: Optional[AsyncOpenAI] = None
+_semaforo: Optional[asyncio.Semaphore] = None
+
+# Acumula o uso (tokens) das chamadas feitas dentro de um passe medido
+_uso_atual: "contextvars.ContextVar[Optional[Dict[str, int]]]" = contextvars.ContextVar("uso_gpt", default=None)
+
+# Chamadas à OpenAI feitas na requisição corrente (ver `contar_chamadas`)
+_chamadas_llm: "contextvars.ContextVar[Optional[Dict[str, int]]]" = contextvars.ContextVar("chamadas_llm", default=None)
 
 # -------- Prompts --------
 PROMPT_CNH_RULES = """
@@ -153,29 +202,286 @@ CARD_JSON_SCHEMA = {
 }
 
 # -------- Image utils --------
-def preprocess_image(image_bytes: bytes) -> bytes:
+def vision_profile(tipo: Optional[str]) -> Tuple[int, str, float]:
+    """(lado máximo, detail, escala mínima) configurados para o tipo de documento."""
+    raw = VISION_PROFILES.get((tipo or "").strip().lower(), _VISION_PROFILE_PADRAO)
+    try:
+        lado, detail, escala = (raw.split(":") + ["1"])[:3]
+        detail = detail.strip().lower()
+        if detail not in ("high", "low", "auto"):
+            raise ValueError(detail)
+        return int(lado), detail, min(1.0, max(0.1, float(escala)))
+    except ValueError:
+        logging.warning("Perfil de imagem inválido para %s: %r; usando o padrão.", tipo, raw)
+        lado, detail, escala = _VISION_PROFILE_PADRAO.split(":")
+        return int(lado), detail, float(escala)
+
+
+def _tiles(w: int, h: int) -> int:
+    return math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def _dimensao_servidor(w: int, h: int) -> Tuple[int, int]:
+    """Redimensionamento feito pela OpenAI em detail=high: cabe em 2048 e menor lado até 768."""
+    s = min(1.0, 2048 / max(w, h))
+    w, h = w * s, h * s
+    s = min(1.0, 768 / min(w, h))
+    return max(1, round(w * s)), max(1, round(h * s))
+
+
+def _custo_tiles(model: str) -> Tuple[int, int]:
+    """Custo da família mais específica (prefixo mais longo) que casa com `model`."""
+    nome = (model or "").strip().lower()
+    for familia in sorted(_TILE_TOKENS, key=len, reverse=True):
+        if nome == familia or nome.startswith(familia + "-"):
+            return _TILE_TOKENS[familia]
+    return _TILE_TOKENS_PADRAO
+
+
+def estimate_image_tokens(w: int, h: int, detail: str = "high", model: Optional[str] = None) -> int:
+    """Tokens de entrada cobrados por uma imagem (base + tiles de 512px em detail=high)."""
+    base, por_tile = _custo_tiles(model or MODEL_PRIMARY)
+    if detail == "low":
+        return base
+    return base + por_tile * _tiles(*_dimensao_servidor(w, h))
+
+
+def _dimensao_alvo(w: int, h: int, lado: int, detail: str, escala_min: float) -> Tuple[int, int]:
+    """
+    Tamanho a enviar: o que couber em `lado`, já no tamanho que o servidor usaria
+    (pixels a mais só custam upload) e, se encolher até `escala_min` economizar
+    uma linha/coluna de tiles, o menor deles.
+    """
+    s = min(1.0, lado / max(w, h))
+    w, h = max(1, round(w * s)), max(1, round(h * s))
+    if detail == "low":
+        s = min(1.0, 512 / max(w, h))
+        return max(1, round(w * s)), max(1, round(h * s))
+    if detail != "high":
+        return w, h
+    w, h = _dimensao_servidor(w, h)
+    melhor = (w, h)
+    for d in (w, h):
+        n = math.ceil(d / 512)
+        if n <= 1:
+            continue
+        s = (n - 1) * 512 / d
+        if s < escala_min:
+            continue
+        cand = (max(1, int(w * s)), max(1, int(h * s)))
+        if _tiles(*cand) < _tiles(*melhor) or (_tiles(*cand) == _tiles(*melhor) and cand[0] > melhor[0]):
+            melhor = cand
+    return melhor
+
+
+def preprocess_image(
+    image_bytes: bytes, max_side: int = 1600, detail: str = "high", escala_min: float = 1.0
+) -> bytes:
     with Image.open(io.BytesIO(image_bytes)) as img:
         img = ImageOps.exif_transpose(img)
         img = img.convert("L")
-        img.thumbnail((1600, 1600))
+        alvo = _dimensao_alvo(img.width, img.height, max_side, detail, escala_min)
+        if alvo != img.size:
+            img = img.resize(alvo, Image.LANCZOS)
         img = ImageOps.autocontrast(img, cutoff=1)
         img = img.filter(ImageFilter.UnsharpMask(radius=1.2, percent=150, threshold=3))
         buf = io.BytesIO()
         img.save(buf, format="JPEG", quality=92, optimize=True)
         return buf.getvalue()
 
+
+class PreparedImage:
+    """
+    Imagem pré-processada uma única vez por requisição e reaproveitada por todos
+    os passes (cartão, verificação, chave): bytes processados, data URL, SHA-256
+    e os tempos gastos para produzi-los.
+    """
+
+    __slots__ = (
+        "mime", "processed", "data_url", "sha256", "preprocess_s", "encode_s", "usos",
+        "tipo", "detail", "width", "height", "tokens_estimados",
+    )
+
+    def __init__(
+        self, processed: bytes, mime: str, preprocess_s: float = 0.0,
+        tipo: Optional[str] = None, detail: str = "high",
+    ) -> None:
+        t0 = time.perf_counter()
+        self.mime = mime
+        self.processed = processed
+        self.data_url = _data_url(processed)
+        self.sha256 = hashlib.sha256(processed).hexdigest()
+        self.tipo = tipo or "-"
+        self.detail = detail
+        with Image.open(io.BytesIO(processed)) as img:
+            self.width, self.height = img.size
+        self.tokens_estimados = estimate_image_tokens(self.width, self.height, detail)
+        self.preprocess_s = preprocess_s
+        self.encode_s = time.perf_counter() - t0
+        self.usos = 0
+
+    @classmethod
+    def from_bytes(cls, image_bytes: bytes, image_mime: str, tipo: Optional[str] = None) -> "PreparedImage":
+        """Decodifica, trata e codifica a imagem recebida no perfil do tipo (trabalho de CPU)."""
+        if not image_mime or not image_mime.startswith("image/"):
+            raise HTTPException(status_code=400, detail="image_mime inválido para imagem.")
+        lado, detail, escala_min = vision_profile(tipo)
+        t0 = time.perf_counter()
+        processed = preprocess_image(image_bytes, lado, detail, escala_min)
+        return cls(processed, image_mime, time.perf_counter() - t0, tipo, detail)
+
+    @property
+    def cache_id(self) -> str:
+        """Identidade da imagem para o cache de extrações (bytes + detail)."""
+        return f"{self.sha256}:{self.detail}"
+
+    @property
+    def ajuste(self) -> str:
+        """Rótulo da configuração usada (tipo, detail e tiles) para as métricas."""
+        tiles = _tiles(*_dimensao_servidor(self.width, self.height)) if self.detail == "high" else 0
+        return f"{self.tipo}.{self.detail}.{tiles}t"
+
+    @property
+    def custo_s(self) -> float:
+        """Tempo de CPU de uma preparação (pré-processamento + base64 + hash)."""
+        return self.preprocess_s + self.encode_s
+
+    @property
+    def poupado_s(self) -> float:
+        """CPU que seria gasta repetindo a preparação em cada passe além do primeiro."""
+        return max(0, self.usos - 1) * self.custo_s
+
+    def usar(self) -> "PreparedImage":
+        self.usos += 1
+        return self
+
+
+def _data_url(processed: bytes) -> str:
+    b64 = base64.b64encode(processed).decode("ascii")
+    return f"data:image/jpeg;base64,{b64}"
+
+
+def _preparar(
+    image: Optional[PreparedImage], image_bytes: Optional[bytes], image_mime: Optional[str]
+) -> Optional[PreparedImage]:
+    """Usa a imagem já preparada ou prepara os bytes recebidos (None para texto)."""
+    if image is not None:
+        return image.usar()
+    if image_bytes:
+        return PreparedImage.from_bytes(image_bytes, image_mime or "").usar()
+    return None
+
+
+async def _preparar_async(
+    image: Optional[PreparedImage], image_bytes: Optional[bytes], image_mime: Optional[str]
+) -> Optional[PreparedImage]:
+    if image is not None:
+        return image.usar()
+    if image_bytes:
+        prep = await run_cpu(PreparedImage.from_bytes, image_bytes, image_mime or "")
+        return prep.usar()
+    return None
+
+
+def _estimar_tokens(messages: List[dict], prep: Optional[PreparedImage]) -> int:
+    """Estimativa dos tokens de entrada antes do envio (texto ~4 caracteres/token)."""
+    chars = 0
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            chars += sum(len(p.get("text", "")) for p in content if p.get("type") == "text")
+    return chars // 4 + (prep.tokens_estimados if prep is not None else 0)
+
+
+def _contabilizar(resp: Any) -> None:
+    """Soma o uso informado pela OpenAI ao passe medido em andamento."""
+    uso = _uso_atual.get()
+    usage = getattr(resp, "usage", None)
+    if uso is None or usage is None:
+        return
+    uso["chamadas"] += 1
+    uso["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+    uso["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+
+def _registrar_visao(prep: PreparedImage, passe: str, estimados: int, inicio: float, uso: Dict[str, int]) -> None:
+    nome = f"vision.{prep.ajuste}"
+    metrics.observe(nome, time.perf_counter() - inicio)
+    metrics.incr(f"{nome}.passes")
+    metrics.incr(f"{nome}.tokens_estimados", estimados)
+    metrics.incr(f"{nome}.prompt_tokens", uso["prompt_tokens"])
+    logging.info(
+        "📐 %s (%s, %dx%d): ~%d tokens estimados, %d cobrados em %d chamada(s), %.0f ms",
+        passe, prep.ajuste, prep.width, prep.height, estimados,
+        uso["prompt_tokens"], uso["chamadas"], (time.perf_counter() - inicio) * 1000.0,
+    )
+
+
+def _medir(prep: Optional[PreparedImage], passe: str, messages: List[dict], fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Envolve a chamada ao GPT registrando latência e tokens da configuração de imagem."""
+    if prep is None:
+        return fn
+
+    def _executar() -> Any:
+        uso = {"chamadas": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        token = _uso_atual.set(uso)
+        inicio = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            _uso_atual.reset(token)
+            _registrar_visao(prep, passe, _estimar_tokens(messages, prep), inicio, uso)
+
+    return _executar
+
+
+def _medir_async(
+    prep: Optional[PreparedImage], passe: str, messages: List[dict], fn: Callable[[], Awaitable[Any]]
+) -> Callable[[], Awaitable[Any]]:
+    if prep is None:
+        return fn
+
+    async def _executar() -> Any:
+        uso = {"chamadas": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        token = _uso_atual.set(uso)
+        inicio = time.perf_counter()
+        try:
+            return await fn()
+        finally:
+            _uso_atual.reset(token)
+            _registrar_visao(prep, passe, _estimar_tokens(messages, prep), inicio, uso)
+
+    return _executar
+
+def contar_chamadas() -> Dict[str, int]:
+    """Passa a contar as chamadas à OpenAI do contexto atual (e das tasks criadas depois)."""
+    contagem = {"chamadas": 0}
+    _chamadas_llm.set(contagem)
+    return contagem
+
+
+def _registrar_chamada() -> None:
+    contagem = _chamadas_llm.get()
+    if contagem is not None:
+        contagem["chamadas"] += 1
+
 # -------- GPT helpers --------
 def _call_gpt_text(messages: List[dict], model: str) -> str:
+    _registrar_chamada()
     resp = client.chat.completions.create(
         model=model,
         messages=messages,
         temperature=0.0,
     )
+    _contabilizar(resp)
     content = (resp.choices[0].message.content or "").strip()
     logging.debug("[GPT/%s] out(300): %s", model, content[:300].replace("\n", " "))
     return content
 
 def _call_gpt_structured(messages: List[dict], model: str, schema: dict) -> dict:
+    _registrar_chamada()
     try:
         resp = client.chat.completions.create(
             model=model,
@@ -192,6 +498,127 @@ def _call_gpt_structured(messages: List[dict], model: str, schema: dict) -> dict
             temperature=0.0,
             response_format={"type": "json_object"},
         )
+    _contabilizar(resp)
+    content = (resp.choices[0].message.content or "").strip()
+    return json.loads(content)
+
+# -------- GPT helpers (async) --------
+def get_async_openai() -> AsyncOpenAI:
+    """Cliente assíncrono compartilhado (keep-alive e pool de conexões), criado no primeiro uso."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=OPENAI_TIMEOUT,
+            http_client=httpx.AsyncClient(
+                timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                ),
+            ),
+        )
+    return _async_client
+
+
+async def close_async_openai() -> None:
+    """Fecha o cliente assíncrono (chamado no shutdown da aplicação)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def _get_semaforo() -> asyncio.Semaphore:
+    global _semaforo
+    if _semaforo is None:
+        _semaforo = asyncio.Semaphore(max(1, OPENAI_MAX_CONCURRENCY))
+    return _semaforo
+
+
+async def _acreate(messages: List[dict], model: str, timeout: Optional[float], **kwargs: Any):
+    """chat.completions.create limitado por OPENAI_MAX_CONCURRENCY, com timeout por chamada."""
+    _registrar_chamada()
+    t0 = time.perf_counter()
+    async with _get_semaforo():
+        t1 = time.perf_counter()
+        metrics.observe("openai.wait", t1 - t0)
+        try:
+            resp = await get_async_openai().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                timeout=timeout or OPENAI_TIMEOUT,
+                **kwargs,
+            )
+            _contabilizar(resp)
+            return resp
+        except APITimeoutError:
+            metrics.incr("openai.timeouts")
+            raise
+        finally:
+            metrics.observe(f"openai.{model}", time.perf_counter() - t1)
+
+
+async def _acall_gpt_text(messages: List[dict], model: str, timeout: Optional[float] = None) -> str:
+    resp = await _acreate(messages, model, timeout)
+    content = (resp.choices[0].message.content or "").strip()
+    logging.debug("[GPT/%s] out(300): %s", model, content[:300].replace("\n", " "))
+    return content
+
+
+async def _acall_gpt_text_stream(
+    messages: List[dict], model: str, on_delta: Callable[[Optional[str]], None],
+    timeout: Optional[float] = None,
+) -> str:
+    """Como `_acall_gpt_text`, repassando cada trecho gerado a `on_delta` (stream=True)."""
+    _registrar_chamada()
+    t0 = time.perf_counter()
+    async with _get_semaforo():
+        t1 = time.perf_counter()
+        metrics.observe("openai.wait", t1 - t0)
+        partes: List[str] = []
+        try:
+            stream = await get_async_openai().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.0,
+                timeout=timeout or OPENAI_TIMEOUT,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    _contabilizar(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not partes:
+                        metrics.observe(f"openai.{model}.first_token", time.perf_counter() - t1)
+                    partes.append(chunk.choices[0].delta.content)
+                    on_delta(partes[-1])
+        except APITimeoutError:
+            metrics.incr("openai.timeouts")
+            raise
+        finally:
+            metrics.observe(f"openai.{model}", time.perf_counter() - t1)
+    content = "".join(partes).strip()
+    logging.debug("[GPT/%s] out(300): %s", model, content[:300].replace("\n", " "))
+    return content
+
+
+async def _acall_gpt_structured(
+    messages: List[dict], model: str, schema: dict, timeout: Optional[float] = None
+) -> dict:
+    try:
+        resp = await _acreate(
+            messages, model, timeout, response_format={"type": "json_schema", "json_schema": schema}
+        )
+    except APITimeoutError:
+        raise
+    except Exception as e:
+        logging.warning("json_schema não suportado (%s). Tentando json_object.", e)
+        resp = await _acreate(messages, model, timeout, response_format={"type": "json_object"})
     content = (resp.choices[0].message.content or "").strip()
     return json.loads(content)
 
@@ -216,9 +643,91 @@ def _is_empty_card(card_text: str) -> bool:
     has_date = bool(re.search(r"\b\d{2}/\d{2}/\d{4}\b", text))
     return not (len(non_dash) >= 3 and (has_doc_num or has_date))
 
+
+# -------- Roteamento por nível de modelo --------
+_tier_lock = threading.Lock()
+_tier_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _tier_contar(modelo: str, campo: str) -> None:
+    with _tier_lock:
+        st = _tier_stats.setdefault(modelo, {"calls": 0, "accepted": 0, "escalated": 0, "errors": 0})
+        st[campo] += 1
+
+
+def tier_stats() -> Dict[str, Dict[str, Any]]:
+    """Chamadas, aceites, escaladas e erros por modelo (com a taxa de escalada)."""
+    with _tier_lock:
+        out: Dict[str, Dict[str, Any]] = {}
+        for modelo, st in _tier_stats.items():
+            out[modelo] = {**st, "escalation_rate": round(st["escalated"] / st["calls"], 4) if st["calls"] else 0.0}
+        return out
+
+
+metrics.register_source("model_tiers", tier_stats)
+
+
+def nota_resultado(tipo: Optional[str], card_text: str, chave: Optional[str] = None) -> float:
+    """Nota de 0 a 1: cartão vazio vale 0; com validadores do tipo, a fração de campos válidos.
+
+    `_is_empty_card` segue o layout da CNH, por isso só vale para pessoa ou tipo desconhecido.
+    `chave`: chave de acesso já conhecida (CT-e), avaliada no lugar da linha do cartão.
+    """
+    if not card_text or card_text == _SEM_LEITURA:
+        return 0.0
+    nota = validators.nota_por_tipo(tipo)
+    if (nota is None or tipo == "pessoa") and _is_empty_card(card_text):
+        return 0.0
+    if nota is validators.nota_cte:
+        return nota(card_text, chave)
+    return nota(card_text) if nota else 1.0
+
+
+class _Escalonamento:
+    """Acompanha as tentativas nos níveis de modelo e guarda o melhor resultado."""
+
+    __slots__ = ("passe", "pontuar", "melhor", "melhor_nota", "erro", "inicio")
+
+    def __init__(self, passe: str, pontuar: Callable[[Any], float]) -> None:
+        self.passe = passe
+        self.pontuar = pontuar
+        self.melhor: Any = None
+        self.melhor_nota = -1.0
+        self.erro: Optional[BaseException] = None
+        self.inicio = 0.0
+
+    def iniciar(self, modelo: str) -> None:
+        _tier_contar(modelo, "calls")
+        self.inicio = time.perf_counter()
+
+    def aceitar(self, modelo: str, valor: Any, ultimo: bool) -> bool:
+        """Registra o resultado do nível; True encerra (bom o bastante ou último nível)."""
+        metrics.observe(f"tier.{modelo}", time.perf_counter() - self.inicio)
+        nota = self.pontuar(valor)
+        if nota > self.melhor_nota:
+            self.melhor, self.melhor_nota = valor, nota
+        if nota >= ESCALATE_BELOW:
+            _tier_contar(modelo, "accepted")
+            return True
+        if not ultimo:
+            _tier_contar(modelo, "escalated")
+            logging.info("⤴️ %s: nota %.2f com %s abaixo de %.2f; escalando", self.passe, nota, modelo, ESCALATE_BELOW)
+        return ultimo
+
+    def falhar(self, modelo: str, exc: BaseException) -> None:
+        metrics.observe(f"tier.{modelo}", time.perf_counter() - self.inicio)
+        _tier_contar(modelo, "errors")
+        logging.warning("%s: modelo %s falhou (%s)", self.passe, modelo, exc)
+        self.erro = exc
+
+    def resultado(self) -> Any:
+        if self.melhor is None and self.erro is not None:
+            raise self.erro
+        return self.melhor
+
 # -------- Message builders --------
 def _build_messages_for_image(
-    base_prompt: str, data_url: str, expect_json: bool = True
+    base_prompt: str, data_url: str, expect_json: bool = True, detail: str = "high"
 ) -> List[dict]:
     """Monta mensagens para envio de imagem ao GPT."""
     system = (
@@ -232,7 +741,7 @@ def _build_messages_for_image(
             "role": "user",
             "content": [
                 {"type": "text", "text": base_prompt},
-                {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
+                {"type": "image_url", "image_url": {"url": data_url, "detail": detail}},
             ],
         },
     ]
@@ -309,6 +818,80 @@ def _card_from_structured(d: dict) -> str:
     )
 
 # -------- Public API --------
+# Resposta padrão quando o GPT não devolve nada (não vai para o cache)
+_SEM_LEITURA = "Não consegui ler as informações do documento."
+
+_VER_VAZIO = {"DOB": "-", "RG": "-", "CNH_REG_11": "-", "CNH_REG_10": "-", "CPF": "-"}
+
+
+def _validar_entrada(
+    texto: Optional[str], image_bytes: Optional[bytes], image_mime: Optional[str],
+    image: Optional[PreparedImage] = None,
+) -> None:
+    if image is not None:
+        return
+    if not texto and not image_bytes:
+        raise HTTPException(status_code=400, detail="Nada para processar (texto ou imagem ausentes).")
+    if image_bytes and (not image_mime or not image_mime.startswith("image/")):
+        raise HTTPException(status_code=400, detail="image_mime inválido para imagem.")
+
+
+def _tipo_documento(tipo: Optional[str], prep: Optional[PreparedImage], base_prompt: str) -> Optional[str]:
+    """Tipo informado, o da imagem preparada ou o deduzido do prompt padrão."""
+    if tipo:
+        return tipo.strip().lower()
+    if prep is not None and prep.tipo != "-":
+        return prep.tipo
+    if base_prompt == PROMPT_CNH_RULES.strip():
+        return "pessoa"
+    if base_prompt == PROMPT_VEICULO_RULES.strip():
+        return "veiculo"
+    return None
+
+
+def _plano_parse(
+    texto: Optional[str],
+    prep: Optional[PreparedImage],
+    base_prompt: str,
+    use_structured: bool,
+    expect_json: bool,
+    tipo: Optional[str] = None,
+    chave: Optional[str] = None,
+) -> Tuple[List[dict], str, bool]:
+    """Mensagens, chave do cache e modo structured de uma chamada de parse."""
+    if prep is not None:
+        messages = _build_messages_for_image(base_prompt, prep.data_url, expect_json, prep.detail)
+        conteudo = prep.cache_id
+    else:
+        messages = _build_messages_for_text(base_prompt, texto or "", expect_json)
+        conteudo = texto or ""
+
+    structured = expect_json and use_structured
+    key = extraction_cache.chave(
+        conteudo, "parse", base_prompt, MODEL_TIERS, ESCALATE_BELOW, tipo,
+        CARD_JSON_SCHEMA if structured else None, expect_json, chave,
+    )
+    return messages, key, structured
+
+
+def _cartao_lido(d: dict) -> bool:
+    return d.get("text") != _SEM_LEITURA
+
+
+def _cartao_de_texto(card: str, expect_json: bool) -> dict:
+    """Converte a resposta em texto (às vezes JSON) no cartão final."""
+    card_str = card.strip()
+    if expect_json and card_str.startswith("{"):
+        try:
+            data = json.loads(card_str)
+            card_str = _card_from_structured(data)
+        except Exception:
+            pass
+
+    card_str = _sanitize_card(card_str) or _SEM_LEITURA
+    return {"kind": "text", "text": card_str}
+
+
 def parse_with_gpt(
     texto: Optional[str] = None,
     image_bytes: Optional[bytes] = None,
@@ -316,6 +899,9 @@ def parse_with_gpt(
     system_prompt: Optional[str] = None,
     use_structured: bool = True,
     expect_json: bool = True,
+    image: Optional[PreparedImage] = None,
+    tipo: Optional[str] = None,
+    chave: Optional[str] = None,
 ) -> dict:
     """
     Retorna {"kind":"text","text":"<cartão>"}.
@@ -323,32 +909,37 @@ def parse_with_gpt(
     2) Fallback para json_object.
     3) Fallback para texto; se texto for JSON e `expect_json` for True,
        converte para cartão.
-    4) Fallback de modelo (PRIMARY -> FALLBACK) quando necessário.
+    4) Níveis de modelo (MODEL_TIERS): sobe de nível se o modelo falhar ou se
+       a nota dos validadores do tipo ficar abaixo de ESCALATE_BELOW.
 
     Parâmetros:
     - expect_json: define se a resposta deve vir em JSON.
+    - image: imagem já preparada (dispensa image_bytes/image_mime).
+    - tipo: pessoa | veiculo | cte, para escolher os validadores (deduzido se omitido).
+    - chave: chave de acesso do CT-e já validada (código de barras/PDF); a nota
+      usa ela em vez da linha "Chave" do cartão.
     """
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY não configurada.")
-    if not texto and not image_bytes:
-        raise HTTPException(status_code=400, detail="Nada para processar (texto ou imagem ausentes).")
+    _validar_entrada(texto, image_bytes, image_mime, image)
 
     base_prompt = (system_prompt or PROMPT_CNH_RULES).strip()
+    prep = _preparar(image, image_bytes, image_mime)
+    tipo = _tipo_documento(tipo, prep, base_prompt)
+    messages, key, structured = _plano_parse(texto, prep, base_prompt, use_structured, expect_json, tipo, chave)
+    return extraction_cache.get_or_compute(
+        key, "parse",
+        _medir(prep, "cartao", messages, lambda: _extrair_cartao(messages, structured, expect_json, tipo, chave)),
+        cacheable=_cartao_lido,
+    )
 
-    if image_bytes:
-        if not image_mime or not image_mime.startswith("image/"):
-            raise HTTPException(status_code=400, detail="image_mime inválido para imagem.")
-        processed = preprocess_image(image_bytes)
-        b64 = base64.b64encode(processed).decode("ascii")
-        data_url = f"data:image/jpeg;base64,{b64}"
-        messages = _build_messages_for_image(base_prompt, data_url, expect_json)
-    else:
-        messages = _build_messages_for_text(base_prompt, texto or "", expect_json)
 
+def _cartao_no_modelo(messages: List[dict], model: str, structured: bool, expect_json: bool) -> dict:
+    """Tentativas em um modelo: structured (json_schema/json_object) e depois texto."""
     # 1) Structured (json_schema/json_object)
-    if expect_json and use_structured:
+    if structured:
         try:
-            data = _call_gpt_structured(messages, MODEL_PRIMARY, CARD_JSON_SCHEMA)
+            data = _call_gpt_structured(messages, model, CARD_JSON_SCHEMA)
             card = _sanitize_card(_card_from_structured(data))
             if card:
                 return {"kind": "text", "text": card}
@@ -356,93 +947,367 @@ def parse_with_gpt(
             logging.warning("Structured output falhou: %s", e1)
 
     # 2) Texto (pode vir JSON mesmo assim)
-    try:
-        card = _call_gpt_text(messages, MODEL_PRIMARY)
-    except Exception:
-        # tenta fallback de modelo
-        card = _call_gpt_text(messages, MODEL_FALLBACK)
+    return _cartao_de_texto(_call_gpt_text(messages, model), expect_json)
 
-    card_str = card.strip()
-    if expect_json and card_str.startswith("{"):
+
+def _extrair_cartao(
+    messages: List[dict], structured: bool, expect_json: bool,
+    tipo: Optional[str] = None, chave: Optional[str] = None,
+) -> dict:
+    """Percorre os níveis de modelo até a nota do cartão atingir o limite."""
+    esc = _Escalonamento("cartao", lambda d: nota_resultado(tipo, d.get("text") or "", chave))
+    for i, model in enumerate(MODEL_TIERS):
+        esc.iniciar(model)
         try:
-            data = json.loads(card_str)
-            card_str = _card_from_structured(data)
-        except Exception:
-            pass
+            card = _cartao_no_modelo(messages, model, structured, expect_json)
+        except Exception as e:
+            esc.falhar(model, e)
+            continue
+        if esc.aceitar(model, card, i == len(MODEL_TIERS) - 1):
+            break
+    return esc.resultado()
 
-    card_str = _sanitize_card(card_str) or "Não consegui ler as informações do documento."
-    return {"kind": "text", "text": card_str}
+
+async def parse_with_gpt_async(
+    texto: Optional[str] = None,
+    image_bytes: Optional[bytes] = None,
+    image_mime: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+    use_structured: bool = True,
+    expect_json: bool = True,
+    timeout: Optional[float] = None,
+    image: Optional[PreparedImage] = None,
+    tipo: Optional[str] = None,
+    on_delta: Optional[Callable[[Optional[str]], None]] = None,
+    chave: Optional[str] = None,
+) -> dict:
+    """
+    Versão assíncrona de `parse_with_gpt` (cliente compartilhado; `timeout` por chamada).
+
+    `on_delta` recebe o texto do cartão conforme o modelo gera (só no modo texto,
+    sem structured output); `None` indica que o texto parcial foi descartado
+    porque a extração subiu de nível de modelo.
+    """
+    if not OPENAI_API_KEY:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY não configurada.")
+    _validar_entrada(texto, image_bytes, image_mime, image)
+
+    base_prompt = (system_prompt or PROMPT_CNH_RULES).strip()
+    prep = await _preparar_async(image, image_bytes, image_mime)
+    tipo = _tipo_documento(tipo, prep, base_prompt)
+    messages, key, structured = _plano_parse(texto, prep, base_prompt, use_structured, expect_json, tipo, chave)
+    return await extraction_cache.aget_or_compute(
+        key, "parse",
+        _medir_async(
+            prep, "cartao", messages,
+            lambda: _extrair_cartao_async(messages, structured, expect_json, timeout, tipo, on_delta, chave),
+        ),
+        cacheable=_cartao_lido,
+    )
+
+
+async def _cartao_no_modelo_async(
+    messages: List[dict], model: str, structured: bool, expect_json: bool, timeout: Optional[float],
+    on_delta: Optional[Callable[[Optional[str]], None]] = None,
+) -> dict:
+    if structured:
+        try:
+            data = await _acall_gpt_structured(messages, model, CARD_JSON_SCHEMA, timeout)
+            card = _sanitize_card(_card_from_structured(data))
+            if card:
+                return {"kind": "text", "text": card}
+        except Exception as e1:
+            logging.warning("Structured output falhou: %s", e1)
+
+    if on_delta is not None and not structured:
+        return _cartao_de_texto(await _acall_gpt_text_stream(messages, model, on_delta, timeout), expect_json)
+    return _cartao_de_texto(await _acall_gpt_text(messages, model, timeout), expect_json)
+
+
+async def _extrair_cartao_async(
+    messages: List[dict], structured: bool, expect_json: bool, timeout: Optional[float],
+    tipo: Optional[str] = None,
+    on_delta: Optional[Callable[[Optional[str]], None]] = None,
+    chave: Optional[str] = None,
+) -> dict:
+    """Mesmos níveis de `_extrair_cartao`, sem bloquear o event loop."""
+    esc = _Escalonamento("cartao", lambda d: nota_resultado(tipo, d.get("text") or "", chave))
+    for i, model in enumerate(MODEL_TIERS):
+        if i and on_delta is not None:
+            on_delta(None)
+        esc.iniciar(model)
+        try:
+            card = await _cartao_no_modelo_async(messages, model, structured, expect_json, timeout, on_delta)
+        except Exception as e:
+            esc.falhar(model, e)
+            continue
+        if esc.aceitar(model, card, i == len(MODEL_TIERS) - 1):
+            break
+    return esc.resultado()
 
 # -------- 2º passe focado --------
-def verify_cnh_fields_from_image(image_bytes: bytes, image_mime: str) -> Dict[str, str]:
+def _mensagens_verificacao(prep: PreparedImage) -> List[dict]:
+    return [
+        {"role": "system", "content": "Responda estritamente no formato solicitado (json não é necessário)."},
+        {"role": "user", "content": [
+            {"type": "text", "text": PROMPT_VERIFY},
+            {"type": "image_url", "image_url": {"url": prep.data_url, "detail": prep.detail}},
+        ]},
+    ]
+
+
+def _verificacao_lida(r: Dict[str, str]) -> bool:
+    return any(v != "-" for v in r.values())
+
+
+def verify_cnh_fields_from_image(
+    image_bytes: Optional[bytes] = None,
+    image_mime: Optional[str] = None,
+    image: Optional[PreparedImage] = None,
+) -> Dict[str, str]:
     """
     Retorna: {DOB, RG, CNH_REG_11, CNH_REG_10, CPF}
     """
     try:
-        processed = preprocess_image(image_bytes)
-        b64 = base64.b64encode(processed).decode("ascii")
-        data_url = f"data:image/jpeg;base64,{b64}"
-        messages = [
-            {"role": "system", "content": "Responda estritamente no formato solicitado (json não é necessário)."},
-            {"role": "user", "content": [
-                {"type": "text", "text": PROMPT_VERIFY},
-                {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}},
-            ]},
-        ]
-        out = _call_gpt_text(messages, MODEL_PRIMARY)
-        res = {"DOB": "-", "RG": "-", "CNH_REG_11": "-", "CNH_REG_10": "-", "CPF": "-"}
-        for line in out.splitlines():
-            line = line.strip()
-            m = re.match(r"^(DOB|RG|CNH_REG_11|CNH_REG_10|CPF):\s*(.*)$", line, flags=re.I)
-            if not m:
-                continue
-            key = m.group(1).upper()
-            val = (m.group(2) or "").strip()
-            if key == "DOB":
-                if re.fullmatch(r"\d{2}/\d{2}/\d{4}", val): res["DOB"] = val
-            elif key == "RG":
-                digits = re.sub(r"\D", "", val)
-                if 6 <= len(digits) <= 10: res["RG"] = digits
-            elif key == "CNH_REG_11":
-                digits = re.sub(r"\D", "", val)
-                if len(digits) == 11: res["CNH_REG_11"] = digits
-            elif key == "CNH_REG_10":
-                digits = re.sub(r"\D", "", val)
-                if len(digits) == 10: res["CNH_REG_10"] = digits
-            elif key == "CPF":
-                digits = re.sub(r"\D", "", val)
-                if len(digits) == 11: res["CPF"] = digits
-        return res
+        prep = _preparar(image, image_bytes, image_mime)
+        messages = _mensagens_verificacao(prep)
+        key = extraction_cache.chave(prep.cache_id, "verify", PROMPT_VERIFY, MODEL_PRIMARY)
+        return extraction_cache.get_or_compute(
+            key, "verify",
+            _medir(prep, "verificacao", messages,
+                   lambda: _interpretar_verificacao(_call_gpt_text(messages, MODEL_PRIMARY))),
+            cacheable=_verificacao_lida,
+        )
     except Exception as e:
         logging.warning("verify_cnh_fields_from_image falhou: %s", e)
-        return {"DOB": "-", "RG": "-", "CNH_REG_11": "-", "CNH_REG_10": "-", "CPF": "-"}
+        return dict(_VER_VAZIO)
+
+
+async def verify_cnh_fields_from_image_async(
+    image_bytes: Optional[bytes] = None,
+    image_mime: Optional[str] = None,
+    timeout: Optional[float] = None,
+    image: Optional[PreparedImage] = None,
+) -> Dict[str, str]:
+    """Versão assíncrona de `verify_cnh_fields_from_image`."""
+    try:
+        prep = await _preparar_async(image, image_bytes, image_mime)
+        messages = _mensagens_verificacao(prep)
+        key = extraction_cache.chave(prep.cache_id, "verify", PROMPT_VERIFY, MODEL_PRIMARY)
+
+        async def _verificar() -> Dict[str, str]:
+            return _interpretar_verificacao(await _acall_gpt_text(messages, MODEL_PRIMARY, timeout))
+
+        return await extraction_cache.aget_or_compute(
+            key, "verify", _medir_async(prep, "verificacao", messages, _verificar), cacheable=_verificacao_lida
+        )
+    except Exception as e:
+        logging.warning("verify_cnh_fields_from_image falhou: %s", e)
+        return dict(_VER_VAZIO)
+
+
+def _interpretar_verificacao(out: str) -> Dict[str, str]:
+    """Interpreta as cinco linhas devolvidas pelo prompt de verificação."""
+    res = dict(_VER_VAZIO)
+    for line in out.splitlines():
+        line = line.strip()
+        m = re.match(r"^(DOB|RG|CNH_REG_11|CNH_REG_10|CPF):\s*(.*)$", line, flags=re.I)
+        if not m:
+            continue
+        key = m.group(1).upper()
+        val = (m.group(2) or "").strip()
+        if key == "DOB":
+            if re.fullmatch(r"\d{2}/\d{2}/\d{4}", val): res["DOB"] = val
+        elif key == "RG":
+            digits = re.sub(r"\D", "", val)
+            if 6 <= len(digits) <= 10: res["RG"] = digits
+        elif key == "CNH_REG_11":
+            digits = re.sub(r"\D", "", val)
+            if len(digits) == 11: res["CNH_REG_11"] = digits
+        elif key == "CNH_REG_10":
+            digits = re.sub(r"\D", "", val)
+            if len(digits) == 10: res["CNH_REG_10"] = digits
+        elif key == "CPF":
+            digits = re.sub(r"\D", "", val)
+            if len(digits) == 11: res["CPF"] = digits
+    return res
+
+
+# -------- CNH: só os campos que o OCR não resolveu --------
+def card_from_fields(campos: Dict[str, str]) -> str:
+    """Cartão da CNH no layout padrão a partir dos campos lidos (ausentes viram "-")."""
+    return _sanitize_card(_card_from_structured(cnh_ocr.estruturado(campos)))
+
+
+def _mensagens_complemento(prep: PreparedImage, campos: List[str]) -> List[dict]:
+    linhas = "\n".join(f"{c}: <{cnh_ocr.DICAS.get(c, 'valor')} ou ->" for c in campos)
+    prompt = (
+        "Observe a imagem da CNH e responda APENAS as linhas abaixo, exatamente neste formato. "
+        "Use '-' se o campo não existir ou estiver ilegível. Não explique.\n\n" + linhas
+    )
+    return [
+        {"role": "system", "content": "Responda estritamente no formato solicitado (json não é necessário)."},
+        {"role": "user", "content": [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": prep.data_url, "detail": prep.detail}},
+        ]},
+    ]
+
+
+def _campos_validos(out: str, campos: List[str]) -> Dict[str, str]:
+    res: Dict[str, str] = {}
+    for c in campos:
+        valor = validators.linha(out, c)
+        if cnh_ocr.validar(c, valor):
+            res[c] = valor
+    return res
+
+
+async def complete_cnh_fields_async(
+    campos: List[str],
+    image: PreparedImage,
+    timeout: Optional[float] = None,
+) -> Dict[str, str]:
+    """
+    Pede ao GPT só os `campos` pendentes da CNH e devolve os que vierem válidos.
+    Sobe de nível de modelo (MODEL_TIERS) enquanto faltar campo essencial válido
+    (filiação, local etc. podem não existir no documento e não contam para a nota).
+    """
+    if not campos:
+        return {}
+    try:
+        messages = _mensagens_complemento(image, campos)
+        key = extraction_cache.chave(image.cache_id, "cnh_campos", *campos, MODEL_TIERS, ESCALATE_BELOW)
+        essenciais = [c for c in campos if c in cnh_ocr.ESSENCIAIS]
+
+        def _nota(res: Dict[str, str]) -> float:
+            return sum(1 for c in essenciais if c in res) / len(essenciais) if essenciais else 1.0
+
+        async def _completar() -> Dict[str, str]:
+            esc = _Escalonamento("campos_cnh", _nota)
+            for i, model in enumerate(MODEL_TIERS):
+                esc.iniciar(model)
+                try:
+                    res = _campos_validos(await _acall_gpt_text(messages, model, timeout), campos)
+                except Exception as e:
+                    esc.falhar(model, e)
+                    continue
+                if esc.aceitar(model, res, i == len(MODEL_TIERS) - 1):
+                    break
+            return esc.resultado()
+
+        return await extraction_cache.aget_or_compute(
+            key, "cnh_campos", _medir_async(image, "campos_cnh", messages, _completar), cacheable=bool
+        )
+    except Exception as e:
+        logging.warning("complete_cnh_fields_async falhou: %s", e)
+        return {}
+
+
+def _plano_chave(texto: Optional[str], prep: Optional[PreparedImage]) -> Tuple[List[dict], str]:
+    """Mensagens e chave do cache para a extração da chave do CT-e."""
+    base_prompt = PROMPT_CTE_CHAVE
+    if prep is not None:
+        messages = _build_messages_for_image(base_prompt, prep.data_url, expect_json=False, detail=prep.detail)
+    else:
+        messages = _build_messages_for_text(base_prompt, texto or "", expect_json=False)
+    key = extraction_cache.chave(
+        prep.cache_id if prep is not None else (texto or ""),
+        "cte_key", base_prompt, MODEL_TIERS,
+    )
+    return messages, key
+
+
+def _somente_chave(out: str) -> str:
+    """Chave válida (DV, UF, AAMM e modelo) da resposta do GPT; inválida vira ""."""
+    chave = fiscal_key.extract_cte_access_key(out)
+    if chave:
+        metrics.incr("cte_key.gpt")
+        return chave
+    if len(re.sub(r"\D", "", out)) >= 44:
+        metrics.incr("cte_key.gpt_rejected")
+        logging.warning("Chave devolvida pelo GPT rejeitada (DV/campos inválidos): %s", out[:80])
+    return ""
+
+
+def _chave_local(texto: Optional[str]) -> str:
+    """Chave encontrada no próprio texto, sem GPT ("" se não houver candidata válida)."""
+    chave = fiscal_key.extract_cte_access_key(texto or "") if texto else None
+    if chave:
+        metrics.incr("cte_key.local")
+    return chave or ""
 
 
 def extract_cte_key(
     texto: Optional[str] = None,
     image_bytes: Optional[bytes] = None,
     image_mime: Optional[str] = None,
+    image: Optional[PreparedImage] = None,
 ) -> str:
-    """Extrai a chave de 44 dígitos de um CT-e em imagem ou texto."""
-    if not texto and not image_bytes:
-        raise HTTPException(status_code=400, detail="Nada para processar (texto ou imagem ausentes).")
+    """
+    Extrai a chave de 44 dígitos de um CT-e em imagem ou texto.
+    Texto com uma chave válida é resolvido localmente; o GPT só é chamado sem
+    candidata, e sua resposta passa pela mesma validação.
+    """
+    _validar_entrada(texto, image_bytes, image_mime, image)
+    if image is None and not image_bytes:
+        local = _chave_local(texto)
+        if local:
+            return local
+    prep = _preparar(image, image_bytes, image_mime)
+    messages, key = _plano_chave(texto, prep)
+    chave = extraction_cache.get_or_compute(
+        key, "cte_key", _medir(prep, "chave", messages, lambda: _chave_via_gpt(messages)), cacheable=bool
+    )
+    return chave if fiscal_key.validate_access_key(chave) else ""
 
-    base_prompt = PROMPT_CTE_CHAVE
 
-    if image_bytes:
-        if not image_mime or not image_mime.startswith("image/"):
-            raise HTTPException(status_code=400, detail="image_mime inválido para imagem.")
-        processed = preprocess_image(image_bytes)
-        b64 = base64.b64encode(processed).decode("ascii")
-        data_url = f"data:image/jpeg;base64,{b64}"
-        messages = _build_messages_for_image(base_prompt, data_url, expect_json=False)
-    else:
-        messages = _build_messages_for_text(base_prompt, texto or "", expect_json=False)
+def _chave_via_gpt(messages: List[dict]) -> str:
+    """Pede a chave ao GPT subindo de nível enquanto não vier uma chave válida."""
+    esc = _Escalonamento("chave", lambda k: 1.0 if k else 0.0)
+    for i, model in enumerate(MODEL_TIERS):
+        esc.iniciar(model)
+        try:
+            chave = _somente_chave(_call_gpt_text(messages, model))
+        except Exception as e:
+            esc.falhar(model, e)
+            continue
+        if esc.aceitar(model, chave, i == len(MODEL_TIERS) - 1):
+            break
+    return esc.resultado()
 
-    try:
-        out = _call_gpt_text(messages, MODEL_PRIMARY)
-    except Exception:
-        out = _call_gpt_text(messages, MODEL_FALLBACK)
 
-    digits = re.sub(r"\D", "", out)
-    return digits if len(digits) == 44 else ""
+async def extract_cte_key_async(
+    texto: Optional[str] = None,
+    image_bytes: Optional[bytes] = None,
+    image_mime: Optional[str] = None,
+    timeout: Optional[float] = None,
+    image: Optional[PreparedImage] = None,
+) -> str:
+    """Versão assíncrona de `extract_cte_key`."""
+    _validar_entrada(texto, image_bytes, image_mime, image)
+    if image is None and not image_bytes:
+        local = _chave_local(texto)
+        if local:
+            return local
+    prep = await _preparar_async(image, image_bytes, image_mime)
+    messages, key = _plano_chave(texto, prep)
+
+    async def _chave() -> str:
+        esc = _Escalonamento("chave", lambda k: 1.0 if k else 0.0)
+        for i, model in enumerate(MODEL_TIERS):
+            esc.iniciar(model)
+            try:
+                chave = _somente_chave(await _acall_gpt_text(messages, model, timeout))
+            except Exception as e:
+                esc.falhar(model, e)
+                continue
+            if esc.aceitar(model, chave, i == len(MODEL_TIERS) - 1):
+                break
+        return esc.resultado()
+
+    chave = await extraction_cache.aget_or_compute(
+        key, "cte_key", _medir_async(prep, "chave", messages, _chave), cacheable=bool
+    )
+    # entradas gravadas antes da validação de DV também passam pelo filtro
+    return chave if fiscal_key.validate_access_key(chave) else ""
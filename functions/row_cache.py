@@ -0,0 +1,69 @@
+"""Cache curto de linhas lidas do banco do cliente (entregas e CT-e).
+
+Guarda a linha crua da consulta por (tenant, rota, identificador); a checagem
+do motorista continua sendo feita a cada requisição sobre a linha em cache.
+As rotas de escrita (/ocorrencia, /confirmar) invalidam o identificador afetado.
+"""
+
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import metrics
+from .ttl_cache import TTLCache
+
+ROW_CACHE_TTL = float(os.getenv("ROW_CACHE_TTL", "30"))
+ROW_CACHE_SIZE = int(os.getenv("ROW_CACHE_SIZE", "2048"))
+
+_rows = TTLCache("rows", ROW_CACHE_TTL, maxsize=ROW_CACHE_SIZE)
+metrics.register_source("row_cache", _rows.stats)
+
+
+def _tenant(cfg: Dict[str, Any]) -> str:
+    return f"{str(cfg.get('host') or '').strip().lower()}:{cfg.get('port') or 3050}:{str(cfg.get('database') or '').strip()}"
+
+
+def normalizar_ident(value: Any) -> str:
+    """Identificador normalizado usado na chave do cache (números sem zeros à esquerda)."""
+    s = str(value if value is not None else "").strip()
+    return str(int(s)) if s.isdigit() else s
+
+
+def _key(cfg: Dict[str, Any], rota: str, ident: Any) -> Tuple[str, str, str]:
+    return (_tenant(cfg), rota, normalizar_ident(ident))
+
+
+def get(cfg: Dict[str, Any], rota: str, ident: Any) -> Optional[Dict[str, Any]]:
+    """Linha em cache (ou None)."""
+    if ROW_CACHE_TTL <= 0:
+        return None
+    return _rows.get(_key(cfg, rota, ident))
+
+
+def put(cfg: Dict[str, Any], rota: str, ident: Any, row: Dict[str, Any]) -> None:
+    """Guarda a linha lida do banco."""
+    if ROW_CACHE_TTL > 0 and row is not None:
+        _rows.set(_key(cfg, rota, ident), row)
+
+
+def get_or_load(
+    cfg: Dict[str, Any], rota: str, ident: Any, loader: Callable[[], Optional[Dict[str, Any]]]
+) -> Optional[Dict[str, Any]]:
+    """Retorna a linha do cache ou lê com `loader`; "não encontrado" (None) não é guardado."""
+    row = get(cfg, rota, ident)
+    if row is None:
+        row = loader()
+        put(cfg, rota, ident, row)
+    return row
+
+
+def invalidate(cfg: Dict[str, Any], rota: str, ident: Any) -> int:
+    """Descarta a linha de um identificador após escrita."""
+    return _rows.invalidate(_key(cfg, rota, ident))
+
+
+def invalidate_tenant(cfg: Optional[Dict[str, Any]] = None) -> int:
+    """Descarta todas as linhas de um tenant (ou de todos)."""
+    if cfg is None:
+        return _rows.invalidate()
+    tenant = _tenant(cfg)
+    return _rows.invalidate_where(lambda k: isinstance(k, tuple) and k[0] == tenant)
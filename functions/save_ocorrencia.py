@@ -1,26 +1,55 @@
 """Funções para gravar ocorrências simples no banco do cliente."""
 
+import logging
+import random
+import time
 from datetime import datetime
 from typing import Optional
+import fdb
 
-import fdb
-from functions.db_client import _load_fbclient_hardcoded
-
-try:
-    _ = _load_fbclient_hardcoded()
-except Exception:
-    pass
+from .db_client import client_connection
+from .stmt_cache import for_connection
+
+# Valida o NOMOVTRA, calcula o NOITEM e insere em uma única ida ao servidor.
+# Retorna NOITEM = 0 quando a entrega não existe. Os parâmetros herdam o tipo
+# das colunas de TABMOVTRA_OCO (TYPE OF COLUMN, Firebird 2.5+), como no INSERT
+# direto: nada de tamanho fixo divergente do schema do tenant.
+SQL_INSERE_OCORRENCIA = """
+    EXECUTE BLOCK (
+        P_NOMOVTRA TYPE OF COLUMN TABMOVTRA_OCO.NOMOVTRA = ?,
+        P_DATA TYPE OF COLUMN TABMOVTRA_OCO.DATA = ?,
+        P_HORA TYPE OF COLUMN TABMOVTRA_OCO.HORA = ?,
+        P_OBS TYPE OF COLUMN TABMOVTRA_OCO.OBS = ?,
+        P_USUARIO TYPE OF COLUMN TABMOVTRA_OCO.USUARIO = ?
+    )
+    RETURNS (NOITEM TYPE OF COLUMN TABMOVTRA_OCO.NOITEM)
+    AS
+    BEGIN
+        NOITEM = 0;
+        IF (EXISTS(SELECT 1 FROM TABMOVTRA WHERE NOMOVTRA = :P_NOMOVTRA)) THEN
+        BEGIN
+            SELECT COALESCE(MAX(NOITEM), 0) + 1
+              FROM TABMOVTRA_OCO
+             WHERE NOMOVTRA = :P_NOMOVTRA
+              INTO :NOITEM;
 
-from .db_client import connect_client_db
+            INSERT INTO TABMOVTRA_OCO (NOMOVTRA, NOITEM, DATA, HORA, OBS, USUARIO)
+            VALUES (:P_NOMOVTRA, :NOITEM, :P_DATA, :P_HORA, :P_OBS, :P_USUARIO);
+        END
+        SUSPEND;
+    END
+"""
 
+# Tentativas quando duas ocorrências do mesmo NOMOVTRA disputam o mesmo NOITEM
+OCO_MAX_TENTATIVAS = 5
 
-"""Funções para gravar ocorrências simples no banco do cliente."""
+# -803: chave duplicada | -913: deadlock/conflito de atualização
+_SQLCODES_CONFLITO = (-803, -913)
 
-from datetime import datetime
-from typing import Optional
-import fdb
 
-from .db_client import connect_client_db
+def _eh_conflito(exc: fdb.DatabaseError) -> bool:
+    args = getattr(exc, "args", ())
+    return len(args) > 1 and args[1] in _SQLCODES_CONFLITO
 
 
 def save_ocorrencia_texto(
@@ -28,52 +57,45 @@ def save_ocorrencia_texto(
     texto: str,
     usuario: str,
     db_cfg: Optional[dict] = None,
-) -> None:
+) -> int:
     """
     Insere o texto informado na tabela TABMOVTRA_OCO.
-    Gera o próximo NOITEM automaticamente.
+    Gera o próximo NOITEM no servidor e o retorna.
     """
-    con = None
-    try:
-        if not db_cfg:
-            raise ValueError("Configuração do banco do cliente ausente.")
-
-        print(
-            f"Conectando ao tenant: {db_cfg['host']}:{db_cfg.get('port')}:{db_cfg['database']}"
-        )
-        con = connect_client_db(db_cfg)
-        cur = con.cursor()
-
-        # Descobre o próximo NOITEM
-        cur.execute("SELECT COALESCE(MAX(NOITEM), 0) + 1 FROM TABMOVTRA_OCO WHERE NOMOVTRA = ?", (nomovtra,))
-        noitem = cur.fetchone()[0]
-
-        # Prepara data/hora
-        agora = datetime.now()
-        data = agora.date()
-        hora = agora.strftime("%H:%M")
-        cur.execute("SELECT 1 FROM TABMOVTRA WHERE NOMOVTRA = ?", (nomovtra,))
-        print('Eis o nomovtra:')
-        print(nomovtra)
-        if not cur.fetchone():
+    if not db_cfg:
+        raise ValueError("Configuração do banco do cliente ausente.")
+
+    print(
+        f"Conectando ao tenant: {db_cfg['host']}:{db_cfg.get('port')}:{db_cfg['database']}"
+    )
+
+    # Prepara data/hora
+    agora = datetime.now()
+    data = agora.date()
+    hora = agora.strftime("%H:%M")
+
+    with client_connection(db_cfg) as con:
+        # Preparado uma vez; as novas tentativas reaproveitam o mesmo statement
+        stmts = for_connection(con)
+        stmts.prepare(SQL_INSERE_OCORRENCIA)
+        for tentativa in range(1, OCO_MAX_TENTATIVAS + 1):
+            try:
+                cur = stmts.execute(SQL_INSERE_OCORRENCIA, (nomovtra, data, hora, texto, usuario))
+                noitem = cur.fetchone()[0]
+                break
+            except fdb.DatabaseError as exc:
+                if not _eh_conflito(exc) or tentativa == OCO_MAX_TENTATIVAS:
+                    raise
+                # Outro insert levou o mesmo NOITEM: nova transação enxerga o MAX atualizado
+                con.rollback()
+                logging.info(
+                    "Conflito de NOITEM em NOMOVTRA=%s (tentativa %d), repetindo", nomovtra, tentativa
+                )
+                time.sleep(random.uniform(0.01, 0.05) * tentativa)
+
+        if not noitem:
             raise ValueError(f"⚠️ Entrega NOMOVTRA={nomovtra} não encontrada no banco.")
-
-
-        # Insere
-        cur.execute(
-            """
-            INSERT INTO TABMOVTRA_OCO (NOMOVTRA, NOITEM, DATA, HORA, OBS, USUARIO)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (nomovtra, noitem, data, hora, texto, usuario),
-        )
         con.commit()
 
         print(f"✅ Ocorrência gravada: NOMOVTRA={nomovtra}, NOITEM={noitem}, OBS={texto}")
-
-    finally:
-        if con:
-            try:
-                con.close()
-            except Exception:
-                pass
+        return noitem
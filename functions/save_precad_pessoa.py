@@ -3,15 +3,11 @@
 from datetime import datetime, date
 from typing import Dict, Any, Optional
 import re
-import fdb
-from functions.db_client import _load_fbclient_hardcoded
-
-try:
-    _ = _load_fbclient_hardcoded()
-except Exception:
-    pass
+import fdb
 
-from .db_client import connect_client_db
+from . import doc_index
+from .db_client import client_connection
+from .stmt_cache import execute_cached
 
 
 # Limites dos campos (VARCHAR) no banco
@@ -35,8 +31,15 @@ MAXLEN = {
 }
 
 
-def _cpf_existe(cur: fdb.Cursor, cpf: str) -> bool:
-    """Verifica se o CPF já está presente em TABCLI ou TABPRECAD_PESSOA."""
+SQL_CPF_TABCLI = """
+    SELECT FIRST 1 1
+    FROM TABCLI
+    WHERE CGCCLI = ? OR CGCCLI = ? OR CGCCLI = ?
+"""
+
+
+def _cpf_existe(con: fdb.Connection, cpf: str, db_cfg: Optional[dict] = None) -> bool:
+    """Verifica se o CPF já está presente em TABCLI."""
     raw = (cpf or "").strip()
     digits = re.sub(r"\D", "", raw)
     masked = (
@@ -44,16 +47,12 @@ def _cpf_existe(cur: fdb.Cursor, cpf: str) -> bool:
         if len(digits) == 11
         else raw
     )
-    cur.execute(
-        """
-        SELECT FIRST 1 1
-        FROM TABCLI
-        WHERE CGCCLI = ? OR CGCCLI = ? OR CGCCLI = ?
-        """,
-        (raw, digits, masked),
-    )
-    if cur.fetchone():
-        return True
+
+    # Conjunto em memória do tenant: "não está" dispensa a consulta
+    if db_cfg and doc_index.possivelmente_cadastrado(db_cfg, con, digits) is False:
+        return False
+
+    return execute_cached(con, SQL_CPF_TABCLI, (raw, digits, masked)).fetchone() is not None
 
 
 def _parse_date_pt(value: Optional[str]) -> Optional[date]:
@@ -133,11 +132,9 @@ def save_precadastro_pessoa(
     print(
         f"Conectando ao tenant: {db_cfg['host']}:{db_cfg.get('port')}:{db_cfg['database']}"
     )
-    con = connect_client_db(db_cfg)
-    try:
-        cur = con.cursor()
+    with client_connection(db_cfg) as con:
         # Checa duplicidade
-        if _cpf_existe(cur, str(dados.get("CPF"))):
+        if _cpf_existe(con, str(dados.get("CPF")), db_cfg):
             raise ValueError(f"⚠️ O CPF {dados.get('CPF')} já está cadastrado.")
 
     
@@ -176,8 +173,5 @@ def save_precadastro_pessoa(
 
         placeholders = ", ".join(["?"] * len(colunas))
         sql = f"INSERT INTO TABPRECAD_PESSOA ({', '.join(colunas)}) VALUES ({placeholders})"
-        cur.execute(sql, valores)
+        con.cursor().execute(sql, valores)
         con.commit()
-
-    finally:
-        con.close()
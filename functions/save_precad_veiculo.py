@@ -3,14 +3,8 @@
 from datetime import datetime, date
 from typing import Dict, Any, Optional
 import fdb
-from functions.db_client import _load_fbclient_hardcoded
-
-try:
-    _ = _load_fbclient_hardcoded()
-except Exception:
-    pass
 
-from .db_client import connect_client_db
+from .db_client import client_connection
 
 # Limites de tamanho dos campos VARCHAR (somente VARCHAR)
 MAXLEN = {
@@ -101,8 +95,7 @@ def save_precadastro_veiculo(
     print(
         f"Conectando ao tenant: {db_cfg['host']}:{db_cfg.get('port')}:{db_cfg['database']}"
     )
-    con = connect_client_db(db_cfg)
-    try:
+    with client_connection(db_cfg) as con:
         cur = con.cursor()
 
         colunas = ["DATAREG"]
@@ -138,5 +131,3 @@ def save_precadastro_veiculo(
 
         cur.execute(sql, valores)
         con.commit()
-    finally:
-        con.close()
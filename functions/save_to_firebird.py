@@ -4,15 +4,12 @@
 import re
 import logging
 from datetime import datetime, date
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple
 
 import fdb
-from .db_client import _load_fbclient_hardcoded, connect_client_db
-
-try:
-    _ = _load_fbclient_hardcoded()
-except Exception:
-    pass
+from . import tenant_profile
+from .db_client import client_connection
+from .stmt_cache import execute_cached
 
 # ---- Mapeamento ----
 TABELA = "DOCUMENTOS"
@@ -94,14 +91,168 @@ def _garantir_data_emissao(dados: Dict[str, Any], chave_44: str) -> date:
     return _inferir_data_emissao_por_chave(chave_44) or date.today()
 
 
-# --------------- Principal ---------------
-def save_to_firebird(
-    dados: dict,
-    file_path: Optional[str] = None,
-    motorista_id: int = 1,
-    db_cfg: Optional[Dict[str, Any]] = None,
-) -> None:
-    """Insere ou atualiza um documento no banco Firebird informado."""
+# --------------- SQL de gravação ---------------
+# Firebird 2.1/2.5: UPDATE OR INSERT; campos opcionais mantêm o valor atual
+# (subselect) e só caem no placeholder quando o registro é novo.
+SQL_UPDATE_OR_INSERT = f"""
+    UPDATE OR INSERT INTO {TABELA} (
+        {COL_MOTORISTA_ID},
+        {COL_CHAVE},
+        {COL_DATA_EMISSAO},
+        {COL_CNPJ_EMITENTE},
+        {COL_CAMINHO_ARQUIVO},
+        {COL_STATUS}
+    )
+    VALUES (
+        ?,
+        ?,
+        ?,
+        COALESCE(?, (SELECT {COL_CNPJ_EMITENTE} FROM {TABELA} WHERE {COL_CHAVE} = ?), ?),
+        COALESCE(?, (SELECT {COL_CAMINHO_ARQUIVO} FROM {TABELA} WHERE {COL_CHAVE} = ?), ?),
+        ?
+    )
+    MATCHING ({COL_CHAVE})
+"""
+
+# Firebird 3+: MERGE lendo a linha existente uma única vez; os parâmetros
+# herdam o tipo das colunas da tabela (TYPE OF COLUMN), como no INSERT direto
+SQL_MERGE = f"""
+    MERGE INTO {TABELA} d
+    USING (
+        SELECT CAST(? AS TYPE OF COLUMN {TABELA}.{COL_MOTORISTA_ID})    AS MOTORISTA_ID,
+               CAST(? AS TYPE OF COLUMN {TABELA}.{COL_CHAVE})           AS CHAVE,
+               CAST(? AS TYPE OF COLUMN {TABELA}.{COL_DATA_EMISSAO})    AS DATA_EMISSAO,
+               CAST(? AS TYPE OF COLUMN {TABELA}.{COL_CNPJ_EMITENTE})   AS CNPJ,
+               CAST(? AS TYPE OF COLUMN {TABELA}.{COL_CAMINHO_ARQUIVO}) AS CAMINHO,
+               CAST(? AS TYPE OF COLUMN {TABELA}.{COL_STATUS})          AS STATUS
+          FROM RDB$DATABASE
+    ) s
+    ON d.{COL_CHAVE} = s.CHAVE
+    WHEN MATCHED THEN UPDATE SET
+        {COL_MOTORISTA_ID}    = s.MOTORISTA_ID,
+        {COL_DATA_EMISSAO}    = s.DATA_EMISSAO,
+        {COL_CNPJ_EMITENTE}   = COALESCE(s.CNPJ, d.{COL_CNPJ_EMITENTE}),
+        {COL_CAMINHO_ARQUIVO} = COALESCE(s.CAMINHO, d.{COL_CAMINHO_ARQUIVO}),
+        {COL_STATUS}          = s.STATUS
+    WHEN NOT MATCHED THEN INSERT (
+        {COL_MOTORISTA_ID},
+        {COL_CHAVE},
+        {COL_DATA_EMISSAO},
+        {COL_CNPJ_EMITENTE},
+        {COL_CAMINHO_ARQUIVO},
+        {COL_STATUS}
+    )
+    VALUES (
+        s.MOTORISTA_ID,
+        s.CHAVE,
+        s.DATA_EMISSAO,
+        COALESCE(s.CNPJ, ?),
+        COALESCE(s.CAMINHO, ?),
+        s.STATUS
+    )
+"""
+
+SQL_INSERT = f"""
+    INSERT INTO {TABELA} (
+        {COL_MOTORISTA_ID},
+        {COL_CHAVE},
+        {COL_DATA_EMISSAO},
+        {COL_CNPJ_EMITENTE},
+        {COL_CAMINHO_ARQUIVO},
+        {COL_STATUS}
+    )
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_UPDATE = f"""
+    UPDATE {TABELA}
+       SET {COL_MOTORISTA_ID}   = ?,
+           {COL_DATA_EMISSAO}   = ?,
+           {COL_CNPJ_EMITENTE}  = COALESCE(?, {COL_CNPJ_EMITENTE}),
+           {COL_CAMINHO_ARQUIVO}= COALESCE(?, {COL_CAMINHO_ARQUIVO}),
+           {COL_STATUS}         = ?
+     WHERE {COL_CHAVE}         = ?
+"""
+
+# Tenants em que o upsert nativo foi recusado (sintaxe): usam o caminho antigo
+_SEM_UPSERT: Set[str] = set()
+
+
+def _tenant_key(db_cfg: Dict[str, Any]) -> str:
+    return f"{db_cfg.get('host')}:{db_cfg.get('port')}:{db_cfg.get('database')}"
+
+
+def _engine_version(db_cfg: Dict[str, Any], con: fdb.Connection) -> float:
+    """Versão do motor pelo perfil em cache do tenant (ou pela própria conexão)."""
+    prof = tenant_profile.get_profile(db_cfg) or {}
+    ver = prof.get("engine_version")
+    if ver is None:
+        ver = getattr(con, "engine_version", None)
+    try:
+        return float(ver)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _upsert_stmt(engine: float, v: Dict[str, Any]) -> Optional[Tuple[str, tuple]]:
+    """Escolhe MERGE (FB 3+) ou UPDATE OR INSERT (FB 2.1+); None = sem upsert nativo."""
+    if engine >= 3.0:
+        return SQL_MERGE, (
+            v["motorista_id"], v["chave"], v["data_emissao"], v["cnpj"], v["caminho"], v["status"],
+            CNPJ_PLACEHOLDER, CAMINHO_PLACEHOLDER,
+        )
+    if engine >= 2.1:
+        return SQL_UPDATE_OR_INSERT, (
+            v["motorista_id"], v["chave"], v["data_emissao"],
+            v["cnpj"], v["chave"], CNPJ_PLACEHOLDER,
+            v["caminho"], v["chave"], CAMINHO_PLACEHOLDER,
+            v["status"],
+        )
+    return None
+
+
+def _insert_ou_update(con: fdb.Connection, v: Dict[str, Any]) -> None:
+    """Caminho antigo: INSERT e, em -803, UPDATE com COALESCE (sem commit)."""
+    # INSERT (sempre com valores não-nulos)
+    try:
+        params_ins = (
+            v["motorista_id"],
+            v["chave"],
+            v["data_emissao"],    # DATE real
+            v["cnpj"] or CNPJ_PLACEHOLDER,         # nunca None
+            v["caminho"] or CAMINHO_PLACEHOLDER,   # nunca None
+            v["status"],
+        )
+        logging.debug("SQL INSERT: %s | params=%s", SQL_INSERT, params_ins)
+        execute_cached(con, SQL_INSERT, params_ins)
+        logging.info("✅ INSERT realizado")
+        return
+
+    except fdb.fbcore.DatabaseError as e:
+        # -803 = unique violation -> UPDATE
+        msg = str(e.args[0]) if getattr(e, "args", None) else str(e)
+        if "-803" in msg or "UNIQUE" in msg.upper():
+            logging.warning("Chave existente. Executando UPDATE (upsert).")
+            params_upd = (
+                v["motorista_id"],
+                v["data_emissao"],
+                v["cnpj"],     # None -> mantém
+                v["caminho"],  # None -> mantém
+                v["status"],
+                v["chave"],
+            )
+            logging.debug("SQL UPDATE: %s | params=%s", SQL_UPDATE, params_upd)
+            execute_cached(con, SQL_UPDATE, params_upd)
+            # Log de UPDATE realizado
+            logging.info("✅ UPDATE realizado (upsert)")
+            return
+        # Log de erro ao inserir documento
+        logging.exception("Erro de banco ao inserir documento")
+        raise
+
+
+def _normalizar_documento(dados: dict, file_path: Optional[str], motorista_id: int) -> Dict[str, Any]:
+    """Valida a chave e monta os valores a gravar (None nos opcionais mantém o gravado)."""
 
     # 1) Chave (44 dígitos)
     chave_raw = dados.get("chave_acesso") or dados.get(COL_CHAVE) or ""
@@ -116,104 +267,127 @@ def save_to_firebird(
     # 3) CNPJ opcional
     cnpj_emitente_norm = _normalize_cnpj(dados.get(COL_CNPJ_EMITENTE) or dados.get("cnpj_emitente"))
 
-    # 4) Caminho opcional (pode vir None)
+    # 4) Caminho opcional (pode vir None; "" e "." contam como ausente)
     caminho_in = file_path or dados.get(COL_CAMINHO_ARQUIVO) or dados.get("caminho_arquivo")
     caminho_norm = str(caminho_in).strip() if caminho_in else None
+    if caminho_norm in ("", "."):
+        caminho_norm = None
 
     # 5) Status
     status = (dados.get(COL_STATUS) or dados.get("status") or
               ("confirmado" if caminho_norm else "salvo_chave"))
 
-    # 6) Valores finais NÃO-NULOS para INSERT (defensivo)
-    cnpj_final = cnpj_emitente_norm or CNPJ_PLACEHOLDER
-    caminho_final = caminho_norm if caminho_norm not in (None, "", ".") else CAMINHO_PLACEHOLDER
+    # 6) Valores: registro novo usa placeholder nos opcionais ausentes
+    valores = {
+        "motorista_id": motorista_id,
+        "chave": chave,
+        "data_emissao": data_emissao,
+        "cnpj": cnpj_emitente_norm,
+        "caminho": caminho_norm,
+        "status": status,
+    }
 
     payload_log = {
         COL_CHAVE: chave,
         COL_DATA_EMISSAO: data_emissao.isoformat(),
         COL_MOTORISTA_ID: motorista_id,
-        COL_CNPJ_EMITENTE: cnpj_final,
-        COL_CAMINHO_ARQUIVO: caminho_final,
+        COL_CNPJ_EMITENTE: cnpj_emitente_norm or CNPJ_PLACEHOLDER,
+        COL_CAMINHO_ARQUIVO: caminho_norm or CAMINHO_PLACEHOLDER,
         COL_STATUS: status,
     }
     logging.info("📝 Payload normalizado para Firebird: %s", payload_log)
+    return valores
 
-    con = None
-    try:
-        if not db_cfg:
-            raise ValueError("Configuração do banco do cliente ausente.")
-        logging.info(
-            "Conectando tenant %s:%s:%s",
-            db_cfg.get("host"),
-            db_cfg.get("port"),
-            db_cfg.get("database"),
-        )
-        con = connect_client_db(db_cfg)
-        cur = con.cursor()
 
-        # 7) INSERT (sempre com valores não-nulos)
+def _gravar_documento(con: fdb.Connection, db_cfg: Dict[str, Any], v: Dict[str, Any]) -> None:
+    """Grava um documento na transação corrente (sem commit).
+
+    Cada statement é atômico no Firebird: se falhar, nada dele fica na
+    transação e os demais documentos já gravados seguem válidos.
+    """
+    stmt = None
+    if _tenant_key(db_cfg) not in _SEM_UPSERT:
+        stmt = _upsert_stmt(_engine_version(db_cfg, con), v)
+
+    if stmt is not None:
+        sql_up, params_up = stmt
         try:
-            sql_ins = f"""
-                INSERT INTO {TABELA} (
-                    {COL_MOTORISTA_ID},
-                    {COL_CHAVE},
-                    {COL_DATA_EMISSAO},
-                    {COL_CNPJ_EMITENTE},
-                    {COL_CAMINHO_ARQUIVO},
-                    {COL_STATUS}
-                )
-                VALUES (?, ?, ?, ?, ?, ?)
-            """
-            params_ins = (
-                motorista_id,
-                chave,
-                data_emissao,    # DATE real
-                cnpj_final,      # nunca None
-                caminho_final,   # nunca None
-                status,
-            )
-            logging.debug("SQL INSERT: %s | params=%s", sql_ins, params_ins)
-            cur.execute(sql_ins, params_ins)
-            con.commit()
-            logging.info("✅ INSERT realizado")
+            logging.debug("SQL UPSERT: %s | params=%s", sql_up, params_up)
+            execute_cached(con, sql_up, params_up)
+            logging.info("✅ UPSERT realizado (%s)", "MERGE" if sql_up is SQL_MERGE else "UPDATE OR INSERT")
             return
-
         except fdb.fbcore.DatabaseError as e:
-            # -803 = unique violation -> UPDATE
-            msg = str(e.args[0]) if getattr(e, "args", None) else str(e)
-            if "-803" in msg or "UNIQUE" in msg.upper():
-                logging.warning("Chave existente. Executando UPDATE (upsert).")
-
-                sql_upd = f"""
-                    UPDATE {TABELA}
-                       SET {COL_MOTORISTA_ID}   = ?,
-                           {COL_DATA_EMISSAO}   = ?,
-                           {COL_CNPJ_EMITENTE}  = COALESCE(?, {COL_CNPJ_EMITENTE}),
-                           {COL_CAMINHO_ARQUIVO}= COALESCE(?, {COL_CAMINHO_ARQUIVO}),
-                           {COL_STATUS}         = ?
-                     WHERE {COL_CHAVE}         = ?
-                """
-                params_upd = (
-                    motorista_id,
-                    data_emissao,
-                    cnpj_emitente_norm,  # None -> mantém
-                    caminho_norm,        # None -> mantém
-                    status,
-                    chave,
-                )
-                logging.debug("SQL UPDATE: %s | params=%s", sql_upd, params_upd)
-                cur.execute(sql_upd, params_upd)
-                con.commit()
-                # Log de UPDATE realizado
-                logging.info("✅ UPDATE realizado (upsert)")
-                return
-            # Log de erro ao inserir documento
-            logging.exception("Erro de banco ao inserir documento")
-            raise
-
-    finally:
-        if con is not None:
+            sqlcode = e.args[1] if len(getattr(e, "args", ())) > 1 else None
+            if sqlcode != -104:  # só sintaxe não suportada cai no caminho antigo
+                raise
+            _SEM_UPSERT.add(_tenant_key(db_cfg))
+            logging.warning("Upsert nativo não suportado (%s); usando INSERT/UPDATE", e)
+
+    _insert_ou_update(con, v)
+
+
+def _log_tenant(db_cfg: Dict[str, Any]) -> None:
+    logging.info(
+        "Conectando tenant %s:%s:%s",
+        db_cfg.get("host"),
+        db_cfg.get("port"),
+        db_cfg.get("database"),
+    )
+
+
+# --------------- Principal ---------------
+def save_to_firebird(
+    dados: dict,
+    file_path: Optional[str] = None,
+    motorista_id: int = 1,
+    db_cfg: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Insere ou atualiza um documento no banco Firebird informado."""
+    valores = _normalizar_documento(dados, file_path, motorista_id)
+
+    if not db_cfg:
+        raise ValueError("Configuração do banco do cliente ausente.")
+    _log_tenant(db_cfg)
+    with client_connection(db_cfg) as con:
+        _gravar_documento(con, db_cfg, valores)
+        con.commit()
+
+
+def save_documentos_lote(
+    itens: List[Tuple[dict, Optional[str]]],
+    motorista_id: int = 1,
+    db_cfg: Optional[Dict[str, Any]] = None,
+) -> List[Optional[str]]:
+    """
+    Grava vários documentos (dados, caminho) em uma conexão e uma transação.
+    Retorna, na mesma ordem, None para os gravados ou a mensagem de erro do item.
+    """
+    if not db_cfg:
+        raise ValueError("Configuração do banco do cliente ausente.")
+
+    erros: List[Optional[str]] = [None] * len(itens)
+    valores: List[Optional[Dict[str, Any]]] = []
+    for i, (dados, file_path) in enumerate(itens):
+        try:
+            valores.append(_normalizar_documento(dados, file_path, motorista_id))
+        except ValueError as e:
+            erros[i] = str(e)
+            valores.append(None)
+
+    if not any(v is not None for v in valores):
+        return erros
+
+    _log_tenant(db_cfg)
+    with client_connection(db_cfg) as con:
+        for i, v in enumerate(valores):
+            if v is None:
+                continue
             try:
-                con.close()
-            except Exception:
-                pass
+                _gravar_documento(con, db_cfg, v)
+            except fdb.fbcore.DatabaseError as e:
+                erros[i] = str(e.args[0]) if getattr(e, "args", None) else str(e)
+        con.commit()
+
+    gravados = sum(1 for v, e in zip(valores, erros) if v is not None and e is None)
+    logging.info("✅ Lote gravado: %d/%d documentos", gravados, len(itens))
+    return erros
@@ -0,0 +1,68 @@
+"""Single-flight assíncrono: uma tarefa por chave, compartilhada pelos chamadores.
+
+A carga roda em uma task própria que cada chamador aguarda com `asyncio.shield`:
+cancelar um chamador (cliente desconectou, timeout) não derruba os demais que
+aguardam a mesma chave. A task só é cancelada quando não resta ninguém aguardando.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Voo:
+    __slots__ = ("task", "espera", "manter")
+
+    def __init__(self, task: "asyncio.Task[Any]", manter: bool) -> None:
+        self.task = task
+        self.espera = 0
+        self.manter = manter
+
+
+class AsyncSingleFlight:
+    """Tasks em andamento por chave, dentro de um event loop."""
+
+    def __init__(self) -> None:
+        self._voos: Dict[Hashable, _Voo] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._voos
+
+    def __len__(self) -> int:
+        return len(self._voos)
+
+    def _iniciar(self, key: Hashable, factory: Callable[[], Awaitable[Any]], manter: bool) -> _Voo:
+        task = asyncio.ensure_future(factory())
+        voo = _Voo(task, manter)
+        self._voos[key] = voo
+
+        def _fim(t: "asyncio.Task[Any]") -> None:
+            if self._voos.get(key) is voo:
+                del self._voos[key]
+            # evita o aviso "exception was never retrieved" quando ninguém aguardou
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_fim)
+        return voo
+
+    def start(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> "Optional[asyncio.Task[Any]]":
+        """Dispara a carga em segundo plano (não é cancelada por falta de quem aguarde).
+
+        Retorna None se já houver uma carga em andamento para a chave.
+        """
+        if key in self._voos:
+            return None
+        return self._iniciar(key, factory, manter=True).task
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Aguarda a carga em andamento para a chave ou inicia uma com `factory`."""
+        voo = self._voos.get(key)
+        if voo is None:
+            voo = self._iniciar(key, factory, manter=False)
+        voo.espera += 1
+        try:
+            return await asyncio.shield(voo.task)
+        finally:
+            voo.espera -= 1
+            if voo.espera == 0 and not voo.manter and not voo.task.done():
+                voo.task.cancel()
@@ -0,0 +1,118 @@
+"""Cache LRU de prepared statements por conexão Firebird.
+
+Cada conexão do pool ganha um cursor dedicado e um LRU de ``PreparedStatement``
+(``cursor.prep``) indexado pelo texto do SQL. Statements preparados sobrevivem
+ao commit/rollback, então consultas quentes deixam de pagar o prepare no
+servidor a cada requisição.
+
+O cache fica pendurado na própria conexão; ``drop`` é chamado pelo pool ao
+fechá-la (o PreparedStatement referencia o cursor, que referencia a conexão).
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+import fdb
+
+from . import metrics
+
+STMT_CACHE_SIZE = int(os.getenv("FB_STMT_CACHE_SIZE", "32"))
+
+_ATTR = "_api_stmt_cache"
+
+# Erros de dados/concorrência (chave duplicada, deadlock, FK, NOT NULL, CHECK):
+# o statement continua válido e é reaproveitado numa nova tentativa
+_SQLCODES_STATEMENT_VALIDO = (-803, -913, -530, -625, -297)
+
+
+class StatementCache:
+    """LRU de PreparedStatement de uma conexão (não thread-safe: uma conexão por vez)."""
+
+    def __init__(self, conn: fdb.Connection, maxsize: int = STMT_CACHE_SIZE) -> None:
+        self.conn = conn
+        self.maxsize = max(1, maxsize)
+        self._cursor: Optional[fdb.Cursor] = None
+        self._stmts: "OrderedDict[str, fdb.PreparedStatement]" = OrderedDict()
+
+    def _get_cursor(self) -> fdb.Cursor:
+        if self._cursor is None:
+            self._cursor = self.conn.cursor()
+        return self._cursor
+
+    def prepare(self, sql: str) -> fdb.PreparedStatement:
+        """Retorna o statement preparado para `sql`, preparando só na primeira vez."""
+        ps = self._stmts.get(sql)
+        if ps is not None:
+            self._stmts.move_to_end(sql)
+            metrics.incr("stmt_cache.hits")
+            return ps
+        metrics.incr("stmt_cache.misses")
+        ps = self._get_cursor().prep(sql)
+        self._stmts[sql] = ps
+        while len(self._stmts) > self.maxsize:
+            _, old = self._stmts.popitem(last=False)
+            metrics.incr("stmt_cache.evictions")
+            _drop_statement(old)
+        return ps
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> fdb.Cursor:
+        """Executa `sql` com o statement em cache e devolve o cursor para fetch."""
+        ps = self.prepare(sql)
+        cur = self._get_cursor()
+        try:
+            cur.execute(ps, params)
+        except fdb.DatabaseError as exc:
+            # Statement pode ter sido invalidado (ex.: DDL); prepara de novo na próxima
+            args = getattr(exc, "args", ())
+            if not (len(args) > 1 and args[1] in _SQLCODES_STATEMENT_VALIDO):
+                self.discard(sql)
+            raise
+        return cur
+
+    def discard(self, sql: str) -> None:
+        ps = self._stmts.pop(sql, None)
+        if ps is not None:
+            _drop_statement(ps)
+
+    def clear(self) -> None:
+        for ps in self._stmts.values():
+            _drop_statement(ps)
+        self._stmts.clear()
+        self._cursor = None
+
+    def __len__(self) -> int:
+        return len(self._stmts)
+
+
+def _drop_statement(ps: fdb.PreparedStatement) -> None:
+    try:
+        ps._close()
+    except Exception as exc:
+        logging.debug("Falha ao liberar statement em cache: %s", exc)
+
+
+def for_connection(con: fdb.Connection) -> StatementCache:
+    """Cache de statements da conexão (criado no primeiro uso)."""
+    cache = getattr(con, _ATTR, None)
+    if cache is None:
+        cache = StatementCache(con)
+        setattr(con, _ATTR, cache)
+    return cache
+
+
+def execute_cached(con: fdb.Connection, sql: str, params: Optional[Sequence[Any]] = None) -> fdb.Cursor:
+    """Atalho: executa `sql` na conexão reaproveitando o prepared statement."""
+    return for_connection(con).execute(sql, params)
+
+
+def drop(con: Any) -> None:
+    """Libera o cache da conexão (chamado antes de fechá-la)."""
+    cache = getattr(con, _ATTR, None)
+    if cache is not None:
+        cache.clear()
+        try:
+            delattr(con, _ATTR)
+        except Exception:
+            pass
@@ -0,0 +1,84 @@
+"""Perfil persistido de cada banco de cliente (charset, versão do servidor, dialeto).
+
+Evita renegociar o charset a cada conexão: o valor que funcionou fica gravado
+em um JSON local e só é descartado quando a conexão com ele falhar.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import fdb
+
+PROFILE_PATH = Path(
+    os.getenv(
+        "TENANT_PROFILE_PATH",
+        str(Path(__file__).resolve().parent.parent / "cache" / "tenant_profiles.json"),
+    )
+)
+
+_lock = threading.Lock()
+_profiles: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def _key(cfg: Dict[str, Any]) -> str:
+    return f"{str(cfg['host']).strip().lower()}:{int(cfg['port'])}:{str(cfg['database']).strip()}|{str(cfg['user']).strip().upper()}"
+
+
+def _load_locked() -> Dict[str, Dict[str, Any]]:
+    global _profiles
+    if _profiles is None:
+        try:
+            with open(PROFILE_PATH, "r", encoding="utf-8") as fh:
+                _profiles = json.load(fh) or {}
+        except FileNotFoundError:
+            _profiles = {}
+        except Exception as exc:
+            logging.warning("Perfis de tenant ilegíveis em %s (%s); recomeçando.", PROFILE_PATH, exc)
+            _profiles = {}
+    return _profiles
+
+
+def _flush_locked() -> None:
+    """Grava o JSON de forma atômica (arquivo temporário + replace)."""
+    try:
+        PROFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = PROFILE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(_profiles, fh, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, PROFILE_PATH)
+    except Exception as exc:
+        logging.warning("Não foi possível gravar perfis de tenant em %s: %s", PROFILE_PATH, exc)
+
+
+def get_profile(cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Retorna o perfil conhecido do banco (ou None)."""
+    with _lock:
+        prof = _load_locked().get(_key(cfg))
+        return dict(prof) if prof else None
+
+
+def remember(cfg: Dict[str, Any], charset: str, con: fdb.Connection) -> Dict[str, Any]:
+    """Registra o charset que conectou e os dados detectados do servidor."""
+    prof: Dict[str, Any] = {"charset": charset, "updated_at": int(time.time())}
+    try:
+        prof["server_version"] = con.server_version
+        prof["engine_version"] = con.engine_version
+        prof["sql_dialect"] = con.database_sql_dialect
+    except Exception as exc:
+        logging.info("Versão do servidor não detectada: %s", exc)
+    with _lock:
+        _load_locked()[_key(cfg)] = prof
+        _flush_locked()
+    return prof
+
+
+def forget(cfg: Dict[str, Any]) -> None:
+    """Descarta o perfil (força nova sondagem na próxima conexão)."""
+    with _lock:
+        if _load_locked().pop(_key(cfg), None) is not None:
+            _flush_locked()
@@ -0,0 +1,230 @@
+"""Cache em memória com TTL, LRU limitado e single-flight.
+
+- `ttl`: tempo em que a entrada é servida como fresca.
+- `stale_ttl`: janela extra em que a entrada vencida ainda é servida enquanto
+  uma atualização roda em segundo plano (stale-while-revalidate).
+- `negative_ttl`: por quanto tempo guardar exceções marcadas como negativas
+  (ex.: 404), para não repetir a consulta a cada mensagem.
+- Chamadas concorrentes para a mesma chave aguardam uma única carga.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .single_flight import AsyncSingleFlight
+
+
+class _Entry:
+    __slots__ = ("value", "error", "expires_at", "stale_until")
+
+    def __init__(self, value: Any, error: Optional[BaseException], expires_at: float, stale_until: float) -> None:
+        self.value = value
+        self.error = error
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """Cache thread-safe com expiração, LRU e carga única por chave."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        maxsize: int = 1024,
+        stale_ttl: float = 0.0,
+        negative_ttl: float = 0.0,
+        is_negative: Optional[Callable[[BaseException], bool]] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._aflights = AsyncSingleFlight()
+        self._stats = {"hits": 0, "misses": 0, "stale_hits": 0, "negative_hits": 0, "loads": 0, "load_errors": 0}
+
+    # ---------------- Internos ----------------
+
+    def _store_locked(self, key: Hashable, entry: _Entry) -> None:
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _lookup_locked(self, key: Hashable, now: float) -> Tuple[str, Any]:
+        """Classifica a chave como 'fresh', 'negative', 'stale' ou 'miss'."""
+        entry = self._data.get(key)
+        if entry is not None:
+            if now < entry.expires_at:
+                self._data.move_to_end(key)
+                if entry.error is not None:
+                    self._stats["negative_hits"] += 1
+                    return "negative", entry.error
+                self._stats["hits"] += 1
+                return "fresh", entry.value
+            if entry.error is None and now < entry.stale_until:
+                self._stats["stale_hits"] += 1
+                return "stale", entry.value
+        self._stats["misses"] += 1
+        return "miss", None
+
+    def _store_value(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._stats["loads"] += 1
+            self._store_locked(key, _Entry(value, None, now + self.ttl, now + self.ttl + self.stale_ttl))
+
+    def _store_error(self, key: Hashable, exc: BaseException) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._stats["load_errors"] += 1
+            if self.negative_ttl > 0 and self.is_negative and self.is_negative(exc):
+                self._store_locked(key, _Entry(None, exc, now + self.negative_ttl, now + self.negative_ttl))
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], flight: _Flight) -> None:
+        """Executa o loader e publica o resultado para quem estiver aguardando."""
+        try:
+            value = loader()
+            self._store_value(key, value)
+            flight.value = value
+        except BaseException as exc:  # noqa: B902 - repassado ao chamador
+            self._store_error(key, exc)
+            flight.error = exc
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._flights:
+                return
+            flight = _Flight()
+            self._flights[key] = flight
+
+        def _run() -> None:
+            self._load(key, loader, flight)
+            if flight.error is not None:
+                logging.warning("Cache %s: falha ao revalidar %r: %s", self.name, key, flight.error)
+
+        threading.Thread(target=_run, name=f"cache-{self.name}", daemon=True).start()
+
+    # ---------------- API ----------------
+
+    def get(self, key: Hashable) -> Any:
+        """Retorna o valor fresco em cache ou None (não dispara carga)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.error is not None or now >= entry.expires_at:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Grava o valor diretamente no cache."""
+        now = time.monotonic()
+        with self._lock:
+            self._store_locked(key, _Entry(value, None, now + self.ttl, now + self.ttl + self.stale_ttl))
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Retorna do cache ou carrega com `loader`, uma única vez por chave."""
+        with self._lock:
+            state, value = self._lookup_locked(key, time.monotonic())
+            if state == "miss":
+                flight = self._flights.get(key)
+                owner = flight is None
+                if owner:
+                    flight = _Flight()
+                    self._flights[key] = flight
+
+        if state == "fresh":
+            return value
+        if state == "negative":
+            raise value
+        if state == "stale":
+            self._refresh_in_background(key, loader)
+            return value
+
+        if owner:
+            self._load(key, loader, flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Versão assíncrona de `get_or_load`: a carga roda em uma task compartilhada
+        pelos chamadores da mesma chave; cancelar um deles não afeta os demais.
+        """
+        with self._lock:
+            state, value = self._lookup_locked(key, time.monotonic())
+        if state == "fresh":
+            return value
+        if state == "negative":
+            raise value
+
+        async def _run() -> Any:
+            try:
+                result = await loader()
+            except asyncio.CancelledError:
+                raise
+            except BaseException as exc:  # noqa: B902 - repassado ao chamador
+                self._store_error(key, exc)
+                raise
+            self._store_value(key, result)
+            return result
+
+        if state == "stale":
+            task = self._aflights.start(key, _run)
+            if task is not None:
+                task.add_done_callback(
+                    lambda t: t.cancelled() or t.exception() is None
+                    or logging.warning("Cache %s: falha ao revalidar %r: %s", self.name, key, t.exception())
+                )
+            return value
+        return await self._aflights.run(key, _run)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> int:
+        """Remove uma chave (ou todas, se `key` for None). Retorna quantas saíram."""
+        with self._lock:
+            if key is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove as chaves para as quais `predicate(key)` é verdadeiro."""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso do cache."""
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, **self._stats}
@@ -0,0 +1,144 @@
+"""Validadores dos campos extraídos (CPF, CNPJ, datas, placa, chave) e nota do cartão.
+
+Usados para decidir se a resposta de um modelo é boa o bastante ou se vale
+escalar para o próximo modelo (ver `parse_with_gpt.MODEL_TIERS`).
+"""
+
+import re
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from . import fiscal_key
+
+
+def _digitos(v: Optional[str]) -> str:
+    return re.sub(r"\D", "", v or "")
+
+
+def cpf_valido(cpf: Optional[str]) -> bool:
+    """CPF com 11 dígitos, não repetidos, e dígitos verificadores corretos."""
+    d = _digitos(cpf)
+    if len(d) != 11 or d == d[0] * 11:
+        return False
+    for n in (9, 10):
+        soma = sum(int(d[i]) * (n + 1 - i) for i in range(n))
+        dv = (soma * 10) % 11 % 10
+        if dv != int(d[n]):
+            return False
+    return True
+
+
+def cnpj_valido(cnpj: Optional[str]) -> bool:
+    """CNPJ com 14 dígitos e dígitos verificadores corretos."""
+    d = _digitos(cnpj)
+    if len(d) != 14 or d == d[0] * 14:
+        return False
+    for n, pesos in ((12, [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), (13, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])):
+        resto = sum(int(d[i]) * pesos[i] for i in range(n)) % 11
+        dv = 0 if resto < 2 else 11 - resto
+        if dv != int(d[n]):
+            return False
+    return True
+
+
+def cnh_registro_valido(registro: Optional[str]) -> bool:
+    """Nº de registro da CNH (11 dígitos) com os dois dígitos verificadores corretos."""
+    d = _digitos(registro)
+    if len(d) != 11 or d == d[0] * 11:
+        return False
+    dv1 = sum(int(d[i]) * (9 - i) for i in range(9)) % 11
+    desconto = 0
+    if dv1 >= 10:
+        dv1, desconto = 0, 2
+    resto = sum(int(d[i]) * (1 + i) for i in range(9)) % 11
+    dv2 = 0 if resto >= 10 else resto - desconto
+    return dv2 >= 0 and d[9:] == f"{dv1}{dv2}"
+
+
+def data_valida(valor: Optional[str]) -> bool:
+    """Data real no formato DD/MM/AAAA (entre 1900 e 2100)."""
+    v = (valor or "").strip()
+    if not re.fullmatch(r"\d{2}/\d{2}/\d{4}", v):
+        return False
+    try:
+        return 1900 <= datetime.strptime(v, "%d/%m/%Y").year <= 2100
+    except ValueError:
+        return False
+
+
+def data_hora_valida(valor: Optional[str]) -> bool:
+    """Data DD/MM/AAAA válida, aceitando hora no fim (ex.: "10/08/2019 14:30:00")."""
+    m = re.fullmatch(r"(\d{2}/\d{2}/\d{4})(?:\s+(?:[àa]s\s+)?\d{2}:\d{2}(?::\d{2})?)?", (valor or "").strip())
+    return bool(m) and data_valida(m.group(1))
+
+
+def placa_valida(placa: Optional[str]) -> bool:
+    """Placa no padrão antigo (ABC1234) ou Mercosul (ABC1D23)."""
+    p = re.sub(r"[\s\-]", "", (placa or "").upper())
+    return bool(re.fullmatch(r"[A-Z]{3}\d[A-Z0-9]\d{2}", p))
+
+
+def chassi_valido(chassi: Optional[str]) -> bool:
+    """VIN com 17 caracteres alfanuméricos, sem I, O e Q."""
+    c = re.sub(r"\s", "", (chassi or "").upper())
+    return bool(re.fullmatch(r"[A-HJ-NPR-Z0-9]{17}", c))
+
+
+def linha(card_text: str, rotulo: str) -> str:
+    """Valor da linha 'Rótulo: valor' do cartão ('' se ausente ou '-')."""
+    m = re.search(rf"(?mi)^[\s\-•*]*{re.escape(rotulo)}:\s*(.+)$", card_text or "")
+    valor = m.group(1).strip() if m else ""
+    return "" if valor == "-" else valor
+
+
+def _nota(checagens: List[bool]) -> float:
+    return sum(1 for c in checagens if c) / len(checagens) if checagens else 0.0
+
+
+def nota_pessoa(card: str) -> float:
+    """CPF, nascimento, validade, nº de registro da CNH e nome."""
+    return _nota([
+        cpf_valido(linha(card, "CPF")),
+        data_valida(linha(card, "Data de nascimento")),
+        data_valida(linha(card, "Validade")),
+        len(_digitos(linha(card, "Número de registro CNH"))) in (10, 11),
+        bool(linha(card, "Nome")),
+    ])
+
+
+def nota_veiculo(card: str) -> float:
+    """Placa, RENAVAM, chassi, ano de fabricação e documento do proprietário."""
+    doc = _digitos(linha(card, "CPF/CNPJ"))
+    return _nota([
+        placa_valida(linha(card, "PLACA")),
+        9 <= len(_digitos(linha(card, "RENAVAM"))) <= 11,
+        chassi_valido(linha(card, "CHASSI")),
+        bool(re.fullmatch(r"(19|20)\d{2}", linha(card, "ANO FABRICACAO"))),
+        cpf_valido(doc) or cnpj_valido(doc),
+    ])
+
+
+def nota_cte(card: str, chave: Optional[str] = None) -> float:
+    """Chave válida, data de emissão e ao menos um CNPJ válido entre as partes.
+
+    `chave`: chave já lida e validada fora do modelo (código de barras, texto do
+    PDF); substitui a linha "Chave" do cartão, que será trocada por ela.
+    """
+    cnpjs = re.findall(r"CNPJ:\s*([\d./\-]+)", card or "")
+    return _nota([
+        fiscal_key.validate_access_key(chave or linha(card, "Chave")),
+        data_hora_valida(linha(card, "Emissão")),
+        any(cnpj_valido(c) for c in cnpjs),
+    ])
+
+
+NOTAS: dict = {
+    "pessoa": nota_pessoa,
+    "veiculo": nota_veiculo,
+    "cte": nota_cte,
+}
+
+
+def nota_por_tipo(tipo: Optional[str]) -> Optional[Callable[[str], float]]:
+    """Função de nota do tipo de documento (None se não houver validadores)."""
+    return NOTAS.get((tipo or "").strip().lower())
@@ -1,6 +1,10 @@
 """API principal para processamento de notas fiscais."""
 
 import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 
 import config  # noqa: F401  # carrega variáveis de ambiente e diretórios
@@ -11,6 +15,12 @@ from routes.precadastro import router as precadastro_router
 from routes.cadastroveiculo import router as cadastroveiculo_router
 from routes.cte import router as cte_router
 from routes.ocorrencia import router as ocorrencia_router
+from routes.internal import router as internal_router
+from functions.db_client import close_client_pools
+from functions.executors import shutdown_executors
+from functions.extract_text_from_image import avisar_modo_ocr
+from functions.http_client import close_http_clients
+from functions.parse_with_gpt import close_async_openai
 
 
 logging.basicConfig(
@@ -18,7 +28,26 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
-app = FastAPI()
+
+@asynccontextmanager
+async def _ciclo_de_vida(_app: FastAPI) -> AsyncIterator[None]:
+    """
+    Subida: limita o OpenMP do OCR e registra o modo do OCR local.
+    Parada: fecha as conexões Firebird e HTTP (Node e OpenAI) mantidas em pool e os executores.
+    """
+    # Um thread OpenMP por OCR: o paralelismo vem do pool (um worker por núcleo).
+    # Vale para os processos `tesseract`; o tesserocr lê a variável ao carregar,
+    # por isso a imagem Docker já a define (ver README).
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    avisar_modo_ocr()
+    yield
+    close_client_pools()
+    await close_http_clients()
+    await close_async_openai()
+    shutdown_executors()
+
+
+app = FastAPI(lifespan=_ciclo_de_vida)
 app.include_router(upload_router)
 app.include_router(confirmar_router)
 app.include_router(entregas_router)
@@ -26,6 +55,8 @@ app.include_router(precadastro_router)
 app.include_router(cadastroveiculo_router)
 app.include_router(cte_router)
 app.include_router(ocorrencia_router)
+app.include_router(internal_router)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Relatório de índices e planos dos SQL da API para o banco de um cliente."""
+
+import os
+import sys
+import json
+import argparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from functions.db_client import get_client_db  # noqa: E402
+from functions.index_advisor import analisar, formatar  # noqa: E402
+
+
+def main() -> None:
+    """Interface de linha de comando."""
+    parser = argparse.ArgumentParser(description="Analisa índices do banco do cliente")
+    parser.add_argument("--to-biz", help="Número do bot (resolve o banco pela base mestre)")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=3050)
+    parser.add_argument("--database")
+    parser.add_argument("--user", default="SYSDBA")
+    parser.add_argument("--password", default=os.getenv("FIREBIRD_PASSWORD", "masterkey"))
+    parser.add_argument("--charset")
+    parser.add_argument("--ddl", action="store_true", help="Inclui o DDL para criar/ativar índices")
+    parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = parser.parse_args()
+
+    if args.to_biz:
+        cfg = get_client_db(args.to_biz)
+    elif args.host and args.database:
+        cfg = {
+            "host": args.host,
+            "port": args.port,
+            "database": args.database,
+            "user": args.user,
+            "password": args.password,
+        }
+        if args.charset:
+            cfg["charset"] = args.charset
+    else:
+        parser.error("informe --to-biz ou --host/--database")
+
+    relatorio = analisar(cfg, incluir_ddl=args.ddl)
+    if args.json:
+        sys.stdout.write(json.dumps(relatorio, ensure_ascii=False, indent=2, default=str))
+    else:
+        sys.stdout.write(formatar(relatorio) + "\n")
+    if relatorio["faltando"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,8 @@ from pydantic import BaseModel
 from typing import Dict, Any, Optional
 
 from functions.save_precad_veiculo import save_precadastro_veiculo
-from functions.db_client import get_client_db
+from functions.db_client import get_client_db_async
+from functions.executors import run_db
 
 router = APIRouter()
 
@@ -30,8 +31,8 @@ async def cadastro_veiculo(
         print("📎 [DEBUG] Link recebido:", req.link)
 
         # Chamada da função de persistência
-        cfg = get_client_db(to_biz)
-        save_precadastro_veiculo(req.dados, req.link, cfg)
+        cfg = await get_client_db_async(to_biz)
+        await run_db(save_precadastro_veiculo, req.dados, req.link, cfg)
 
         print("✅ [DEBUG] Registro inserido com sucesso no Firebird.")
 
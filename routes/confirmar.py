@@ -1,19 +1,22 @@
 """Rota para confirmar o processamento do documento (com arquivo ou só chave)."""
 
 import os
+import re
 import logging
 import stat
 from pathlib import Path
 from datetime import datetime, date
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header
 from pydantic import BaseModel
 
 from config import UPLOAD_DIR as CFG_UPLOAD_DIR, GOOGLE_DRIVE_FOLDER
-from functions.save_to_firebird import save_to_firebird
+from functions.save_to_firebird import save_documentos_lote, save_to_firebird
 from functions.upload_to_drive import upload_to_drive
-from functions.db_client import get_client_db
+from functions import row_cache
+from functions.db_client import get_client_db_async
+from functions.executors import run_db, run_io
 
 router = APIRouter()
 
@@ -29,6 +32,11 @@ class ConfirmarRequest(BaseModel):
     temp_path: Optional[str] = None
 
 
+def _chave_44(chave: str) -> str:
+    """Só os dígitos da chave (como o /cte e o cache de linhas a usam)."""
+    return re.sub(r"\D", "", chave or "")
+
+
 def garantir_permissao(p: Path) -> None:
     try:
         if p.exists():
@@ -134,6 +142,17 @@ def preparar_payload(chave: str, dados: Dict[str, Any]) -> Dict[str, Any]:
     return payload
 
 
+def _cancelar(p: Optional[Path]) -> None:
+    """Remove o arquivo de uma confirmação recusada (se for pasta, ignora)."""
+    if p and p.exists() and p.is_file():
+        garantir_permissao(p)
+        try:
+            p.unlink(missing_ok=True)
+            logging.info("🗑️ Arquivo removido: %s", p)
+        except Exception as e:
+            logging.error("Erro ao remover arquivo %s: %s", p, e)
+
+
 @router.post("/confirmar")
 async def confirmar(req: ConfirmarRequest, to_biz: str = Header(..., alias="x-whatsapp-number")):
     """Confirma o documento e salva dados no banco do cliente."""
@@ -143,24 +162,19 @@ async def confirmar(req: ConfirmarRequest, to_biz: str = Header(..., alias="x-wh
 
     # Cancelamento: remove arquivo se existir (se for pasta, ignora)
     if not req.confirma:
-        if p and p.exists() and p.is_file():
-            garantir_permissao(p)
-            try:
-                p.unlink(missing_ok=True)
-                logging.info("🗑️ Arquivo removido: %s", p)
-            except Exception as e:
-                logging.error("Erro ao remover arquivo %s: %s", p, e)
+        _cancelar(p)
         return {"status": "pendente", "mensagem": "Envie nova foto ou digite manualmente."}
 
     # Prepara payload com DATA_EMISSAO garantida
     payload = preparar_payload(req.chave_acesso, req.dados)
 
-    cfg = get_client_db(to_biz)
+    cfg = await get_client_db_async(to_biz)
 
     # Confirmação SEM arquivo (só chave)
     if p is None:
         try:
-            save_to_firebird(payload, None, 1, cfg)  # grava apenas pela chave (e campos derivados)
+            await run_db(save_to_firebird, payload, None, 1, cfg)  # grava apenas pela chave (e campos derivados)
+            row_cache.invalidate(cfg, "cte", _chave_44(req.chave_acesso))
             logging.info("✅ Dados salvos no Firebird (apenas chave) | DATA_EMISSAO=%s", payload.get("DATA_EMISSAO"))
         except Exception as e:
             logging.error("Erro ao salvar apenas pela chave: %s", e)
@@ -180,17 +194,101 @@ async def confirmar(req: ConfirmarRequest, to_biz: str = Header(..., alias="x-wh
     garantir_permissao(p)
 
     try:
-        save_to_firebird(payload, str(p), 1, cfg)
+        await run_db(save_to_firebird, payload, str(p), 1, cfg)
+        row_cache.invalidate(cfg, "cte", _chave_44(req.chave_acesso))
         logging.info("✅ Dados salvos no Firebird (arquivo=%s) | DATA_EMISSAO=%s", p.name, payload.get("DATA_EMISSAO"))
     except Exception as e:
         logging.error("Erro ao salvar no Firebird: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao salvar no banco: {e}")
 
     try:
-        file_id = upload_to_drive(str(p), GOOGLE_DRIVE_FOLDER)
+        file_id = await run_io(upload_to_drive, str(p), GOOGLE_DRIVE_FOLDER)
         logging.info("☁️ Upload concluído no Drive. File ID: %s", file_id)
     except Exception as e:
         logging.error("Erro no upload para o Drive: %s", e)
         raise HTTPException(status_code=500, detail=f"Erro ao enviar para o Google Drive: {e}")
 
     return {"status": "salvo", "mensagem": "Documento confirmado e salvo no banco e Google Drive."}
+
+
+# ---------------- Lote ----------------
+
+# Máximo de documentos por chamada do /confirmar/batch
+CONFIRMAR_LOTE_MAX = 200
+
+
+class ConfirmarLoteRequest(BaseModel):
+    itens: List[ConfirmarRequest]
+
+
+async def _enviar_drive(p: Path, chave: str) -> None:
+    """Upload ao Drive agendado após a resposta do lote."""
+    try:
+        file_id = await run_io(upload_to_drive, str(p), GOOGLE_DRIVE_FOLDER)
+        logging.info("☁️ Upload concluído no Drive (%s). File ID: %s", chave, file_id)
+    except Exception as e:
+        logging.error("Erro no upload para o Drive (%s): %s", chave, e)
+
+
+@router.post("/confirmar/batch")
+async def confirmar_lote(
+    req: ConfirmarLoteRequest,
+    background_tasks: BackgroundTasks,
+    to_biz: str = Header(..., alias="x-whatsapp-number"),
+):
+    """
+    Confirma vários documentos de uma vez: todos os registros são gravados em
+    uma conexão e uma transação; uploads ao Drive são enfileirados após a resposta.
+    Retorna o status de cada item na ordem recebida.
+    """
+    if not req.itens:
+        raise HTTPException(status_code=400, detail="Nenhum documento informado")
+    if len(req.itens) > CONFIRMAR_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo de {CONFIRMAR_LOTE_MAX} documentos por lote")
+    logging.info("📥 Confirmação em lote recebida: %d documentos", len(req.itens))
+
+    resultados: List[Dict[str, Any]] = [{"chave_acesso": it.chave_acesso} for it in req.itens]
+    pendentes: List[int] = []
+    lote: List[Tuple[Dict[str, Any], Optional[str]]] = []
+    caminhos: List[Optional[Path]] = []
+
+    for i, it in enumerate(req.itens):
+        p = resolver_caminho(it.temp_path)
+        if not it.confirma:
+            await run_io(_cancelar, p)
+            resultados[i].update(status="pendente", mensagem="Envie nova foto ou digite manualmente.")
+            continue
+        if p is not None and not p.exists():
+            resultados[i].update(status="erro", mensagem="Arquivo temporário não encontrado")
+            continue
+        if p is not None and p.is_dir():
+            resultados[i].update(status="erro", mensagem="Caminho recebido é uma pasta, não um arquivo")
+            continue
+        if p is not None:
+            garantir_permissao(p)
+        pendentes.append(i)
+        lote.append((preparar_payload(it.chave_acesso, it.dados), str(p) if p else None))
+        caminhos.append(p)
+
+    if lote:
+        cfg = await get_client_db_async(to_biz)
+        garantir_permissao(UPLOAD_DIR)
+        try:
+            erros = await run_db(save_documentos_lote, lote, 1, cfg)
+        except Exception as e:
+            logging.error("Erro ao salvar lote no Firebird: %s", e)
+            raise HTTPException(status_code=500, detail=f"Erro ao salvar lote no banco: {e}")
+
+        for i, p, erro in zip(pendentes, caminhos, erros):
+            chave = req.itens[i].chave_acesso
+            if erro:
+                resultados[i].update(status="erro", mensagem=erro)
+                continue
+            row_cache.invalidate(cfg, "cte", _chave_44(chave))
+            if p is None:
+                resultados[i].update(status="salvo_chave", mensagem="Chave confirmada e salva sem arquivo.")
+            else:
+                background_tasks.add_task(_enviar_drive, p, chave)
+                resultados[i].update(status="salvo", mensagem="Documento salvo; envio ao Google Drive agendado.")
+
+    return {"status": "ok", "itens": resultados}
@@ -6,23 +6,20 @@ import re
 from datetime import date, datetime
 from typing import Any, Dict, Optional
 
-import fdb
-from functions.db_client import _load_fbclient_hardcoded  # ensure fbclient
-
-try:
-    _ = _load_fbclient_hardcoded()
-except Exception:
-    pass
+import fdb
 from fastapi import APIRouter, HTTPException, Path, Query, Header
 
-from functions.db_client import get_client_db, connect_client_db
+from functions import row_cache
+from functions.consultas_sql import SQL_CTE, SQL_DIALECT
+from functions.db_client import get_client_db, client_connection
+from functions.stmt_cache import execute_cached
 
 router = APIRouter(prefix="/cte", tags=["cte"])
 
 
 def _connect(cfg: Dict[str, Any]):
-    """Cria conexão com o banco Firebird usando Dialect 1."""
-    return connect_client_db(cfg, sql_dialect=1)
+    """Empresta conexão do pool do banco Firebird usando Dialect 1 (context manager)."""
+    return client_connection(cfg, sql_dialect=SQL_DIALECT)
 
 
 def _fmt_date_br(d: Optional[date]) -> Optional[str]:
@@ -43,40 +40,27 @@ def get_cte_by_chave(
     if len(chave) != 44 or not chave.isdigit():
         raise HTTPException(status_code=400, detail="Chave inválida: deve conter 44 dígitos numéricos.")
 
-    # Use apenas placeholders posicionais "?" no fdb
-    sql = """
-        SELECT FIRST 1
-               t.STATUSCTE,
-               t.DATAEMI,
-               t.TOTALPESO,
-               t.NOMOVTRA,
-               t.MOTIVO,
-               mot.CGCCLI AS MOTORISTA_CPF
-          FROM TABCTRC t
-          JOIN TABCLI mot ON mot.NOCLI = t.NOMOT
-         WHERE t.CHAVECTE = ?
-    """
-
-    con = None
-    cur = None
-    try:
-        cfg = get_client_db(to_biz)
-        con = _connect(cfg)
-        cur = con.cursor()
+    def _carregar() -> Optional[Dict[str, Any]]:
+        with _connect(cfg) as con:
+            logging.debug("🔍 SQL (cte): %s", " ".join(line.strip() for line in SQL_CTE.strip().splitlines()))
+            logging.debug("🔍 Params: CHAVECTE=%s", chave)
 
-        logging.debug("🔍 SQL (cte): %s", " ".join(line.strip() for line in sql.strip().splitlines()))
-        logging.debug("🔍 Params: CHAVECTE=%s", chave)
+            cur = execute_cached(con, SQL_CTE, (chave,))
+            row = cur.fetchone()
+            if not row:
+                return None
 
-        cur.execute(sql, (chave,))
-        row = cur.fetchone()
+            # Nome das colunas do cursor podem vir com espaços em branco à direita
+            cols = [d[0].strip().upper() for d in cur.description]
+            return {cols[i]: row[i] for i in range(len(cols))}
 
-        if not row:
+    try:
+        cfg = get_client_db(to_biz)
+        # Linha pode vir do cache curto; a validação do motorista roda sempre
+        m = row_cache.get_or_load(cfg, "cte", chave, _carregar)
+        if m is None:
             raise HTTPException(status_code=404, detail="CT-e não encontrada")
 
-        # Nome das colunas do cursor podem vir com espaços em branco à direita
-        cols = [d[0].strip().upper() for d in cur.description]
-        m: Dict[str, Any] = {cols[i]: row[i] for i in range(len(cols))}
-
         cpf_digits = re.sub(r"\D", "", cpf or "")
         cpf_motorista = re.sub(r"\D", "", str(m.get("MOTORISTA_CPF") or ""))
         if not cpf_motorista or cpf_digits != cpf_motorista:
@@ -105,14 +89,3 @@ def get_cte_by_chave(
     except Exception as e:
         logging.exception("Erro ao consultar CT-e")
         raise HTTPException(status_code=500, detail=f"Erro ao consultar CT-e: {e}")
-    finally:
-        try:
-            if cur:
-                cur.close()
-        except Exception:
-            pass
-        try:
-            if con:
-                con.close()
-        except Exception:
-            pass
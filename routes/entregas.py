@@ -7,19 +7,14 @@ import re
 from typing import Any, Dict, List, Optional
 from datetime import datetime, date, time
 
-import fdb
-import platform
-from pathlib import Path
-from functions.db_client import _load_fbclient_hardcoded  # reuse loader
-
-# Garante fbclient carregado (hardcoded + logs)
-try:
-    DLL = _load_fbclient_hardcoded()
-except Exception:
-    DLL = None
+import fdb
 from fastapi import APIRouter, HTTPException, Path, Query, Header
+from pydantic import BaseModel, Field
 
-from functions.db_client import get_client_db, connect_client_db
+from functions import row_cache
+from functions.consultas_sql import SQL_DIALECT, SQL_ENTREGA, sql_entregas_lote
+from functions.db_client import get_client_db, client_connection
+from functions.stmt_cache import execute_cached
 
 router = APIRouter(prefix="/entregas", tags=["entregas"])
 
@@ -52,8 +47,8 @@ def _mask_doc(s: str) -> str:
 # ---------------- Conexão (Dialect 1) ----------------
 
 def _connect(cfg: Dict[str, Any]):
-    """Abre conexão com o banco do cliente usando Dialect 1."""
-    return connect_client_db(cfg, sql_dialect=1)
+    """Empresta conexão do pool do cliente usando Dialect 1 (context manager)."""
+    return client_connection(cfg, sql_dialect=SQL_DIALECT)
 
 def _cols(cur) -> List[str]:
     """Retorna a lista de nomes de colunas do cursor em maiúsculas."""
@@ -123,6 +118,62 @@ def _fmt_money_br(val: Any) -> Optional[str]:
     s = s.replace(",", "_").replace(".", ",").replace("_", ".")  # 1.234.567,89
     return f"R$ {s}"
 
+def _authorized(prov: str, st: str) -> bool:
+    """Confere o documento informado com o do motorista (CPF, CNPJ ou CPF embutido no CNPJ)."""
+    if not prov or not st:
+        return False
+    if _is_cpf(prov) and _is_cpf(st):
+        return prov == st
+    if _is_cnpj(prov) and _is_cnpj(st):
+        return prov == st
+    # Fallback: se o banco guarda CNPJ mas o CPF do motorista está embutido (últimos 11)
+    if _is_cpf(prov) and _is_cnpj(st) and len(st) == 14:
+        return prov == st[-11:]
+    return False
+
+
+def _montar_entrega(m: Dict[str, Any]) -> Dict[str, Any]:
+    """Formata a linha da consulta no payload de entrega."""
+    d_base = _ensure_date(m.get("M_DATA"))
+    t_base = _ensure_time(m.get("M_DATA_HORA"))
+    dt_entrega = _combine_date_time(d_base, t_base)
+
+    return {
+        "numero": m.get("NUMERO"),
+        "status": None,  # ajuste aqui se existir origem do status
+        "data_prevista": _fmt_date_br(d_base),
+        "data_entrega": _fmt_datetime_br(dt_entrega),
+        "cliente_nome": (m.get("CLIENTE_NOME") or None),
+        "cliente_cnpj": (m.get("CLIENTE_CNPJ") or None),
+        "motorista_nome": (m.get("MOTORISTA_NOME") or None),
+        "placa": (m.get("PLACA") or None),
+        "valor_total": _fmt_money_br(m.get("VALOR_TOTAL")),
+    }
+
+
+def _http_error_from_db(e: Exception) -> HTTPException:
+    """Traduz erro do Firebird em HTTPException com mensagem amigável."""
+    msg = str(e.args[0]) if getattr(e, "args", None) else str(e)
+    umsg = msg.upper()
+    if "TABMOVTRA_NF" in umsg:
+        return HTTPException(
+            status_code=500,
+            detail="Tabela TABMOVTRA_NF não encontrada. Ajuste o SQL ou crie a tabela/visão de notas."
+        )
+    if "TABMOVTRA" in umsg:
+        return HTTPException(
+            status_code=500,
+            detail="Tabela TABMOVTRA não encontrada neste banco."
+        )
+    if "TABCLI" in umsg:
+        return HTTPException(
+            status_code=500,
+            detail="Tabela TABCLI não encontrada para resolver cliente/motorista."
+        )
+    return HTTPException(status_code=500, detail=f"Erro ao consultar entrega: {msg}")
+
+
+
 # ---------------- Endpoint ----------------
 
 @router.get("/{numero}")
@@ -145,55 +196,28 @@ def get_entrega_by_numero(
     # Resolve DB do cliente pela master
     cfg = get_client_db(to_biz)
 
-    sql = """
-        SELECT FIRST 1
-               m.NOMOVTRA                                                     AS NUMERO,
-               m.DATA                                                         AS M_DATA,
-               m.DATA_HORA                                                    AS M_DATA_HORA,
-               c.NOMCLI                                                       AS CLIENTE_NOME,
-               c.CGCCLI                                                       AS CLIENTE_CNPJ,
-               mot.NOMCLI                                                     AS MOTORISTA_NOME,
-               mot.CGCCLI                                                     AS MOTORISTA_DOC,
-               m.PLACACAR                                                     AS PLACA,
-               (SELECT SUM(nf.VLRTOTAL)
-                  FROM TABMOVTRA_NF nf
-                 WHERE nf.NOMOVTRA = m.NOMOVTRA)                              AS VALOR_TOTAL
-          FROM TABMOVTRA m
-          LEFT JOIN TABCLI c   ON c.NOCLI  = m.NOCLI
-          LEFT JOIN TABCLI mot ON mot.NOCLI = m.NOMOT
-         WHERE m.NOMOVTRA = ?
-    """
 
-    con = None
-    try:
-        con = _connect(cfg)
-        cur = con.cursor()
-        logging.info("🔍 Consultando entrega NOMOVTRA=%s em %s", numero, cfg["database"])
+    def _carregar() -> Optional[Dict[str, Any]]:
+        with _connect(cfg) as con:
+            logging.info("🔍 Consultando entrega NOMOVTRA=%s em %s", numero, cfg["database"])
 
-        cur.execute(sql, (numero,))
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Entrega não encontrada")
+            cur = execute_cached(con, SQL_ENTREGA, (numero,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            cols = _cols(cur)
+            return {cols[i]: row[i] for i in range(len(cols))}
 
-        cols = _cols(cur)
-        m: Dict[str, Any] = {cols[i]: row[i] for i in range(len(cols))}
+    try:
+        # Linha pode vir do cache curto; a validação do motorista roda sempre
+        m = row_cache.get_or_load(cfg, "entrega", numero, _carregar)
+        if m is None:
+            raise HTTPException(status_code=404, detail="Entrega não encontrada")
 
         # Validação de documento
         provided = _digits(cpf)
         stored = _digits(m.get("MOTORISTA_DOC") or "")
 
-        def _authorized(prov: str, st: str) -> bool:
-            if not prov or not st:
-                return False
-            if _is_cpf(prov) and _is_cpf(st):
-                return prov == st
-            if _is_cnpj(prov) and _is_cnpj(st):
-                return prov == st
-            # Fallback: se o banco guarda CNPJ mas o CPF do motorista está embutido (últimos 11)
-            if _is_cpf(prov) and _is_cnpj(st) and len(st) == 14:
-                return prov == st[-11:]
-            return False
-
         if not _authorized(provided, stored):
             logging.warning(
                 "❌ Documento motorista não autorizado. informado=%s, banco=%s, motorista=%s",
@@ -201,22 +225,7 @@ def get_entrega_by_numero(
             )
             raise HTTPException(status_code=403, detail="Motorista não autorizado para esta entrega")
 
-        # Datas
-        d_base = _ensure_date(m.get("M_DATA"))
-        t_base = _ensure_time(m.get("M_DATA_HORA"))
-        dt_entrega = _combine_date_time(d_base, t_base)
-
-        entrega = {
-            "numero": m.get("NUMERO"),
-            "status": None,  # ajuste aqui se existir origem do status
-            "data_prevista": _fmt_date_br(d_base),
-            "data_entrega": _fmt_datetime_br(dt_entrega),
-            "cliente_nome": (m.get("CLIENTE_NOME") or None),
-            "cliente_cnpj": (m.get("CLIENTE_CNPJ") or None),
-            "motorista_nome": (m.get("MOTORISTA_NOME") or None),
-            "placa": (m.get("PLACA") or None),
-            "valor_total": _fmt_money_br(m.get("VALOR_TOTAL")),
-        }
+        entrega = _montar_entrega(m)
 
         logging.info("✅ Entrega autorizada e retornada: NOMOVTRA=%s", entrega["numero"])
         return {"status": "ok", "entrega": entrega}
@@ -224,31 +233,106 @@ def get_entrega_by_numero(
     except HTTPException:
         raise
     except fdb.fbcore.DatabaseError as e:
-        msg = str(e.args[0]) if getattr(e, "args", None) else str(e)
         logging.exception("Erro ao consultar entrega")
-        umsg = msg.upper()
-        if "TABMOVTRA_NF" in umsg:
-            raise HTTPException(
-                status_code=500,
-                detail="Tabela TABMOVTRA_NF não encontrada. Ajuste o SQL ou crie a tabela/visão de notas."
-            )
-        if "TABMOVTRA" in umsg:
-            raise HTTPException(
-                status_code=500,
-                detail="Tabela TABMOVTRA não encontrada neste banco."
-            )
-        if "TABCLI" in umsg:
-            raise HTTPException(
-                status_code=500,
-                detail="Tabela TABCLI não encontrada para resolver cliente/motorista."
-            )
-        raise HTTPException(status_code=500, detail=f"Erro ao consultar entrega: {msg}")
+        raise _http_error_from_db(e)
     except Exception as e:
         logging.exception("Erro inesperado ao consultar entrega")
         raise HTTPException(status_code=500, detail=f"Erro ao consultar entrega: {e}")
-    finally:
-        if con:
-            try:
-                con.close()
-            except Exception:
-                pass
+
+
+# ---------------- Lote ----------------
+
+# Máximo de entregas por chamada do /entregas/batch
+BATCH_MAX_ITENS = 50
+# Tamanhos de IN (...) usados no lote: a lista é completada até o próximo degrau,
+# assim poucas variações de SQL ficam no cache de prepared statements.
+_BATCH_DEGRAUS = (5, 10, 25, BATCH_MAX_ITENS)
+# NOMOVTRA aceito no lote: dígitos ASCII que cabem no INTEGER do Firebird
+_NUMERO_LOTE = re.compile(r"[0-9]{1,9}")
+
+
+class EntregasBatchRequest(BaseModel):
+    """Lista de NOMOVTRA a consultar para um mesmo motorista."""
+    numeros: List[str] = Field(..., description="Números das entregas (NOMOVTRA)")
+    cpf: str = Field(..., description="CPF/CNPJ do motorista")
+
+
+def _erro_item(numero: str, codigo: int, detalhe: str) -> Dict[str, Any]:
+    return {"numero": numero, "status": "erro", "codigo": codigo, "detalhe": detalhe}
+
+
+@router.post("/batch")
+def get_entregas_batch(
+    req: EntregasBatchRequest,
+    to_biz: str = Header(..., alias="x-whatsapp-number"),
+):
+    """
+    Consulta várias entregas do mesmo motorista em uma única ida ao banco.
+    Cada item volta com `status` "ok" (e a entrega) ou "erro" (código/detalhe,
+    com as mesmas regras do GET /entregas/{numero}). Números já em cache não
+    vão ao banco.
+    """
+    numeros: List[str] = []
+    for n in req.numeros:
+        n = str(n or "").strip()
+        if n not in numeros:
+            numeros.append(n)
+    if not numeros:
+        raise HTTPException(status_code=400, detail="Informe ao menos um número de entrega")
+    if len(numeros) > BATCH_MAX_ITENS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_ITENS} entregas por consulta")
+
+    cfg = get_client_db(to_biz)
+    linhas: Dict[str, Dict[str, Any]] = {}
+    validos: List[str] = []
+    for n in numeros:
+        if not _NUMERO_LOTE.fullmatch(n):
+            continue
+        m = row_cache.get(cfg, "entrega", n)
+        if m is not None:
+            linhas[row_cache.normalizar_ident(n)] = m
+        else:
+            validos.append(n)
+
+    if validos:
+        tamanho = next(d for d in _BATCH_DEGRAUS if d >= len(validos))
+        params = validos + [validos[-1]] * (tamanho - len(validos))
+        try:
+            with _connect(cfg) as con:
+                logging.info("🔍 Consultando %d entregas em lote em %s", len(validos), cfg["database"])
+                cur = execute_cached(con, sql_entregas_lote(tamanho), params + params)
+                cols = _cols(cur)
+                for row in cur.fetchall():
+                    m = {cols[i]: row[i] for i in range(len(cols))}
+                    linhas[row_cache.normalizar_ident(m.get("NUMERO"))] = m
+                    row_cache.put(cfg, "entrega", m.get("NUMERO"), m)
+        except fdb.fbcore.DatabaseError as e:
+            logging.exception("Erro ao consultar entregas em lote")
+            raise _http_error_from_db(e)
+        except Exception as e:
+            logging.exception("Erro inesperado ao consultar entregas em lote")
+            raise HTTPException(status_code=500, detail=f"Erro ao consultar entregas: {e}")
+
+    provided = _digits(req.cpf)
+    resultados: List[Dict[str, Any]] = []
+    for numero in numeros:
+        if not _NUMERO_LOTE.fullmatch(numero):
+            resultados.append(_erro_item(numero, 400, "Número da entrega inválido"))
+            continue
+        m = linhas.get(row_cache.normalizar_ident(numero))
+        if m is None:
+            resultados.append(_erro_item(numero, 404, "Entrega não encontrada"))
+            continue
+        stored = _digits(m.get("MOTORISTA_DOC") or "")
+        if not _authorized(provided, stored):
+            logging.warning(
+                "❌ Documento motorista não autorizado. informado=%s, banco=%s, NOMOVTRA=%s",
+                _mask_doc(provided), _mask_doc(stored), numero
+            )
+            resultados.append(_erro_item(numero, 403, "Motorista não autorizado para esta entrega"))
+            continue
+        resultados.append({"numero": numero, "status": "ok", "entrega": _montar_entrega(m)})
+
+    ok = sum(1 for r in resultados if r["status"] == "ok")
+    logging.info("✅ Lote de entregas: %d/%d autorizadas", ok, len(resultados))
+    return {"status": "ok", "entregas": resultados}
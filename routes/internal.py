@@ -0,0 +1,55 @@
+"""Endpoints internos chamados pelo Node (somente a partir de localhost)."""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+
+from functions import metrics
+from functions.db_client import get_client_db_async, invalidate_client_db
+from functions.executors import run_db
+from functions.index_advisor import analisar
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+_LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def _somente_local(request: Request) -> None:
+    """Recusa chamadas que não venham da própria máquina."""
+    host = request.client.host if request.client else ""
+    if host not in _LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Endpoint interno")
+
+
+class InvalidarTenantRequest(BaseModel):
+    """Número do bot cujas credenciais mudaram (vazio = todos)."""
+    toBiz: Optional[str] = Field(None, description="Número do WhatsApp do cliente")
+
+
+@router.post("/tenants/invalidate", dependencies=[Depends(_somente_local)])
+def invalidar_tenant(req: InvalidarTenantRequest) -> dict:
+    """Descarta as credenciais em cache para que a próxima requisição consulte o Node."""
+    removidos = invalidate_client_db(req.toBiz)
+    return {"status": "ok", "removidos": removidos}
+
+
+@router.get("/metrics", dependencies=[Depends(_somente_local)])
+def obter_metricas() -> dict:
+    """Métricas do processo: pools, caches, tempos de carga e contadores."""
+    return metrics.snapshot()
+
+
+@router.get("/tenants/indexes", dependencies=[Depends(_somente_local)])
+async def analisar_indices(
+    toBiz: str = Query(..., description="Número do WhatsApp do cliente"),
+    ddl: bool = Query(False, description="Inclui o DDL sugerido"),
+) -> dict:
+    """Relatório de índices ausentes e leituras NATURAL nos SQL da API para o tenant."""
+    cfg = await get_client_db_async(toBiz)
+    try:
+        return await run_db(analisar, cfg, ddl)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Falha ao analisar índices: {exc}")
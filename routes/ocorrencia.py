@@ -3,8 +3,10 @@
 from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel, Field
 
+from functions import row_cache
 from functions.save_ocorrencia import save_ocorrencia_texto
-from functions.db_client import get_client_db
+from functions.db_client import get_client_db_async
+from functions.executors import run_db
 
 router = APIRouter()
 
@@ -23,10 +25,11 @@ async def registrar_ocorrencia(
 ) -> dict:
     """Grava a ocorrência na tabela TABMOVTRA_OCO do cliente."""
     try:
-        cfg = get_client_db(to_biz)
-        save_ocorrencia_texto(
-            req.nomovtra, req.texto, req.usuario, cfg
+        cfg = await get_client_db_async(to_biz)
+        noitem = await run_db(
+            save_ocorrencia_texto, req.nomovtra, req.texto, req.usuario, cfg
         )
-        return {"status": "ok"}
+        row_cache.invalidate(cfg, "entrega", req.nomovtra)
+        return {"status": "ok", "nomovtra": req.nomovtra, "noitem": noitem}
     except Exception as exc:  # pragma: no cover - falha inesperada
         raise HTTPException(status_code=500, detail=str(exc))
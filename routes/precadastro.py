@@ -7,7 +7,8 @@ import logging
 import re
 
 from functions.save_precad_pessoa import save_precadastro_pessoa
-from functions.db_client import get_client_db
+from functions.db_client import get_client_db_async
+from functions.executors import run_db
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -64,8 +65,8 @@ async def precadastro(
             raise HTTPException(status_code=400, detail=detalhe)
 
         logger.info(f"Salvando pré-cadastro: {dados_norm}")
-        cfg = get_client_db(to_biz)
-        save_precadastro_pessoa(dados_norm, req.link, cfg)
+        cfg = await get_client_db_async(to_biz)
+        await run_db(save_precadastro_pessoa, dados_norm, req.link, cfg)
 
         return {"status": "salvo"}
 
@@ -1,6 +1,8 @@
 # routes/upload.py
 """
-Endpoint de upload que usa GPT direto em imagem (sem OCR local) e texto para PDFs.
+Endpoint de upload que usa GPT direto em imagem e texto para PDFs. Para CNH
+(tipo=pessoa), o OCR local lê os campos primeiro e o GPT só completa o que faltar.
+POST /upload/stream faz o mesmo e envia as etapas e o texto do cartão via SSE.
 
 Retorna:
 {
@@ -10,20 +12,33 @@ Retorna:
 }
 """
 import os
+import json
 import uuid
+import asyncio
 import logging
 import re
+import threading
 from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
 from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from config import UPLOAD_DIR
+from functions.executors import run_cpu, run_io
+from functions.extraction_passes import executar_passes
 from functions.extract_text_from_pdf import extract_text_from_pdf
+from functions.extract_text_from_image import extract_text_from_image_async, ocr_disponivel
+from functions import cnh_ocr, fiscal_key, metrics
+from functions.barcode_reader import read_access_key
 from functions.parse_with_gpt import (
-    parse_with_gpt,
-    verify_cnh_fields_from_image,
+    PreparedImage,
+    card_from_fields,
+    complete_cnh_fields_async,
+    contar_chamadas,
+    parse_with_gpt_async,
+    verify_cnh_fields_from_image_async,
     PROMPT_VEICULO_RULES,
-    extract_cte_key,
+    extract_cte_key_async,
 )
 
 router = APIRouter()
@@ -33,6 +48,13 @@ UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp"}
 
+# CNH: OCR local antes do GPT; acima de N campos essenciais pendentes o OCR é descartado
+CNH_OCR_FIRST = os.getenv("CNH_OCR_FIRST", "1").strip().lower() not in ("0", "false", "no", "")
+CNH_OCR_MAX_PENDENTES = int(os.getenv("CNH_OCR_MAX_PENDENTES", "3"))
+
+# Campos que o /precadastro exige; sem eles o cartão do OCR não serve
+_CNH_OBRIGATORIOS = ("Nome", "CPF", "Data de nascimento")
+
 # ===================== PROMPTS =====================
 
 # Preview textual (WhatsApp) para CT-e
@@ -60,6 +82,7 @@ PROMPT_CTE_RULES = (
     "Regras:\n"
     "- Se houver várias seções, use o que for do CT-e principal (não do MDF-e).\n"
     "- Mantenha exatamente os rótulos acima e substitua apenas os valores entre chaves.\n"
+    "- Emissão: apenas a data, no formato DD/MM/AAAA (sem a hora).\n"
 )
 
 # ===================== Helpers de cartão (pessoa) =====================
@@ -171,16 +194,9 @@ def _postprocess_card(card_text: str) -> str:
 def _find_cte_key_44(texto: str) -> str:
     """
     Encontra a chave do CT-e em 'texto', permitindo separadores (ponto, barra, hífen, espaço)
-    e retorna somente os 44 dígitos.
+    e retorna somente os 44 dígitos. Só aceita chaves com DV, UF, AAMM e modelo válidos.
     """
-    if not texto:
-        return ""
-    # Permite 44 dígitos com separadores entre eles
-    m = re.search(r"(?:\d[.\-\/\s]?){44}", texto)
-    if not m:
-        return ""
-    digits = re.sub(r"\D", "", m.group(0))
-    return digits if len(digits) == 44 else ""
+    return fiscal_key.extract_cte_access_key(texto or "") or ""
 
 def _normalize_cte_chave_in_preview(preview_text: str, fonte_textual: str = "") -> str:
     """
@@ -193,8 +209,265 @@ def _normalize_cte_chave_in_preview(preview_text: str, fonte_textual: str = "")
         return preview_text
     return _replace_card_line(preview_text, "Chave", key)
 
+def _registrar_preparo(prep: PreparedImage) -> None:
+    """Loga o custo do pré-processamento único e a CPU poupada nos demais passes."""
+    metrics.observe("upload.preprocess", prep.custo_s)
+    metrics.incr("upload.preprocess_saved_ms", prep.poupado_s * 1000.0)
+    logging.info(
+        "🖼️ Imagem preparada 1x em %.0f ms (pré-processo %.0f ms + base64/hash %.0f ms), "
+        "usada por %d passes; CPU poupada ~%.0f ms",
+        prep.custo_s * 1000.0, prep.preprocess_s * 1000.0, prep.encode_s * 1000.0,
+        prep.usos, prep.poupado_s * 1000.0,
+    )
+
+
+_uploads_lock = threading.Lock()
+_uploads = {"total": 0, "sem_llm": 0}
+
+
+def _registrar_upload(chamadas: int) -> None:
+    with _uploads_lock:
+        _uploads["total"] += 1
+        if not chamadas:
+            _uploads["sem_llm"] += 1
+
+
+def _uploads_stats() -> Dict[str, float]:
+    """Uploads processados e fração concluída sem nenhuma chamada à OpenAI."""
+    with _uploads_lock:
+        total, sem_llm = _uploads["total"], _uploads["sem_llm"]
+    return {"total": total, "sem_llm": sem_llm, "sem_llm_rate": round(sem_llm / total, 4) if total else 0.0}
+
+
+metrics.register_source("upload_llm", _uploads_stats)
+
+
+async def _cnh_via_ocr(contents: bytes, prep: PreparedImage) -> Optional[dict]:
+    """
+    Lê a CNH com o OCR local e pede ao GPT só os campos que faltaram (todos os que o
+    /precadastro grava, não só os essenciais).
+    Retorna None se o OCR não estiver disponível ou ler pouco (segue o fluxo só GPT).
+    """
+    if not ocr_disponivel():
+        return None
+    try:
+        texto = await extract_text_from_image_async(contents)
+    except Exception as e:
+        logging.warning("OCR local da CNH falhou: %s", e)
+        return None
+
+    campos = cnh_ocr.ler_campos(texto)
+    faltando = cnh_ocr.pendentes(campos)
+    logging.info(
+        "🔎 OCR local da CNH: %d/%d campos essenciais (pendentes: %s)",
+        len(cnh_ocr.ESSENCIAIS) - len(faltando), len(cnh_ocr.ESSENCIAIS), ", ".join(faltando) or "-",
+    )
+    if len(faltando) > CNH_OCR_MAX_PENDENTES:
+        metrics.incr("cnh_ocr.insuficiente")
+        return None
+    complemento = cnh_ocr.faltantes(campos)
+    if complemento:
+        campos.update(await complete_cnh_fields_async(complemento, image=prep))
+        metrics.incr("cnh_ocr.complementado")
+    else:
+        metrics.incr("cnh_ocr.completo")
+
+    if any(c not in campos for c in _CNH_OBRIGATORIOS):
+        metrics.incr("cnh_ocr.insuficiente")
+        return None
+    text = _postprocess_card(card_from_fields(campos))
+    return {"kind": "text", "text": text, "DATANASC": campos["Data de nascimento"]}
+
+
+async def _cnh_via_gpt(prep: PreparedImage) -> dict:
+    """Cartão completo no GPT com o 2º passe de verificação em paralelo."""
+    dados, extras = await executar_passes(
+        ("cartao", parse_with_gpt_async(image=prep)),
+        {"verificacao": verify_cnh_fields_from_image_async(image=prep)},
+    )
+    logging.info("🧠 GPT processou IMAGEM (cartão pessoa)")
+    ver = extras["verificacao"]
+    text = dados.get("text") or ""
+
+    if ver is not None:
+        logging.info("🔍 Verificação focada aplicada %s", {"ver": ver})
+        # Mapeia DOB → DATANASC para salvar depois
+        if ver.get("DOB") and re.fullmatch(r"\d{2}/\d{2}/\d{4}", ver["DOB"]):
+            dados["DATANASC"] = ver["DOB"]
+        else:
+            dados["DATANASC"] = None  # forçar ausência se não veio válido
+
+        text = _prefer_dob_from_verification(text, ver)
+        text = _prefer_rg_from_verification(text, ver)
+        text = _prefer_cnh_from_verification(text, ver)
+    else:
+        # Verificação atrasada: mantém o cartão do 1º passe
+        dob = _extract_card_line(text, "Data de nascimento")
+        dados["DATANASC"] = dob if re.fullmatch(r"\d{2}/\d{2}/\d{4}", dob) else None
+
+    dados["text"] = _postprocess_card(text)
+    return dados
+
+
+def _write_file(path: Path, contents: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(contents)
+
+
 # ===================== Endpoint =====================
 
+# Recebe os eventos de etapa do /upload/stream: emitir(evento, dados)
+Emissor = Callable[[str, Dict[str, Any]], None]
+
+
+def _sse(evento: str, dados: Dict[str, Any]) -> str:
+    """Formata um evento Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+async def _processar(
+    contents: bytes,
+    ctype: str,
+    tipo_norm: str,
+    temp_path: Path,
+    emitir: Optional[Emissor] = None,
+) -> Dict[str, Any]:
+    """
+    Extrai os dados do arquivo já salvo em `temp_path` e monta a resposta do /upload.
+    Com `emitir`, publica as etapas (preprocessed, key_found, card_delta, card_ready).
+    """
+    def _evento(evento: str, dados: Dict[str, Any]) -> None:
+        if emitir is not None:
+            emitir(evento, dados)
+
+    def _delta(texto: Optional[str]) -> None:
+        # None: o texto parcial foi descartado (escalada de modelo)
+        if texto is None:
+            _evento("card_reset", {})
+        else:
+            _evento("card_delta", {"text": texto})
+
+    on_delta = _delta if emitir is not None else None
+
+    dados = None
+    raw_pdf_text = ""  # usado para cte (PDF)
+    chave = None
+
+    # ------- Imagens -------
+    if ctype in ALLOWED_IMAGE_TYPES or ctype.startswith("image/"):
+        # Pré-processa uma única vez (resolução/detail do perfil do tipo); todos os passes usam a mesma imagem
+        prep = await run_cpu(PreparedImage.from_bytes, contents, ctype or "image/jpeg", tipo_norm)
+        _evento("preprocessed", {"tipo": tipo_norm, "ajuste": prep.ajuste, "tokens_estimados": prep.tokens_estimados})
+        if tipo_norm == "veiculo":
+            dados = await parse_with_gpt_async(
+                image=prep,
+                system_prompt=PROMPT_VEICULO_RULES,
+                use_structured=False,
+                expect_json=False,
+                on_delta=on_delta,
+            )
+            logging.info("🧠 GPT processou IMAGEM (veículo)")
+        elif tipo_norm == "cte":
+            # Chave no código de barras/QR (local, validada): dispensa o passe de GPT
+            chave = await run_cpu(read_access_key, contents)
+            if chave:
+                _evento("key_found", {"chave": chave, "origem": "barcode"})
+            # Preview e chave são independentes: rodam em paralelo
+            dados, extras = await executar_passes(
+                ("preview", parse_with_gpt_async(
+                    image=prep,
+                    system_prompt=PROMPT_CTE_RULES,
+                    use_structured=False,
+                    expect_json=False,
+                    tipo="cte",
+                    on_delta=on_delta,
+                    chave=chave,
+                )),
+                {} if chave else {"chave": extract_cte_key_async(image=prep)},
+            )
+            logging.info("🧠 GPT processou IMAGEM (CT-e)")
+            text = dados.get("text") or ""
+            if not chave:
+                chave = extras.get("chave") or _find_cte_key_44(text)
+                if chave:
+                    _evento("key_found", {"chave": chave, "origem": "gpt"})
+            if chave:
+                text = _replace_card_line(text, "Chave", chave)
+            dados["text"] = text
+            dados["chave"] = chave
+            logging.info("🔧 CT-e: chave extraída (imagem)")
+        else:  # pessoa
+            # OCR local primeiro; sem leitura suficiente, cartão e verificação no GPT
+            dados = await _cnh_via_ocr(contents, prep) if CNH_OCR_FIRST else None
+            if dados is None:
+                dados = await _cnh_via_gpt(prep)
+
+        _registrar_preparo(prep)
+
+    # ------- PDFs -------
+    elif ctype == "application/pdf":
+        raw_pdf_text = await run_cpu(extract_text_from_pdf, str(temp_path))
+        _evento("preprocessed", {"tipo": tipo_norm, "caracteres": len(raw_pdf_text)})
+        if tipo_norm == "veiculo":
+            dados = await parse_with_gpt_async(
+                texto=raw_pdf_text,
+                system_prompt=PROMPT_VEICULO_RULES,
+                use_structured=False,
+                expect_json=False,
+                on_delta=on_delta,
+            )
+            logging.info("🧠 GPT processou PDF (veículo)")
+        elif tipo_norm == "cte":
+            # Chave direto do texto do PDF (validada); GPT só se não houver candidata
+            chave = _find_cte_key_44(raw_pdf_text)
+            if chave:
+                metrics.incr("cte_key.local")
+                _evento("key_found", {"chave": chave, "origem": "pdf"})
+            dados, extras = await executar_passes(
+                ("preview", parse_with_gpt_async(
+                    texto=raw_pdf_text,
+                    system_prompt=PROMPT_CTE_RULES,
+                    use_structured=False,
+                    expect_json=False,
+                    tipo="cte",
+                    on_delta=on_delta,
+                    chave=chave,
+                )),
+                {} if chave else {"chave": extract_cte_key_async(texto=raw_pdf_text)},
+            )
+            logging.info("🧠 GPT processou PDF (CT-e)")
+            text = dados.get("text") or ""
+            if not chave:
+                chave = extras.get("chave") or _find_cte_key_44(text)
+                if chave:
+                    _evento("key_found", {"chave": chave, "origem": "gpt"})
+            if chave:
+                text = _replace_card_line(text, "Chave", chave)
+            dados["text"] = text
+            dados["chave"] = chave
+            logging.info("🔧 CT-e: chave extraída (PDF)")
+        else:
+            dados = await parse_with_gpt_async(texto=raw_pdf_text)
+            logging.info("🧠 GPT processou PDF (cartão pessoa)")
+            dados["text"] = _postprocess_card(dados.get("text") or "")
+
+    # ------- Outros tipos -------
+    else:
+        try:
+            os.remove(temp_path)
+        except Exception:
+            pass
+        logging.warning("Tipo de arquivo não suportado: %s", ctype)
+        raise HTTPException(status_code=415, detail=f"Tipo de arquivo não suportado: {ctype or 'desconhecido'}")
+
+    # Normaliza saída
+    if not isinstance(dados, dict) or dados.get("kind") != "text":
+        dados = {"kind": "text", "text": str(dados)}
+    _evento("card_ready", {"dados": dados})
+
+    return {"status": "processado", "dados": dados, "temp_path": str(temp_path), "chave": chave}
+
+
 @router.post("/upload")
 async def upload(file: UploadFile = File(...), tipo: str = "pessoa"):
     """
@@ -207,123 +480,78 @@ async def upload(file: UploadFile = File(...), tipo: str = "pessoa"):
     ext = Path(file.filename).suffix or ""
     temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{ext}"
 
+    llm = contar_chamadas()
     try:
         contents = await file.read()
-        with open(temp_path, "wb") as f:
-            f.write(contents)
+        await run_io(_write_file, temp_path, contents)
 
         ctype = (getattr(file, "content_type", "") or "").lower()
         logging.debug("Content-Type detectado: %s", ctype)
 
-        dados = None
-        raw_pdf_text = ""  # usado para cte (PDF)
-        chave = None
-
-        # ------- Imagens -------
-        if ctype in ALLOWED_IMAGE_TYPES or ctype.startswith("image/"):
-            if tipo_norm == "veiculo":
-                dados = parse_with_gpt(
-                    image_bytes=contents,
-                    image_mime=ctype or "image/jpeg",
-                    system_prompt=PROMPT_VEICULO_RULES,
-                    use_structured=False,
-                    expect_json=False,
-                )
-                logging.info("🧠 GPT processou IMAGEM (veículo)")
-            elif tipo_norm == "cte":
-                dados = parse_with_gpt(
-                    image_bytes=contents,
-                    image_mime=ctype or "image/jpeg",
-                    system_prompt=PROMPT_CTE_RULES,
-                    use_structured=False,
-                    expect_json=False,
-                )
-                logging.info("🧠 GPT processou IMAGEM (CT-e)")
-                text = dados.get("text") or ""
-                chave = extract_cte_key(
-                    image_bytes=contents, image_mime=ctype or "image/jpeg"
-                )
-                if not chave:
-                    chave = _find_cte_key_44(text)
-                if chave:
-                    text = _replace_card_line(text, "Chave", chave)
-                dados["text"] = text
-                dados["chave"] = chave
-                logging.info("🔧 CT-e: chave extraída (imagem)")
-            else:  # pessoa
-                dados = parse_with_gpt(
-                    image_bytes=contents, image_mime=ctype or "image/jpeg"
-                )
-                logging.info("🧠 GPT processou IMAGEM (cartão pessoa)")
-
-                # 2º passe → verificação focada (somente pessoa)
-                ver = verify_cnh_fields_from_image(contents, ctype or "image/jpeg")
-                logging.info("🔍 Verificação focada aplicada %s", {"ver": ver})
-
-                # Mapeia DOB → DATANASC para salvar depois
-                if ver.get("DOB") and re.fullmatch(r"\d{2}/\d{2}/\d{4}", ver["DOB"]):
-                    dados["DATANASC"] = ver["DOB"]
-                else:
-                    dados["DATANASC"] = None  # forçar ausência se não veio válido
-
-                text = dados.get("text") or ""
-                text = _prefer_dob_from_verification(text, ver)
-                text = _prefer_rg_from_verification(text, ver)
-                text = _prefer_cnh_from_verification(text, ver)
-                text = _postprocess_card(text)
-                dados["text"] = text
-
-
-        # ------- PDFs -------
-        elif ctype == "application/pdf":
-            raw_pdf_text = extract_text_from_pdf(str(temp_path))
-            if tipo_norm == "veiculo":
-                dados = parse_with_gpt(
-                    texto=raw_pdf_text,
-                    system_prompt=PROMPT_VEICULO_RULES,
-                    use_structured=False,
-                    expect_json=False,
-                )
-                logging.info("🧠 GPT processou PDF (veículo)")
-            elif tipo_norm == "cte":
-                dados = parse_with_gpt(
-                    texto=raw_pdf_text,
-                    system_prompt=PROMPT_CTE_RULES,
-                    use_structured=False,
-                    expect_json=False,
-                )
-                logging.info("🧠 GPT processou PDF (CT-e)")
-                text = dados.get("text") or ""
-                chave = extract_cte_key(texto=raw_pdf_text)
-                if not chave:
-                    chave = _find_cte_key_44(raw_pdf_text)
-                if chave:
-                    text = _replace_card_line(text, "Chave", chave)
-                dados["text"] = text
-                dados["chave"] = chave
-                logging.info("🔧 CT-e: chave extraída (PDF)")
-            else:
-                dados = parse_with_gpt(texto=raw_pdf_text)
-                logging.info("🧠 GPT processou PDF (cartão pessoa)")
-                dados["text"] = _postprocess_card(dados.get("text") or "")
-
-        # ------- Outros tipos -------
-        else:
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
-            logging.warning("Tipo de arquivo não suportado: %s", ctype)
-            raise HTTPException(status_code=415, detail=f"Tipo de arquivo não suportado: {ctype or 'desconhecido'}")
-
-        # Normaliza saída
-        if not isinstance(dados, dict) or dados.get("kind") != "text":
-            dados = {"kind": "text", "text": str(dados)}
-
-        return JSONResponse({"status": "processado", "dados": dados, "temp_path": str(temp_path), "chave": chave})
+        resultado = await _processar(contents, ctype, tipo_norm, temp_path)
+        _registrar_upload(llm["chamadas"])
+        return JSONResponse(resultado)
 
     except HTTPException:
         raise
     except Exception as e:
         logging.exception("Erro inesperado no upload")
         raise HTTPException(status_code=500, detail="Erro interno ao processar o arquivo") from e
+
+
+@router.post("/upload/stream")
+async def upload_stream(file: UploadFile = File(...), tipo: str = "pessoa"):
+    """
+    Mesmo processamento do /upload, respondendo em Server-Sent Events.
+
+    Eventos: received, preprocessed, key_found (CT-e), card_delta {text} com o
+    cartão conforme o modelo gera (veículo e CT-e), card_reset (descartar o
+    parcial), card_ready {dados} e, por último, done (mesmo corpo do /upload)
+    ou error {status_code, detail}.
+    """
+    tipo_norm = (tipo or "pessoa").strip().lower()
+    logging.info("Recebendo arquivo %s (%s) tipo=%s [stream]", file.filename, file.content_type, tipo_norm)
+
+    ext = Path(file.filename).suffix or ""
+    temp_path = UPLOAD_DIR / f"{uuid.uuid4()}{ext}"
+    ctype = (getattr(file, "content_type", "") or "").lower()
+
+    # Lido e salvo antes de abrir o stream (o UploadFile não sobrevive à resposta)
+    contents = await file.read()
+    await run_io(_write_file, temp_path, contents)
+
+    async def eventos():
+        fila: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+
+        def emitir(evento: str, dados: Dict[str, Any]) -> None:
+            fila.put_nowait((evento, dados))
+
+        async def executar() -> None:
+            llm = contar_chamadas()
+            try:
+                resultado = await _processar(contents, ctype, tipo_norm, temp_path, emitir)
+                _registrar_upload(llm["chamadas"])
+                emitir("done", resultado)
+            except HTTPException as e:
+                emitir("error", {"status_code": e.status_code, "detail": e.detail})
+            except Exception:
+                logging.exception("Erro inesperado no upload (stream)")
+                emitir("error", {"status_code": 500, "detail": "Erro interno ao processar o arquivo"})
+            finally:
+                fila.put_nowait(None)
+
+        yield _sse("received", {"tipo": tipo_norm, "bytes": len(contents), "temp_path": str(temp_path)})
+        tarefa = asyncio.create_task(executar())
+        try:
+            while (item := await fila.get()) is not None:
+                yield _sse(*item)
+        finally:
+            # Cliente desconectou no meio: não segue gastando chamadas
+            if not tarefa.done():
+                tarefa.cancel()
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,13 @@
+"""Configuração comum dos testes (roda a partir da raiz do repositório)."""
+
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# Cache de extrações em pasta temporária e chave fictícia (nenhum teste chama a OpenAI)
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "extracoes.sqlite"))
+os.environ.setdefault("OPENAI_API_KEY", "teste")
@@ -0,0 +1,89 @@
+"""Leitura local dos campos da CNH (texto do OCR → campos validados)."""
+
+from functions import cnh_ocr
+
+REGISTRO = "12345678026"
+
+OCR_CNH = f"""REPUBLICA FEDERATIVA DO BRASIL
+NOME
+JOAO DA SILVA SANTOS
+DOC. IDENTIDADE / ORG. EMISSOR / UF
+1234567 SSP SC
+CPF DATA, LOCAL E UF DE NASCIMENTO
+529.982.247-25 01/02/1990, FLORIANOPOLIS, SC
+FILIACAO
+JOSE DA SILVA SANTOS
+MARIA DE SOUZA SANTOS
+PERMISSAO ACC CAT. HAB.
+AB
+N REGISTRO VALIDADE 1a HABILITACAO
+{REGISTRO} 05/06/2030 03/04/2010
+NACIONALIDADE
+BRASILEIRO
+LOCAL
+SAO JOSE, SC
+DATA EMISSAO
+05/06/2025
+SC123456789
+"""
+
+
+def test_le_todos_os_campos_gravados_pelo_precadastro():
+    campos = cnh_ocr.ler_campos(OCR_CNH)
+
+    assert campos == {
+        "Nome": "JOAO DA SILVA SANTOS",
+        "CPF": "529.982.247-25",
+        "Data de nascimento": "01/02/1990",
+        "Local de nascimento": "FLORIANOPOLIS, SC",
+        "Registro": "1234567",
+        "Número de registro CNH": REGISTRO,
+        "Validade": "05/06/2030",
+        "Data da 1ª habilitação": "03/04/2010",
+        "Data de emissão": "05/06/2025",
+        "Pai": "JOSE DA SILVA SANTOS",
+        "Mãe": "MARIA DE SOUZA SANTOS",
+        "Categoria Habilitação": "AB",
+        "Nacionalidade": "BRASILEIRO",
+        "Local de emissão": "SAO JOSE",
+        "UF": "SC",
+        "Código": f"{REGISTRO} / SC123456789",
+    }
+    assert cnh_ocr.pendentes(campos) == []
+    assert cnh_ocr.faltantes(campos) == []
+
+
+def test_campo_com_digito_verificador_errado_fica_pendente():
+    campos = cnh_ocr.ler_campos(OCR_CNH.replace("529.982.247-25", "529.982.247-00"))
+
+    assert "CPF" not in campos
+    assert cnh_ocr.pendentes(campos) == ["CPF"]
+
+
+def test_sem_filiacao_e_local_so_os_persistidos_faltam():
+    texto = "\n".join(
+        line for line in OCR_CNH.splitlines()
+        if not line.startswith(("JOSE", "MARIA", "LOCAL", "SAO JOSE"))
+    )
+    campos = cnh_ocr.ler_campos(texto)
+
+    assert cnh_ocr.pendentes(campos) == []
+    assert cnh_ocr.faltantes(campos) == ["Pai", "Mãe", "UF", "Local de emissão"]
+
+
+def test_categorias_com_subcategoria():
+    for cat in ("A1", "B1", "C1", "BE", "CE", "DE", "C1E", "ACC"):
+        campos = cnh_ocr.ler_campos(f"CAT. HAB.\n{cat}\n")
+        assert campos.get("Categoria Habilitação") == cat
+
+
+def test_estruturado_preenche_todos_os_blocos_do_cartao():
+    est = cnh_ocr.estruturado(cnh_ocr.ler_campos(OCR_CNH))
+
+    assert est["identificacao"]["pai"] == "JOSE DA SILVA SANTOS"
+    assert est["documento"]["primeira_habilitacao"] == "03/04/2010"
+    assert est["orgao_emissor"] == {
+        "uf": "SC", "local_emissao": "SAO JOSE", "codigo": f"{REGISTRO} / SC123456789",
+    }
+    assert cnh_ocr.estruturado({})["identificacao"]["nome"] == "-"
+
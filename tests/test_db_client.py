@@ -0,0 +1,44 @@
+"""Conexão com o banco do tenant: charset lembrado no perfil."""
+
+import pytest
+
+from functions import db_client, tenant_profile
+
+NODE = {"DB_HOST": "fb", "DB_PORT": "3050", "DB_PATH": "/dados/x.fdb", "DB_USER": "SYSDBA", "DB_PASSWORD": "x"}
+
+
+class _Conexao:
+    server_version = "WI-V3.0.10"
+    engine_version = 3.0
+    database_sql_dialect = 3
+
+
+@pytest.fixture
+def tentativas(monkeypatch, tmp_path):
+    monkeypatch.setattr(tenant_profile, "PROFILE_PATH", tmp_path / "perfis.json")
+    monkeypatch.setattr(tenant_profile, "_profiles", None)
+    monkeypatch.setattr(db_client, "ensure_fbclient", lambda: None)
+    feitas = []
+
+    def connect(**kwargs):
+        feitas.append(kwargs["charset"])
+        if kwargs["charset"] != "UTF8":
+            raise RuntimeError("charset não suportado")
+        return _Conexao()
+
+    monkeypatch.setattr(db_client.fdb, "connect", connect)
+    return feitas
+
+
+def test_cfg_do_node_nao_fixa_charset():
+    assert "charset" not in db_client._cfg_from_node(200, NODE)
+
+
+def test_tenant_utf8_so_negocia_na_primeira_conexao(tentativas):
+    cfg = db_client._cfg_from_node(200, NODE)
+
+    db_client.connect_client_db(cfg)
+    db_client.connect_client_db(cfg)
+
+    assert tentativas == [db_client.DEFAULT_CHARSET, "UTF8", "UTF8"]
+    assert tenant_profile.get_profile(cfg)["charset"] == "UTF8"
@@ -0,0 +1,97 @@
+"""Índice de documentos do pré-cadastro e checagem de CPF duplicado."""
+
+import threading
+import time
+
+import pytest
+
+from functions import doc_index, save_precad_pessoa
+
+CFG = {"host": "fb", "port": 3050, "database": "/dados/docs.fdb"}
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+@pytest.fixture
+def tenant(monkeypatch):
+    doc_index.invalidar()
+    t = doc_index._get_tenant(CFG)
+    t.docs = {doc_index._encode("52998224725")}
+    t.max_nocli = 10
+    t.loaded_at = time.monotonic()
+    yield t
+    doc_index.invalidar()
+
+
+def test_atualizacao_incremental_nao_segura_o_lock_do_tenant(monkeypatch, tenant):
+    liberar = threading.Event()
+    consultas = []
+
+    def execute_cached(con, sql, params=()):
+        consultas.append(params)
+        liberar.wait(2)
+        return _Cursor([(11, "111.444.777-35")])
+
+    monkeypatch.setattr(doc_index, "execute_cached", execute_cached)
+    lento = threading.Thread(target=doc_index.possivelmente_cadastrado, args=(CFG, None, "11144477735"))
+    lento.start()
+    while not consultas:
+        time.sleep(0.001)
+
+    # Outra checagem responde com o conjunto atual enquanto a consulta está no banco
+    inicio = time.monotonic()
+    assert doc_index.possivelmente_cadastrado(CFG, None, "529.982.247-25") is True
+    assert time.monotonic() - inicio < 0.5
+
+    liberar.set()
+    lento.join()
+    assert consultas == [(10 - doc_index.DOC_INDEX_OVERLAP,)]
+    assert tenant.max_nocli == 11
+    assert doc_index.possivelmente_cadastrado(CFG, None, "11144477735") is True
+
+
+def test_atualizacao_rele_nocli_confirmados_fora_de_ordem(monkeypatch, tenant):
+    # NOCLI 9 confirmado depois do 10 já lido: a janela de sobreposição o alcança
+    monkeypatch.setattr(doc_index, "execute_cached", lambda con, sql, params=(): _Cursor([(9, "11144477735")]))
+
+    assert doc_index.possivelmente_cadastrado(CFG, None, "111.444.777-35") is True
+    assert tenant.max_nocli == 10
+
+
+def test_conjunto_vencido_volta_ao_banco(monkeypatch, tenant):
+    cargas = []
+    monkeypatch.setattr(doc_index, "_schedule_full_load", lambda cfg, t: cargas.append(cfg))
+    tenant.loaded_at = time.monotonic() - doc_index.DOC_INDEX_FULL_REFRESH
+
+    # Sem carga completa recente, "não está" não é confiável (CGCCLI pode ter sido editado)
+    assert doc_index.possivelmente_cadastrado(CFG, None, "111.444.777-35") is None
+    assert cargas == [CFG]
+
+
+def test_cpf_existe_consulta_so_tabcli_uma_vez(monkeypatch, tenant):
+    consultas = []
+
+    def execute_cached(con, sql, params=()):
+        consultas.append((sql, params))
+        return _Cursor([])
+
+    monkeypatch.setattr(save_precad_pessoa, "execute_cached", execute_cached)
+    monkeypatch.setattr(doc_index, "execute_cached", lambda *a: _Cursor([]))
+
+    assert save_precad_pessoa._cpf_existe(None, "529.982.247-25", CFG) is False
+    assert consultas == [
+        (save_precad_pessoa.SQL_CPF_TABCLI, ("529.982.247-25", "52998224725", "529.982.247-25")),
+    ]
+    consultas.clear()
+    # Fora do conjunto: responde sem ir ao banco
+    assert save_precad_pessoa._cpf_existe(None, "111.444.777-35", CFG) is False
+    assert consultas == []
@@ -0,0 +1,48 @@
+"""Consulta de entregas em lote."""
+
+from contextlib import contextmanager
+
+from functions import row_cache
+from routes import entregas
+
+CFG = {"host": "fb", "port": 3050, "database": "/dados/entregas.fdb"}
+
+
+class _Cursor:
+    description = [("NUMERO",), ("MOTORISTA_DOC",), ("MOTORISTA_NOME",)]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_numero_invalido_falha_so_o_proprio_item(monkeypatch):
+    consultas = []
+
+    @contextmanager
+    def connect(cfg):
+        yield None
+
+    def execute_cached(con, sql, params=()):
+        consultas.append(params)
+        return _Cursor([(123, "52998224725", "JOAO")])
+
+    row_cache.invalidate_tenant()
+    monkeypatch.setattr(entregas, "get_client_db", lambda to_biz: CFG)
+    monkeypatch.setattr(entregas, "_connect", connect)
+    monkeypatch.setattr(entregas, "execute_cached", execute_cached)
+    monkeypatch.setattr(entregas, "_montar_entrega", lambda m: {"numero": m["NUMERO"]})
+
+    req = entregas.EntregasBatchRequest(numeros=["123", "²", "12345678901234567890"], cpf="529.982.247-25")
+    r = entregas.get_entregas_batch(req, to_biz="5548999999999")
+
+    assert [(i["numero"], i["status"], i.get("codigo")) for i in r["entregas"]] == [
+        ("123", "ok", None),
+        ("²", "erro", 400),
+        ("12345678901234567890", "erro", 400),
+    ]
+    # Mesmo tipo do GET individual: o número vai como texto
+    assert consultas == [["123"] * 10]
+    row_cache.invalidate_tenant()
@@ -0,0 +1,92 @@
+"""Cache de extrações: single-flight, cancelamento e evicção."""
+
+import asyncio
+import uuid
+
+import pytest
+
+from functions import extraction_cache
+
+
+def _chave() -> str:
+    return extraction_cache.chave(uuid.uuid4().hex, "teste")
+
+
+def test_chamadas_concorrentes_fazem_uma_extracao():
+    chamadas = []
+
+    async def compute():
+        chamadas.append(1)
+        await asyncio.sleep(0.05)
+        return {"text": "ok"}
+
+    async def cenario():
+        key = _chave()
+        return await asyncio.gather(*[extraction_cache.aget_or_compute(key, "t", compute) for _ in range(5)])
+
+    assert asyncio.run(cenario()) == [{"text": "ok"}] * 5
+    assert len(chamadas) == 1
+
+
+def test_cancelar_um_chamador_nao_afeta_os_demais():
+    async def compute():
+        await asyncio.sleep(0.1)
+        return {"text": "ok"}
+
+    async def cenario():
+        key = _chave()
+        primeiro = asyncio.create_task(extraction_cache.aget_or_compute(key, "t", compute))
+        segundo = asyncio.create_task(extraction_cache.aget_or_compute(key, "t", compute))
+        await asyncio.sleep(0.03)
+        primeiro.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primeiro
+        return await segundo
+
+    assert asyncio.run(cenario()) == {"text": "ok"}
+
+
+def test_extracao_cancelada_quando_ninguem_aguarda():
+    estado = {"cancelada": False}
+
+    async def compute():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            estado["cancelada"] = True
+            raise
+        return {"text": "nunca"}
+
+    async def cenario():
+        key = _chave()
+        unico = asyncio.create_task(extraction_cache.aget_or_compute(key, "t", compute))
+        await asyncio.sleep(0.03)
+        unico.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await unico
+        await asyncio.sleep(0)
+        return key in extraction_cache._aflights
+
+    assert asyncio.run(cenario()) is False
+    assert estado["cancelada"]
+
+
+def test_resultado_nao_cacheavel_nao_e_gravado():
+    key = _chave()
+
+    async def compute():
+        return {"text": "-"}
+
+    asyncio.run(extraction_cache.aget_or_compute(key, "t", compute, cacheable=lambda v: False))
+    assert extraction_cache.get(key) is None
+
+
+def test_eviccao_remove_as_menos_usadas(monkeypatch):
+    monkeypatch.setattr(extraction_cache, "MAX_BYTES", 10_000)
+    monkeypatch.setattr(extraction_cache, "_LOTE_EVICCAO", 4)
+    chaves = [_chave() for _ in range(40)]
+    for key in chaves:
+        extraction_cache.put(key, "t", {"text": "x" * 500})
+    assert extraction_cache._total_bytes <= extraction_cache.MAX_BYTES
+    assert extraction_cache.get(chaves[-1]) is not None
+    assert extraction_cache.get(chaves[0]) is None
@@ -0,0 +1,68 @@
+"""Passes concorrentes do /upload: prazo dos secundários e cancelamento."""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from functions.extraction_passes import executar_passes
+
+
+async def _valor(v, atraso=0.0):
+    await asyncio.sleep(atraso)
+    return v
+
+
+def test_secundario_atrasado_sai_como_none_e_segue_rodando():
+    estado = {"terminou": False}
+
+    async def lento():
+        await asyncio.sleep(0.1)
+        estado["terminou"] = True
+        return "tarde"
+
+    async def cenario():
+        r = await executar_passes(("p", _valor("ok")), {"s": lento()}, timeout_secundario=0.01)
+        await asyncio.sleep(0.15)
+        return r
+
+    assert asyncio.run(cenario()) == ("ok", {"s": None})
+    assert estado["terminou"]
+
+
+def test_principal_atrasado_vira_504():
+    async def cenario():
+        await executar_passes(("p", _valor("ok", 0.2)), {}, timeout_principal=0.01)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(cenario())
+    assert exc.value.status_code == 504
+
+
+def test_cancelar_o_chamador_cancela_os_passes():
+    cancelados = []
+
+    async def passe(nome, espera=1.0):
+        try:
+            await asyncio.sleep(espera)
+        except asyncio.CancelledError:
+            cancelados.append(nome)
+            raise
+        return nome
+
+    async def cenario(principal):
+        t = asyncio.create_task(executar_passes(("p", principal), {"s": passe("s")}, timeout_secundario=5))
+        await asyncio.sleep(0.05)
+        t.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await t
+        await asyncio.sleep(0)
+        # Confere ainda dentro do loop: ao sair, asyncio.run cancelaria o que sobrou
+        return sorted(cancelados)
+
+    # Cancelado enquanto aguarda o principal
+    assert asyncio.run(cenario(passe("p"))) == ["p", "s"]
+
+    # Cancelado depois do principal, aguardando só o secundário
+    cancelados.clear()
+    assert asyncio.run(cenario(passe("p", 0.01))) == ["s"]
@@ -0,0 +1,43 @@
+"""Chave de acesso: validação e busca em texto livre (OCR/PDF)."""
+
+from functions import fiscal_key
+
+
+def _chave(corpo43: str) -> str:
+    return corpo43 + str(fiscal_key.calc_dv(corpo43))
+
+
+CTE = _chave("4219081234567800019957001000012345110000001")
+NFE = _chave("3519081234567800019955001000054321110000002")
+
+
+def _em_grupos(chave: str) -> str:
+    return " ".join(chave[i:i + 4] for i in range(0, 44, 4))
+
+
+def test_valida_dv_uf_mes_e_modelo():
+    assert fiscal_key.validate_access_key(CTE)
+    assert fiscal_key.detect_doc_type(CTE) == "CTE"
+    assert not fiscal_key.validate_access_key(CTE[:43] + str((int(CTE[43]) + 1) % 10))
+    assert not fiscal_key.validate_access_key(CTE, fiscal_key.MODELOS_CTE[1:])
+
+
+def test_acha_chave_em_grupos_e_com_numero_vizinho():
+    assert fiscal_key.find_access_keys(f"CHAVE DE ACESSO\n{_em_grupos(CTE)}\n") == [CTE]
+    # Número vizinho a um espaço entra na mesma sequência; a chave começa numa borda de grupo
+    assert fiscal_key.find_access_keys(f"Nº 123 {_em_grupos(CTE)}") == [CTE]
+    # Colado sem separador de um lado: a chave termina na borda da sequência
+    assert fiscal_key.find_access_keys(f"0099{CTE}") == [CTE]
+
+
+def test_nao_desliza_pelo_meio_de_um_numero_longo():
+    # Chave válida por acaso no meio de um número maior não conta
+    assert fiscal_key.find_access_keys(f"12345{CTE}678") == []
+
+
+def test_cte_tem_preferencia_sobre_outras_chaves():
+    texto = f"NF-e {NFE}\nCT-e {CTE}"
+
+    assert fiscal_key.find_access_keys(texto) == [NFE, CTE]
+    assert fiscal_key.extract_cte_access_key(texto) == CTE
+    assert fiscal_key.extract_cte_access_key(f"NF-e {NFE}") == NFE
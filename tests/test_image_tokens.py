@@ -0,0 +1,20 @@
+"""Estimativa de tokens de imagem por modelo."""
+
+from functions.parse_with_gpt import estimate_image_tokens
+
+
+def test_imagem_quadrada_em_high_no_gpt_4o():
+    # Exemplo da OpenAI: 1024x1024 vira 768x768 = 4 tiles
+    assert estimate_image_tokens(1024, 1024, "high", "gpt-4o") == 85 + 170 * 4
+
+
+def test_nome_datado_usa_o_custo_da_familia():
+    mini = estimate_image_tokens(1024, 1024, "high", "gpt-4o-mini")
+
+    assert mini == 2833 + 5667 * 4
+    assert estimate_image_tokens(1024, 1024, "high", "gpt-4o-mini-2024-07-18") == mini
+    assert estimate_image_tokens(1024, 1024, "high", "gpt-4o-2024-08-06") == 85 + 170 * 4
+
+
+def test_detail_low_cobra_so_a_base():
+    assert estimate_image_tokens(4000, 3000, "low", "gpt-4o-mini-2024-07-18") == 2833
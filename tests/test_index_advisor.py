@@ -0,0 +1,20 @@
+"""SQL analisados pelo index_advisor: os mesmos textos e dialetos da API."""
+
+from functions import consultas_sql, index_advisor
+from functions.save_to_firebird import SQL_MERGE
+
+
+def test_statements_levam_o_dialeto_da_conexao_da_api():
+    stmts = index_advisor.api_statements()
+
+    assert stmts["cte.chave"] == (consultas_sql.SQL_CTE, consultas_sql.SQL_DIALECT)
+    assert stmts["entregas.numero"][1] == consultas_sql.SQL_DIALECT
+    assert stmts["confirmar.merge"] == (SQL_MERGE, None)
+    assert stmts["ocorrencia.insere"][1] is None
+
+
+def test_lote_de_entregas_tem_os_marcadores_dos_dois_in():
+    sql = consultas_sql.sql_entregas_lote(5)
+
+    assert sql.count("?") == 10
+    assert sql.count("IN (?, ?, ?, ?, ?)") == 2
@@ -0,0 +1,20 @@
+"""Cache curto de linhas: identificador normalizado nos dois lados."""
+
+from functions import row_cache
+
+CFG = {"host": "fb", "port": 3050, "database": "/dados/x.fdb"}
+
+
+def test_numero_do_banco_e_do_pedido_caem_na_mesma_chave():
+    row_cache.put(CFG, "entrega", 123, {"NUMERO": 123})
+
+    assert row_cache.get(CFG, "entrega", " 00123 ") == {"NUMERO": 123}
+    assert row_cache.normalizar_ident(123) == row_cache.normalizar_ident("0123") == "123"
+
+
+def test_invalidate_descarta_a_linha():
+    chave = "42" * 22
+    row_cache.put(CFG, "cte", chave, {"CHAVECTE": chave})
+
+    assert row_cache.invalidate(CFG, "cte", chave) == 1
+    assert row_cache.get(CFG, "cte", chave) is None
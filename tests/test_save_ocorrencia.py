@@ -0,0 +1,56 @@
+"""Gravação de ocorrência: nova tentativa em conflito de NOITEM."""
+
+import contextlib
+
+import fdb
+
+from functions import save_ocorrencia
+
+
+class _Cursor:
+    def __init__(self, falhas):
+        self.falhas = falhas
+        self.preparos = 0
+        self.execucoes = 0
+
+    def prep(self, sql):
+        self.preparos += 1
+        return object()
+
+    def execute(self, ps, params):
+        self.execucoes += 1
+        if self.falhas:
+            self.falhas -= 1
+            raise fdb.DatabaseError("violation of PRIMARY or UNIQUE KEY constraint", -803, 335544665)
+
+    def fetchone(self):
+        return (7,)
+
+
+class _Conexao:
+    def __init__(self, cursor):
+        self._cur = cursor
+        self.rollbacks = 0
+        self.commits = 0
+
+    def cursor(self):
+        return self._cur
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_conflito_repete_sem_preparar_de_novo(monkeypatch):
+    cur = _Cursor(falhas=2)
+    con = _Conexao(cur)
+    monkeypatch.setattr(save_ocorrencia, "client_connection", lambda cfg: contextlib.nullcontext(con))
+    monkeypatch.setattr(save_ocorrencia.time, "sleep", lambda s: None)
+
+    noitem = save_ocorrencia.save_ocorrencia_texto(10, "atraso", "bot", {"host": "fb", "database": "x"})
+
+    assert noitem == 7
+    assert (cur.preparos, cur.execucoes) == (1, 3)
+    assert (con.rollbacks, con.commits) == (2, 1)
@@ -0,0 +1,50 @@
+"""Upsert do /confirmar: caminho antigo só quando o servidor não aceita a sintaxe."""
+
+from datetime import date
+
+import fdb
+import pytest
+
+from functions import save_to_firebird as sf
+
+CFG = {"host": "fb", "port": 3050, "database": "/dados/docs.fdb"}
+VALORES = {
+    "motorista_id": 1, "chave": "42" * 22, "data_emissao": date(2025, 1, 1),
+    "cnpj": None, "caminho": None, "status": "salvo_chave",
+}
+
+
+@pytest.fixture
+def executados(monkeypatch):
+    sf._SEM_UPSERT.clear()
+    monkeypatch.setattr(sf.tenant_profile, "get_profile", lambda cfg: {"engine_version": 3.0})
+    feitos = []
+    yield feitos
+    sf._SEM_UPSERT.clear()
+
+
+def _execute(feitos, erro_merge):
+    def execute_cached(con, sql, params=()):
+        feitos.append("MERGE" if sql is sf.SQL_MERGE else "INSERT" if sql is sf.SQL_INSERT else sql)
+        if sql is sf.SQL_MERGE:
+            raise fdb.fbcore.DatabaseError("erro", erro_merge, 0)
+    return execute_cached
+
+
+def test_sintaxe_nao_suportada_usa_insert_update(monkeypatch, executados):
+    monkeypatch.setattr(sf, "execute_cached", _execute(executados, -104))
+
+    sf._gravar_documento(None, CFG, VALORES)
+    sf._gravar_documento(None, CFG, VALORES)
+
+    # Depois do -104 o tenant nem tenta mais o MERGE
+    assert executados == ["MERGE", "INSERT", "INSERT"]
+
+
+def test_violacao_de_constraint_nao_repete_no_caminho_antigo(monkeypatch, executados):
+    monkeypatch.setattr(sf, "execute_cached", _execute(executados, -530))
+
+    with pytest.raises(fdb.fbcore.DatabaseError):
+        sf._gravar_documento(None, CFG, VALORES)
+    assert executados == ["MERGE"]
+    assert not sf._SEM_UPSERT
@@ -0,0 +1,61 @@
+"""TTLCache: carga única por chave e cancelamento de chamadores (versão async)."""
+
+import asyncio
+
+import pytest
+
+from functions.ttl_cache import TTLCache
+
+
+def test_aget_or_load_carrega_uma_vez():
+    cache = TTLCache("teste", ttl=60)
+    cargas = []
+
+    async def loader():
+        cargas.append(1)
+        await asyncio.sleep(0.05)
+        return "cfg"
+
+    async def cenario():
+        return await asyncio.gather(*[cache.aget_or_load("k", loader) for _ in range(5)])
+
+    assert asyncio.run(cenario()) == ["cfg"] * 5
+    assert len(cargas) == 1
+    assert cache.get("k") == "cfg"
+
+
+def test_cancelar_um_chamador_nao_afeta_os_demais():
+    cache = TTLCache("teste", ttl=60)
+
+    async def loader():
+        await asyncio.sleep(0.1)
+        return "cfg"
+
+    async def cenario():
+        primeiro = asyncio.create_task(cache.aget_or_load("k", loader))
+        segundo = asyncio.create_task(cache.aget_or_load("k", loader))
+        await asyncio.sleep(0.02)
+        primeiro.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primeiro
+        return await segundo
+
+    assert asyncio.run(cenario()) == "cfg"
+    assert cache.get("k") == "cfg"
+
+
+def test_erro_negativo_fica_em_cache():
+    cache = TTLCache("teste", ttl=60, negative_ttl=60, is_negative=lambda e: isinstance(e, KeyError))
+    cargas = []
+
+    async def loader():
+        cargas.append(1)
+        raise KeyError("não existe")
+
+    async def cenario():
+        for _ in range(2):
+            with pytest.raises(KeyError):
+                await cache.aget_or_load("k", loader)
+
+    asyncio.run(cenario())
+    assert len(cargas) == 1
@@ -0,0 +1,87 @@
+"""Validadores de campos e nota dos cartões (decidem a escalada de modelo)."""
+
+import asyncio
+
+from functions import fiscal_key, parse_with_gpt, validators
+
+CHAVE_CTE = "4219081234567800019957001000012345110000001"
+CHAVE_CTE += str(fiscal_key.calc_dv(CHAVE_CTE))
+
+
+def test_validadores_de_documento():
+    assert validators.cpf_valido("529.982.247-25")
+    assert not validators.cpf_valido("111.111.111-11")
+    assert validators.cnpj_valido("11.222.333/0001-81")
+    assert not validators.cnpj_valido("11.222.333/0001-80")
+    assert validators.cnh_registro_valido("12345678026")
+    assert not validators.cnh_registro_valido("12345678027")
+    assert validators.data_valida("29/02/2024")
+    assert not validators.data_valida("30/02/2024")
+    assert not validators.data_valida("10/08/2019 14:30:00")
+    assert validators.data_hora_valida("10/08/2019 14:30:00")
+    assert validators.data_hora_valida("10/08/2019")
+    assert not validators.data_hora_valida("30/02/2024 10:00")
+
+
+def test_placa_e_chassi():
+    assert validators.placa_valida("ABC-1234")
+    assert validators.placa_valida("abc1d23")
+    assert not validators.placa_valida("AB12345")
+    assert validators.chassi_valido("9BWZZZ377VT004251")
+    assert not validators.chassi_valido("9BWZZZ377VT00425I")
+
+
+def test_linha_do_cartao_aceita_marcador():
+    card = "- CPF: 529.982.247-25\n• Pai: -\nNome: JOAO"
+    assert validators.linha(card, "CPF") == "529.982.247-25"
+    assert validators.linha(card, "Pai") == ""
+    assert validators.linha(card, "Nome") == "JOAO"
+
+
+def test_nota_pessoa_conta_campos_validos():
+    card = (
+        "Nome: JOAO DA SILVA\n"
+        "Data de nascimento: 01/02/1990\n"
+        "CPF: 529.982.247-25\n"
+        "Número de registro CNH: 12345678026\n"
+        "Validade: 05/06/2030\n"
+    )
+    assert validators.nota_pessoa(card) == 1.0
+    assert validators.nota_pessoa(card.replace("529.982.247-25", "529.982.247-00")) == 0.8
+    assert validators.nota_pessoa("") == 0.0
+
+
+def test_nota_cte_e_por_tipo():
+    card = f"Chave: {CHAVE_CTE}\nEmissão: 10/08/2019\nRemetente CNPJ: 11.222.333/0001-81\n"
+
+    assert validators.nota_por_tipo(" CTe ") is validators.nota_cte
+    assert validators.nota_cte(card) == 1.0
+    assert validators.nota_cte(card.replace("10/08/2019", "-")) == 2 / 3
+    assert validators.nota_por_tipo("desconhecido") is None
+
+
+def test_nota_cte_usa_a_chave_ja_conhecida():
+    card = "Chave: -\nEmissão: 10/08/2019 14:30:00\nEmitente: X | CNPJ: 11.222.333/0001-81\n"
+
+    assert validators.nota_cte(card) == 2 / 3
+    assert validators.nota_cte(card, CHAVE_CTE) == 1.0
+
+
+def test_chave_do_codigo_de_barras_evita_escalar(monkeypatch):
+    # Cartão com a linha da chave ilegível e emissão com hora, como no DACTE
+    card = "Chave: 4219 0812 ???\nEmissão: 10/08/2019 14:30:00\nTomador: Y | CNPJ: -\n"
+    modelos = []
+
+    async def fake_text(messages, model, timeout=None):
+        modelos.append(model)
+        return card
+
+    monkeypatch.setattr(parse_with_gpt, "MODEL_TIERS", ["barato", "caro"])
+    monkeypatch.setattr(parse_with_gpt, "_acall_gpt_text", fake_text)
+
+    dados = asyncio.run(parse_with_gpt._extrair_cartao_async(
+        [], False, False, None, tipo="cte", chave=CHAVE_CTE,
+    ))
+
+    assert dados["text"].startswith("Chave:")
+    assert modelos == ["barato"]